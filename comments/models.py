@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from movies.caching import bump_version
 from myproject import settings
 from treebeard.mp_tree import MP_Node
 
@@ -22,3 +23,17 @@ class Comment(MP_Node):
 
     def __str__(self):
         return f"Comment {self.id}"
+
+    @staticmethod
+    def get_thread_version_key(movie_id):
+        """
+        :return: cache key of the version of all comments of the film or tv, bumped by adding and deleting them.
+        """
+        return f'comments:{movie_id}'
+
+    def bump_thread_version(self):
+        """
+        Replies may carry no film or tv, the thread belongs to the film or tv of the root comment.
+        """
+        root = self.get_root()
+        bump_version(self.get_thread_version_key(root.film_id or root.tv_id))
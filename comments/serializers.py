@@ -47,6 +47,7 @@ class CommentSerializer(serializers.ModelSerializer):
             except Comment.DoesNotExist:
                 raise Http404('No parent comment with such path to add child.')
 
+        new_comment.bump_thread_version()
         return new_comment
 
 
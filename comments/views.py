@@ -1,18 +1,31 @@
+import uuid
 from django.db.models import Q
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from comments.models import Comment
 from comments.serializers import CommentSerializer, MovieSerializer, RootCommentSerializer, DeleteCommentSerializer
+from movies.caching import conditional_on_version
+from movies.pagination import CURSOR_FIELD, CountedPageNumberPagination, get_paginator
 from movies.permissions import IsUserOrReadOnly
 
 MOVIE_ID_FIELD = openapi.Parameter('movie_id', openapi.IN_QUERY, type=openapi.FORMAT_UUID)
 MOVIE_TYPE_FIELD = openapi.Parameter('movie_type', openapi.IN_QUERY, type=openapi.TYPE_STRING)
 PAGE_FIELD = openapi.Parameter('page', openapi.IN_QUERY, type=openapi.TYPE_INTEGER)
+COMMENTS_ORDERING = ('-created_date', 'id')
+
+
+def comments_version_key(request):
+    """
+    :return: version key of the comments of the film or tv in the 'movie_id' param, None if the param is invalid.
+    """
+    try:
+        return Comment.get_thread_version_key(uuid.UUID(request.query_params.get('movie_id', '')))
+    except ValueError:
+        return None
 
 
 class MovieCommentsView(APIView):
@@ -20,14 +33,17 @@ class MovieCommentsView(APIView):
     Viewing and adding comments (only for users) to the film or tv.
     """
     permission_classes = (IsUserOrReadOnly,)
-    pagination_class = PageNumberPagination
+    pagination_class = CountedPageNumberPagination
     filter_backends = (DjangoFilterBackend, )
 
-    @swagger_auto_schema(manual_parameters=[MOVIE_ID_FIELD, MOVIE_TYPE_FIELD, PAGE_FIELD, ])
+    @swagger_auto_schema(manual_parameters=[MOVIE_ID_FIELD, MOVIE_TYPE_FIELD, PAGE_FIELD, CURSOR_FIELD, ])
+    @conditional_on_version(comments_version_key)
     def get(self, request):
         """
         Displaying comments tree of the film or tv.
-        :param request: HTTP request with 'page', 'movie_id' and 'movie_type' in headers.
+        Answers If-None-Match and If-Modified-Since with 304 while the comments of the film or tv are unchanged.
+        With the 'cursor' param root comments are paginated with cursors and without the count.
+        :param request: HTTP request with 'page' or 'cursor', 'movie_id' and 'movie_type' in headers.
         :return: HTTP response. With JSON data of film or tv and comments, Http status 200
                  or serializer validation's errors with messages and Http status 400.
         """
@@ -41,8 +57,8 @@ class MovieCommentsView(APIView):
             root_comments = Comment.get_root_nodes().filter(
                 (Q(film__type=movie.type) & Q(film_id=movie.id)) |
                 (Q(tv__type=movie.type) & Q(tv_id=movie.id))).order_by('-created_date')
-            paginator = self.pagination_class()
-            result = paginator.paginate_queryset(root_comments, request)
+            paginator = get_paginator(request, COMMENTS_ORDERING, self.pagination_class)
+            result = paginator.paginate_queryset(root_comments, request, view=self)
             user_comment_serializer = RootCommentSerializer(result, many=True)
             paginated_response = paginator.get_paginated_response(user_comment_serializer.data)
             return paginated_response
@@ -74,6 +90,7 @@ class MovieCommentsView(APIView):
             try:
                 comment_to_delete = Comment.objects.get(
                     id=comment_serializer.validated_data.get('id'), author=request.user.id)
+                comment_to_delete.bump_thread_version()
                 comment_to_delete.delete()
                 return Response(status=status.HTTP_204_NO_CONTENT)
             except Comment.DoesNotExist:
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.forms import BaseInlineFormSet
 from comments.models import Comment
 from news.models import NewsPost
+from .catalog import refresh_catalog
+from .search_index import record_search_changes
 from .models import Film, Genre, Tv, TvGenre
 from django.utils.translation import gettext_lazy as _
 from django.db.models import Max, Min
@@ -104,8 +106,33 @@ class CommentsInlineAdmin(admin.StackedInline):
     formset = CommentsLimitFormSet
 
 
+class CatalogRefreshMixin:
+    """
+    Keeps the catalog table and the search indexes in step with films and tvs edited in the admin.
+    """
+    search_source = None
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        refresh_catalog(self.model, [form.instance.id])
+        record_search_changes(self.search_source, [form.instance.id])
+
+    def delete_model(self, request, obj):
+        obj_id = obj.id
+        super().delete_model(request, obj)
+        refresh_catalog(self.model, [obj_id])
+        record_search_changes(self.search_source, [obj_id])
+
+    def delete_queryset(self, request, queryset):
+        ids = list(queryset.values_list('id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_catalog(self.model, ids)
+        record_search_changes(self.search_source, ids)
+
+
 @admin.register(Film)
-class FilmAdmin(admin.ModelAdmin):
+class FilmAdmin(CatalogRefreshMixin, admin.ModelAdmin):
+    search_source = 'movie'
     list_display = ("source_id", "title", "original_language", "original_title",
                     "popularity", "release_date", 'display_genres', )
     search_fields = ("id", "source_id", "popularity", "vote_average",
@@ -117,7 +144,8 @@ class FilmAdmin(admin.ModelAdmin):
 
 
 @admin.register(Tv)
-class TvAdmin(admin.ModelAdmin):
+class TvAdmin(CatalogRefreshMixin, admin.ModelAdmin):
+    search_source = 'tv'
     list_display = ("source_id", "name", "original_language", "original_name",
                     "popularity", "first_air_date", 'display_genres')
     search_fields = ("id", "source_id", "popularity", "vote_average",
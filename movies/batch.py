@@ -0,0 +1,42 @@
+from django.db import connection
+from .catalog import CATALOG_TITLE_COLUMNS, SHARED_COLUMNS, TITLE_COLUMNS
+from .models import Film, Tv
+
+
+def get_titles_by_id(model, ids):
+    """
+    Reads films or tvs with their genres with one query, titles are named as in the catalog.
+    :param model: Film or Tv.
+    :param ids: primary keys of the model rows.
+    :return: dict of primary key to row dict of the catalog columns and 'genres',
+             a list of {'id': genre source id, 'title': genre title} like attach_genres sets.
+    """
+    if not ids:
+        return {}
+    field = model._meta.get_field('genre_ids')
+    expressions = [f'item.{column}' for column in SHARED_COLUMNS]
+    expressions += [f'item.{column} AS {alias}' for column, alias in zip(TITLE_COLUMNS[model], CATALOG_TITLE_COLUMNS)]
+    expressions.append(f"""coalesce((
+        SELECT jsonb_agg(jsonb_build_object('id', genre.source_id, 'title', genre.title) ORDER BY genre.source_id)
+        FROM {field.remote_field.through._meta.db_table} link
+        JOIN {field.related_model._meta.db_table} genre ON genre.id = link.{field.m2m_reverse_name()}
+        WHERE link.{field.m2m_column_name()} = item.id), '[]') AS genres""")
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT {', '.join(expressions)}
+            FROM {model._meta.db_table} item
+            WHERE item.id = ANY(%s)
+        """, [list(ids)])
+        names = [column.name for column in cursor.description]
+        return {row[0]: dict(zip(names, row)) for row in cursor.fetchall()}
+
+
+def get_titles(ids):
+    """
+    Looks the ids up among films, then the rest among tvs, with one query per media type.
+    :param ids: primary keys of films and tvs.
+    :return: row dicts of the found films and tvs in the order of the ids and list of the ids not found.
+    """
+    rows = get_titles_by_id(Film, ids)
+    rows.update(get_titles_by_id(Tv, [pk for pk in ids if pk not in rows]))
+    return [rows[pk] for pk in ids if pk in rows], [pk for pk in ids if pk not in rows]
@@ -0,0 +1,119 @@
+import hashlib
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_GENERATION_KEY = 'catalog_generation'
+CACHED_HEADERS = ('X-Count-Mode', )
+
+
+def new_version():
+    return uuid.uuid4().hex, timezone.now()
+
+
+def get_version(key):
+    """
+    :return: (token, modified at) of the version stored under the key, a missing version starts now.
+             Tokens are random, so a version lost from the cache never repeats an old one.
+    """
+    return cache.get_or_set(key, new_version, timeout=None)
+
+
+def bump_version(key):
+    """
+    Replaces the version once the transaction commits,
+    data cached before that saw the old rows and is dropped with the old version.
+    """
+    transaction.on_commit(lambda: cache.set(key, new_version(), timeout=None))
+
+
+def get_catalog_generation():
+    """
+    :return: token changed by every write to films, tvs or people, part of the keys of cached counts and pages.
+    """
+    return get_version(CATALOG_GENERATION_KEY)[0]
+
+
+def bump_catalog_generation():
+    bump_version(CATALOG_GENERATION_KEY)
+
+
+def get_request_signature(request, *parts):
+    """
+    :return: digest of the endpoint, the sorted query params and the parts.
+    """
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    return hashlib.sha1(':'.join([f'{request.path}?{query}', *map(str, parts)]).encode()).hexdigest()
+
+
+def get_response_cache_key(request):
+    """
+    :return: key of the page under the current catalog generation,
+             so a bump of the generation invalidates every cached page at once.
+    """
+    return f'response:{get_catalog_generation()}:{get_request_signature(request)}'
+
+
+def cache_anonymous_response(get):
+    """
+    Decorates GET of a catalog list view to serve the data of successful anonymous responses
+    from the cache for RESPONSE_CACHE_TTL, the X-Cache header tells a 'hit' from a 'miss'.
+    Anonymous responses are marked with cache_compressed for CompressionMiddleware to cache their compressed body.
+    """
+    @wraps(get)
+    def wrapper(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return get(self, request, *args, **kwargs)
+        key = get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            data, headers = cached
+            response = Response(data, status=status.HTTP_200_OK, headers=headers)
+            response['X-Cache'] = 'hit'
+            response.cache_compressed = True
+            return response
+
+        response = get(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {header: response[header] for header in CACHED_HEADERS if response.has_header(header)}
+            cache.set(key, (response.data, headers), settings.RESPONSE_CACHE_TTL)
+        response['X-Cache'] = 'miss'
+        response.cache_compressed = True
+        return response
+    return wrapper
+
+
+def conditional_on_version(get_version_key):
+    """
+    Decorates GET of a view with ETag and Last-Modified taken from a version,
+    so If-None-Match and If-Modified-Since are answered with 304 before the page is queried or rendered.
+    The ETag is the digest of the endpoint, query params, Accept header and version token.
+    :param get_version_key: function of the request returning the key of the version or None to skip.
+    """
+    def get_request_version(request):
+        if not hasattr(request, 'page_version'):
+            key = get_version_key(request)
+            request.page_version = get_version(key) if key else None
+        return request.page_version
+
+    def get_etag(request, *args, **kwargs):
+        version = get_request_version(request)
+        return get_request_signature(request, request.META.get('HTTP_ACCEPT', ''), version[0]) if version else None
+
+    def get_last_modified(request, *args, **kwargs):
+        version = get_request_version(request)
+        return version[1] if version else None
+
+    return method_decorator(condition(etag_func=get_etag, last_modified_func=get_last_modified))
+
+
+def catalog_version_key(request):
+    return CATALOG_GENERATION_KEY
@@ -0,0 +1,81 @@
+from django.db import connection
+from django.db.models import Q
+from .caching import bump_catalog_generation
+from .genres import assign_genre_bits, get_genre_mask_sql
+from .models import CatalogEntry, Film, Tv
+
+SHARED_COLUMNS = ("id", "source_id", "popularity", "vote_average", "vote_count", "poster_path",
+                  "backdrop_path", "original_language", "type", "overview")
+CATALOG_TITLE_COLUMNS = ("title", "original_title", "release_date")
+# model: its columns copied to CATALOG_TITLE_COLUMNS
+TITLE_COLUMNS = {
+    Film: ("title", "original_title", "release_date"),
+    Tv: ("name", "original_name", "first_air_date"),
+}
+
+
+def filter_by_person(queryset, name):
+    """
+    :return: catalog entries of films and tvs the people whose name contains the name are known for.
+    """
+    return queryset.filter(Q(id__in=Film.objects.filter(person__name__icontains=name).values('id'))
+                           | Q(id__in=Tv.objects.filter(person__name__icontains=name).values('id')))
+
+
+def refresh_catalog(model, ids=None):
+    """
+    Copies films or tvs with the source ids of their genres into the catalog table
+    with one INSERT ... ON CONFLICT UPDATE and drops catalog entries whose film or tv is gone.
+    Genre masks of the films or tvs are brought up to date with their genres first,
+    new genres get their bits.
+    Entries equal to their film or tv are left alone, so updated_at is the time of the last real change.
+    :param model: Film or Tv.
+    :param ids: primary keys of the rows to refresh, all rows of the model when None.
+    Bumps the catalog generation.
+    :return: number of inserted and changed entries.
+    """
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return 0
+    catalog_table = CatalogEntry._meta.db_table
+    genre_field = model._meta.get_field('genre_ids')
+    columns = SHARED_COLUMNS + CATALOG_TITLE_COLUMNS + ('genre_mask', 'genre_ids')
+    expressions = [f'item.{column}' for column in SHARED_COLUMNS + TITLE_COLUMNS[model] + ('genre_mask',)]
+    expressions.append(f"""ARRAY(
+        SELECT genre.source_id
+        FROM {genre_field.remote_field.through._meta.db_table} link
+        JOIN {genre_field.related_model._meta.db_table} genre ON genre.id = link.{genre_field.m2m_reverse_name()}
+        WHERE link.{genre_field.m2m_column_name()} = item.id AND genre.source_id IS NOT NULL
+        ORDER BY genre.source_id)""")
+    assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in columns[1:] + ('updated_at',))
+    stored = ', '.join(f'{catalog_table}.{column}' for column in columns[1:])
+    copied = ', '.join(f'EXCLUDED.{column}' for column in columns[1:])
+    params = [ids] if ids is not None else None
+
+    assign_genre_bits()
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {model._meta.db_table} item SET genre_mask = mask.value
+            FROM (SELECT item.id, {get_genre_mask_sql(model)} AS value
+                  FROM {model._meta.db_table} item
+                  {'WHERE item.id = ANY(%s)' if ids is not None else ''}) mask
+            WHERE item.id = mask.id AND item.genre_mask <> mask.value
+        """, params)
+        cursor.execute(f"""
+            INSERT INTO {catalog_table} ({', '.join(columns)}, updated_at)
+            SELECT {', '.join(expressions)}, now()
+            FROM {model._meta.db_table} item
+            {'WHERE item.id = ANY(%s)' if ids is not None else ''}
+            ON CONFLICT (id) DO UPDATE SET {assignments}
+            WHERE ({stored}) IS DISTINCT FROM ({copied})
+        """, params)
+        refreshed = cursor.rowcount
+        cursor.execute(f"""
+            DELETE FROM {catalog_table} entry
+            WHERE {'entry.id = ANY(%s) AND' if ids is not None else ''}
+                  NOT EXISTS (SELECT 1 FROM {Film._meta.db_table} WHERE id = entry.id)
+              AND NOT EXISTS (SELECT 1 FROM {Tv._meta.db_table} WHERE id = entry.id)
+        """, params)
+    bump_catalog_generation()
+    return refreshed
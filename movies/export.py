@@ -0,0 +1,48 @@
+import zlib
+from django.conf import settings
+from myproject.renderers import FastJSONRenderer
+from .catalog import CATALOG_TITLE_COLUMNS, SHARED_COLUMNS
+from .models import CatalogEntry
+
+EXPORT_COLUMNS = SHARED_COLUMNS + CATALOG_TITLE_COLUMNS + ('genre_ids', 'updated_at')
+
+
+def get_export_rows(updated_since=None):
+    """
+    :param updated_since: datetime, only entries changed since then are exported when given.
+    :return: iterator of catalog entry value dicts ordered by id,
+             read through a server-side cursor EXPORT_CHUNK_SIZE rows at a time.
+    """
+    entries = CatalogEntry.objects.order_by('id')
+    if updated_since is not None:
+        entries = entries.filter(updated_at__gte=updated_since)
+    return entries.values(*EXPORT_COLUMNS).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def iter_ndjson(rows):
+    """
+    :return: iterator of byte chunks of about EXPORT_BUFFER_SIZE with one JSON document per line.
+    """
+    renderer = FastJSONRenderer()
+    buffer, size = [], 0
+    for row in rows:
+        line = renderer.render(row) + b'\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= settings.EXPORT_BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks):
+    """
+    :return: iterator of the chunks compressed as one gzip stream.
+    """
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
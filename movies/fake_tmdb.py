@@ -0,0 +1,110 @@
+import json
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MOVIE_GENRES = [{'id': source_id, 'name': f'Movie genre {source_id}'} for source_id in range(1, 20)]
+TV_GENRES = [{'id': source_id, 'name': f'Tv genre {source_id}'} for source_id in range(10, 30)]
+
+
+class FakeTmdbHandler(BaseHTTPRequestHandler):
+    """
+    Serves synthetic TMDB listings, the same page always has the same content.
+    """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        url = urlparse(self.path)
+        page = int(parse_qs(url.query).get('page', ['1'])[0])
+        routes = {
+            '/3/genre/movie/list': lambda: {'genres': MOVIE_GENRES},
+            '/3/genre/tv/list': lambda: {'genres': TV_GENRES},
+            '/3/discover/movie': lambda: self.listing(page, self.make_film),
+            '/3/discover/tv': lambda: self.listing(page, self.make_tv),
+            '/3/person/popular': lambda: self.listing(page, self.make_person),
+        }
+        time.sleep(self.server.latency)
+        if url.path not in routes:
+            self.send_error(404)
+            return
+        body = json.dumps(routes[url.path]()).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def listing(self, page, make_result):
+        page_size = self.server.page_size
+        results = [make_result(source_id, random.Random(source_id))
+                   for source_id in range((page - 1) * page_size + 1, page * page_size + 1)] \
+            if page <= self.server.total_pages else []
+        return {'page': page, 'total_pages': self.server.total_pages,
+                'total_results': self.server.total_pages * page_size, 'results': results}
+
+    @staticmethod
+    def make_film(source_id, rand):
+        return {'id': source_id, 'title': f'Film {source_id}', 'original_title': f'Film {source_id}',
+                'popularity': round(rand.uniform(0, 500), 3), 'vote_count': rand.randint(0, 10000),
+                'vote_average': round(rand.uniform(0, 10), 1), 'video': False, 'adult': False,
+                'poster_path': f'/{source_id}.jpg', 'backdrop_path': f'/{source_id}_backdrop.jpg',
+                'original_language': 'en', 'overview': 'Overview of the film. ' * 10,
+                'release_date': f'{rand.randint(1950, 2019)}-01-01',
+                'genre_ids': rand.sample([genre['id'] for genre in MOVIE_GENRES], 3)}
+
+    @staticmethod
+    def make_tv(source_id, rand):
+        return {'id': source_id, 'name': f'Tv {source_id}', 'original_name': f'Tv {source_id}',
+                'popularity': round(rand.uniform(0, 500), 3), 'vote_count': rand.randint(0, 10000),
+                'vote_average': round(rand.uniform(0, 10), 1), 'poster_path': f'/{source_id}.jpg',
+                'backdrop_path': f'/{source_id}_backdrop.jpg', 'original_language': 'en',
+                'overview': 'Overview of the tv. ' * 10, 'first_air_date': f'{rand.randint(1950, 2019)}-01-01',
+                'genre_ids': rand.sample([genre['id'] for genre in TV_GENRES], 3)}
+
+    def make_person(self, source_id, rand):
+        titles = self.server.total_pages * self.server.page_size
+        return {'id': source_id, 'name': f'Person {source_id}', 'popularity': round(rand.uniform(0, 100), 3),
+                'gender': rand.randint(0, 2), 'profile_path': f'/{source_id}.jpg', 'adult': False,
+                'known_for': [{'media_type': rand.choice(['movie', 'tv']), 'id': rand.randint(1, titles)}
+                              for _ in range(3)]}
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    http.server.ThreadingHTTPServer is new in Python 3.7.
+    """
+    daemon_threads = True
+
+
+class FakeTmdbServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the TMDB API, serves discover/movie, discover/tv, genre/*/list and person/popular.
+    Use as a context manager, `url` replaces FILM_API_URL.
+    :param total_pages: number of pages of every listing.
+    :param page_size: number of results on a page.
+    :param latency: seconds every response is delayed by.
+    """
+
+    def __init__(self, total_pages=10, page_size=20, latency=0.):
+        super().__init__(('127.0.0.1', 0), FakeTmdbHandler)
+        self.total_pages = total_pages
+        self.page_size = page_size
+        self.latency = latency
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/3/'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
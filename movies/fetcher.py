@@ -0,0 +1,184 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/536.6 (KHTML, like Gecko) Chrome/20.0.1092.0 Safari/536.6'
+HEADERS = {'user-agent': USER_AGENT}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+logger = logging.getLogger()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, allows `rate` acquisitions per second with bursts up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available and takes it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedRateLimit:
+    """
+    Allows `rate` acquisitions per second across every process sharing the cache, e.g. the celery workers
+    running ingestion shards against the Redis cache: acquisitions are counted per second in one cache key.
+    With the local memory cache it limits the process only.
+    """
+
+    def __init__(self, rate, key='tmdb:requests'):
+        self.rate = rate
+        self.key = key
+
+    def acquire(self):
+        """
+        Blocks until the current second has acquisitions left and takes one.
+        """
+        while True:
+            now = time.time()
+            key = f'{self.key}:{int(now)}'
+            cache.add(key, 0, timeout=2)
+            try:
+                if cache.incr(key) <= self.rate:
+                    return
+            except ValueError:
+                # the key of the second has just expired
+                continue
+            time.sleep(int(now) + 1 - now)
+
+
+class TmdbFetcher:
+    """
+    Fetches TMDB listings over pooled keep-alive connections.
+    Every instance keeps its own session and request params, so concurrent runs do not interfere.
+    The local token bucket smooths the requests of the instance, the shared limit keeps
+    all shards of an ingestion together within TMDB_REQUESTS_PER_SECOND.
+    """
+
+    def __init__(self, requests_per_second=None, concurrency=None, timeout=None, max_retries=None):
+        self.concurrency = concurrency or settings.TMDB_CONCURRENCY
+        self.timeout = timeout or settings.TMDB_TIMEOUT
+        self.max_retries = settings.TMDB_MAX_RETRIES if max_retries is None else max_retries
+        requests_per_second = requests_per_second or settings.TMDB_REQUESTS_PER_SECOND
+        self.bucket = TokenBucket(requests_per_second)
+        self.shared_limit = SharedRateLimit(requests_per_second)
+        self.params = {'api_key': settings.TMDB_API_KEY,
+                       'language': 'en-US'}
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url, **params):
+        """
+        GET request to TMDB with rate limiting, timeout and retries with jittered exponential backoff.
+        :param url: TMDB endpoint url.
+        :param params: query params added to the api key and language.
+        :return: decoded JSON response.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.shared_limit.acquire()
+            try:
+                response = self.session.get(url, params=dict(self.params, **params), timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()
+                error = requests.HTTPError(f'{response.status_code} for {url}', response=response)
+            except (requests.ConnectionError, requests.Timeout) as exception:
+                error = exception
+            if attempt == self.max_retries:
+                raise error
+            delay = random.uniform(0, settings.TMDB_BACKOFF * 2 ** attempt)
+            logger.warning("TMDB request to %s failed (%s), retrying in %.2fs", url, error, delay)
+            time.sleep(delay)
+
+    def get_page(self, url, page, **params):
+        return self.get(url, page=page, **params)
+
+    def iter_bounded(self, function, arguments):
+        """
+        Calls function for every argument in the thread pool.
+        At most twice `concurrency` calls run ahead of the consumer, so memory stays flat.
+        :return: generator of the call results in the order of arguments.
+        """
+        arguments = iter(arguments)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            in_flight = deque(executor.submit(function, argument)
+                              for argument in islice(arguments, self.concurrency * 2))
+            while in_flight:
+                result = in_flight.popleft().result()
+                for argument in islice(arguments, 1):
+                    in_flight.append(executor.submit(function, argument))
+                yield result
+
+    def iter_pages(self, url, first_page=1, last_page=None, **params):
+        """
+        Fetches pages of a TMDB listing concurrently.
+        :param url: paginated TMDB endpoint url.
+        :param first_page: number of the first page to fetch.
+        :param last_page: number of the last page to fetch, the last page of the listing by default.
+        :param params: extra query params of the listing.
+        :return: generator of 'results' lists, one per page, in page order.
+        """
+        first_response = self.get_page(url, first_page, **params)
+        yield first_response['results']
+
+        last_page = min(last_page or first_response['total_pages'], first_response['total_pages'])
+        pages = self.iter_bounded(lambda page: self.get_page(url, page, **params),
+                                  range(first_page + 1, last_page + 1))
+        for page in pages:
+            yield page['results']
+
+    def iter_numbered_pages(self, url, pages, **params):
+        """
+        Fetches the listed pages of a TMDB listing concurrently.
+        :return: generator of (page number, 'results' list) pairs in the order of pages.
+        """
+        return self.iter_bounded(lambda page: (page, self.get_page(url, page, **params)['results']), pages)
+
+    def get_or_none(self, url):
+        """
+        :return: decoded JSON response or None if TMDB has no such resource.
+        """
+        try:
+            return self.get(url)
+        except requests.HTTPError as exception:
+            if exception.response is not None and exception.response.status_code == 404:
+                return None
+            raise
+
+    def iter_resources(self, urls):
+        """
+        Fetches single TMDB resources (e.g. movie details) concurrently.
+        :param urls: iterable of resource urls.
+        :return: generator of decoded responses in the order of urls, None for absent resources.
+        """
+        return self.iter_bounded(self.get_or_none, urls)
@@ -0,0 +1,155 @@
+from collections import defaultdict
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, Count, Lookup, Q
+from drf_yasg import openapi
+from .models import Film, Genre, GenreBit, Tv, TvGenre
+
+GENRE_MATCHES = ('all', 'any')
+MAX_GENRE_BITS = 63  # bits of a non negative bigint mask
+GENRES_FIELD = openapi.Parameter('genres', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                 description='comma separated genre ids')
+GENRES_MATCH_FIELD = openapi.Parameter('genres_match', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                       enum=list(GENRE_MATCHES),
+                                       description="'all' keeps titles with every genre, 'any' with some of them")
+
+
+@BigIntegerField.register_lookup
+class HasAllBits(Lookup):
+    """
+    `field & value = value`: every bit of the value is set in the field.
+    """
+    lookup_name = 'bits_all'
+
+    def as_sql(self, compiler, connection):  # pylint: disable=redefined-outer-name
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} & {rhs} = {rhs}', lhs_params + rhs_params + rhs_params
+
+
+@BigIntegerField.register_lookup
+class HasAnyBits(Lookup):
+    """
+    `field & value <> 0`: some bit of the value is set in the field.
+    """
+    lookup_name = 'bits_any'
+
+    def as_sql(self, compiler, connection):  # pylint: disable=redefined-outer-name
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} & {rhs} <> 0', lhs_params + rhs_params
+
+
+def get_genres_by_id(model, ids):
+    """
+    Fetches genres of the films or tvs with one query over the M2M through table.
+    :param model: Film or Tv.
+    :param ids: primary keys of the model rows.
+    :return: dict of primary key to list of {'id': genre source id, 'title': genre title}.
+    """
+    genres = defaultdict(list)
+    if not ids:
+        return genres
+    field = model._meta.get_field('genre_ids')
+    item_column, genre_column = field.m2m_field_name(), field.m2m_reverse_field_name()
+    links = field.remote_field.through.objects.filter(**{f'{item_column}__in': ids})
+    links = links.order_by(f'{genre_column}__source_id')
+    for item_id, source_id, title in links.values_list(item_column, f'{genre_column}__source_id',
+                                                       f'{genre_column}__title'):
+        genres[item_id].append({'id': source_id, 'title': title})
+    return genres
+
+
+def attach_genres(rows):
+    """
+    Sets 'genres' on every union row of films and tvs with at most one query per row type.
+    Rows are dicts with at least 'id' and 'type', e.g. a page of catalog entry values.
+    :param rows: iterable of row dicts, changed in place.
+    :return: list of the rows.
+    """
+    rows = list(rows)
+    films = [row for row in rows if row['type'] == 'movie']
+    tvs = [row for row in rows if row['type'] != 'movie']
+    for model, model_rows in ((Film, films), (Tv, tvs)):
+        genres = get_genres_by_id(model, [row['id'] for row in model_rows])
+        for row in model_rows:
+            row['genres'] = genres.get(row['id'], [])
+    return rows
+
+
+def assign_genre_bits():
+    """
+    Gives bits to the source ids of movie and tv genres which have none, as long as bits are left.
+    The table is locked only when some genre is new, so refreshes of known genres do not wait for each other.
+    :return: number of assigned bits.
+    """
+    bit_table = GenreBit._meta.db_table
+    missing = f"""
+        SELECT source_id FROM {Genre._meta.db_table} WHERE source_id IS NOT NULL
+        UNION SELECT source_id FROM {TvGenre._meta.db_table} WHERE source_id IS NOT NULL
+        EXCEPT SELECT source_id FROM {bit_table}"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT EXISTS ({missing})')
+        if not cursor.fetchone()[0]:
+            return 0
+        with transaction.atomic():
+            cursor.execute(f'LOCK TABLE {bit_table} IN SHARE ROW EXCLUSIVE MODE')
+            cursor.execute(f"""
+                INSERT INTO {bit_table} (source_id, bit)
+                SELECT source_id, bit
+                FROM (SELECT source_id, (SELECT coalesce(max(bit) + 1, 0) FROM {bit_table})
+                                        + row_number() OVER (ORDER BY source_id) - 1 AS bit
+                      FROM ({missing}) missing) numbered
+                WHERE bit < %s
+            """, [MAX_GENRE_BITS])
+            return cursor.rowcount
+
+
+def get_genre_mask_sql(model, item='item'):
+    """
+    :param model: Film or Tv.
+    :param item: alias of the model table in the query.
+    :return: SQL of the genre mask of the film or tv from the bits of its genres.
+    """
+    field = model._meta.get_field('genre_ids')
+    return f"""(
+        SELECT coalesce(bit_or(1::bigint << genre_bit.bit), 0)
+        FROM {field.remote_field.through._meta.db_table} link
+        JOIN {field.related_model._meta.db_table} genre ON genre.id = link.{field.m2m_reverse_name()}
+        JOIN {GenreBit._meta.db_table} genre_bit ON genre_bit.source_id = genre.source_id
+        WHERE link.{field.m2m_column_name()} = {item}.id)"""
+
+
+def get_genre_masks(source_ids):
+    """
+    :return: dict of genre source id to its bit in the genre masks, for the requested source ids with bits.
+    """
+    return {source_id: 1 << bit
+            for source_id, bit in GenreBit.objects.filter(source_id__in=source_ids).values_list('source_id', 'bit')}
+
+
+def filter_by_genres(queryset, genres=None, genres_match='all'):
+    """
+    :param queryset: catalog entries, films or tvs.
+    :param genres: genre mask with the bits of the genres, no filter when None or 0.
+    :param genres_match: 'all' keeps the rows with every genre, 'any' the rows with some of them.
+    """
+    if not genres:
+        return queryset
+    return queryset.filter(**{f'genre_mask__bits_{genres_match}': genres})
+
+
+def count_genres(queryset):
+    """
+    Counts the rows of the queryset with every genre in one scan, one filtered COUNT per genre bit.
+    :return: total of rows and list of {'id': genre source id, 'title': genre title, 'count': rows}
+             ordered by title.
+    """
+    bits = dict(GenreBit.objects.values_list('source_id', 'bit'))
+    counts = queryset.aggregate(total=Count('id'), **{
+        f'genre_{source_id}': Count('id', filter=Q(genre_mask__bits_any=1 << bit))
+        for source_id, bit in bits.items()})
+    titles = dict(TvGenre.objects.filter(source_id__in=bits).values_list('source_id', 'title'))
+    titles.update(Genre.objects.filter(source_id__in=bits).values_list('source_id', 'title'))
+    genres = [{'id': source_id, 'title': titles.get(source_id), 'count': counts[f'genre_{source_id}']}
+              for source_id in bits]
+    return counts['total'], sorted(genres, key=lambda genre: (genre['title'] or '', genre['id']))
@@ -0,0 +1,301 @@
+import hashlib
+import json
+import threading
+from collections import Counter
+from queue import Queue, Full
+from django.conf import settings
+from django.db import connection, transaction
+from .catalog import refresh_catalog
+from .fetcher import TmdbFetcher
+from .models import Film, Genre, Tv, TvGenre
+from .search_index import record_search_changes
+
+END_OF_PAGES = object()
+
+FILM_FIELDS = ("popularity", "vote_count", "video", "poster_path", "adult",
+               "backdrop_path", "original_language", "original_title", "title",
+               "vote_average", "overview", "release_date")
+TV_FIELDS = ("poster_path", "popularity", "backdrop_path", "vote_average",
+             "overview", "first_air_date", "original_language", "vote_count",
+             "name", "original_name")
+
+
+def payload_digest(payload):
+    """
+    :param payload: normalised upstream data of one row, lists must be sorted by the caller.
+    :return: sha1 hex digest of the payload.
+    """
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def build_row(model, row_dict, fields, row_type):
+    """
+    Builds an unsaved model instance from one TMDB result dict.
+    :param model: Film or Tv model class.
+    :param row_dict: one item of the 'results' list from TMDB.
+    :param fields: names of the model fields copied from the result dict.
+    :param row_type: value for the 'type' column ('movie' or 'tv').
+    :return: unsaved model instance with the digest of the copied fields and genres.
+    """
+    row = model(source_id=row_dict.get('id'), type=row_type)
+    payload = {'genre_ids': sorted(row_dict.get('genre_ids', []))}
+    for field in fields:
+        payload[field] = row_dict.get(field)
+        setattr(row, field, row_dict.get(field))
+    row.payload_hash = payload_digest(payload)
+    return row
+
+
+def upsert_rows(model, rows, fields, hash_fields=('payload_hash',)):
+    """
+    Writes a batch of rows keyed on the unique source_id with one multi-row INSERT ... ON CONFLICT DO UPDATE,
+    so shards writing the same source id at once never insert it twice.
+    Rows with the same hashes as stored are not written at all,
+    a hash left None on a row keeps the stored one, e.g. for data absent in the payload.
+    :param model: Film, Tv or Person model class.
+    :param rows: unsaved model instances, the last one wins for a repeated source_id.
+    :param fields: names of the fields to overwrite on changed rows.
+    :param hash_fields: names of the digest fields compared with the stored ones.
+    :return: tuple of written rows (with primary keys set)
+             and Counter with 'inserted', 'updated' and 'unchanged'.
+    """
+    rows = {row.source_id: row for row in rows}
+    if not rows:
+        return [], Counter()
+    table = model._meta.db_table
+    columns = model._meta.concrete_fields
+    values = ', '.join(f"({', '.join(['%s'] * len(columns))})" for _ in rows)
+    params = [field.get_db_prep_save(getattr(row, field.attname), connection)
+              for row in rows.values() for field in columns]
+    hash_columns = [model._meta.get_field(name).column for name in hash_fields]
+    new_hashes = [f'COALESCE(EXCLUDED.{column}, {table}.{column})' for column in hash_columns]
+    assignments = ', '.join([f'{column} = EXCLUDED.{column}'
+                             for column in (model._meta.get_field(name).column for name in fields)]
+                            + [f'{column} = {new_hash}' for column, new_hash in zip(hash_columns, new_hashes)])
+    with connection.cursor() as cursor:
+        # xmax is 0 only for the rows the statement inserted
+        cursor.execute(f"""
+            INSERT INTO {table} ({', '.join(field.column for field in columns)})
+            VALUES {values}
+            ON CONFLICT (source_id) DO UPDATE SET {assignments}
+            WHERE ({', '.join(f'{table}.{column}' for column in hash_columns)})
+                IS DISTINCT FROM ({', '.join(new_hashes)})
+            RETURNING id, source_id, xmax = 0
+        """, params)
+        written = cursor.fetchall()
+    for row_id, source_id, _ in written:
+        rows[source_id].id = row_id
+    inserted = sum(1 for _, _, is_inserted in written if is_inserted)
+    return [rows[source_id] for _, source_id, _ in written], Counter(
+        inserted=inserted, updated=len(written) - inserted, unchanged=len(rows) - len(written))
+
+
+def link_related(model, field_name, links, replaced_ids=()):
+    """
+    Adds related objects to rows with one bulk INSERT into the through table, existing links are kept.
+    Links of the replaced rows which are not among the given ones are deleted first,
+    so e.g. genres removed upstream are unlinked from the changed rows.
+    :param model: model class of the rows, e.g. Film.
+    :param field_name: name of the many to many field, e.g. 'genre_ids'.
+    :param links: iterable of (row primary key, related object primary key) pairs.
+    :param replaced_ids: primary keys of the rows whose links become the given ones.
+    """
+    field = model._meta.get_field(field_name)
+    through = field.remote_field.through
+    row_column = f'{field.m2m_field_name()}_id'
+    related_column = f'{field.m2m_reverse_field_name()}_id'
+    links = set(links)
+    if replaced_ids:
+        stored = through.objects.filter(**{f'{row_column}__in': replaced_ids})
+        stale_ids = [link_id for link_id, row_id, related_id in stored.values_list('id', row_column, related_column)
+                     if (row_id, related_id) not in links]
+        if stale_ids:
+            through.objects.filter(id__in=stale_ids).delete()
+    through.objects.bulk_create([through(**{row_column: row_id, related_column: related_id})
+                                 for row_id, related_id in links],
+                                ignore_conflicts=True)
+
+
+def get_genre_map(genre_model, source_ids):
+    """
+    :return: dict of genre source_id to genre primary key for the requested source ids.
+    """
+    return dict(genre_model.objects.filter(source_id__in=source_ids).values_list('source_id', 'id'))
+
+
+def copy_movie_genres(source_ids):
+    """
+    Creates tv genres which are known only as movie genres, the same way TMDB shares genre ids.
+    :param source_ids: source ids of the absent tv genres.
+    :return: dict of source_id to primary key of the created tv genres.
+    """
+    tv_genres = [TvGenre(source_id=genre.source_id, title=genre.title)
+                 for genre in Genre.objects.filter(source_id__in=source_ids)]
+    TvGenre.objects.bulk_create(tv_genres)
+    return {genre.source_id: genre.id for genre in tv_genres}
+
+
+@transaction.atomic
+def upsert_films(films_list):
+    """
+    Persists one page of TMDB 'discover/movie' results with their genres.
+    Genres of inserted and changed films are replaced with the listed ones,
+    and only for them the catalog is refreshed and search index changes are recorded.
+    :param films_list: list of film dicts from TMDB.
+    :return: Counter of 'inserted', 'updated', 'unchanged' and 'missing_genres'.
+    """
+    films = [build_row(Film, film_dict, FILM_FIELDS, 'movie') for film_dict in films_list]
+    films, report = upsert_rows(Film, films, FILM_FIELDS + ('type',))
+    film_ids = {film.source_id: film.id for film in films}
+    films_list = [film_dict for film_dict in films_list if film_dict.get('id') in film_ids]
+    if not films_list:
+        return report
+
+    genre_source_ids = {genre_id for film_dict in films_list for genre_id in film_dict.get('genre_ids', [])}
+    genre_map = get_genre_map(Genre, genre_source_ids)
+    report['missing_genres'] = len(genre_source_ids - set(genre_map))
+    link_related(Film, 'genre_ids', {(film_ids[film_dict.get('id')], genre_map[genre_id])
+                                     for film_dict in films_list
+                                     for genre_id in film_dict.get('genre_ids', [])
+                                     if genre_id in genre_map},
+                 film_ids.values())
+    refresh_catalog(Film, film_ids.values())
+    record_search_changes('movie', film_ids.values())
+    return report
+
+
+@transaction.atomic
+def upsert_tvs(tvs_list):
+    """
+    Persists one page of TMDB 'discover/tv' results with their genres.
+    Genres of inserted and changed tvs are replaced with the listed ones,
+    and only for them the catalog is refreshed and search index changes are recorded,
+    genres absent among tv genres are copied from movie genres.
+    :param tvs_list: list of tv dicts from TMDB.
+    :return: Counter of 'inserted', 'updated', 'unchanged' and 'missing_genres'.
+    """
+    tvs = [build_row(Tv, tv_dict, TV_FIELDS, 'tv') for tv_dict in tvs_list]
+    tvs, report = upsert_rows(Tv, tvs, TV_FIELDS + ('type',))
+    tv_ids = {tv.source_id: tv.id for tv in tvs}
+    tvs_list = [tv_dict for tv_dict in tvs_list if tv_dict.get('id') in tv_ids]
+    if not tvs_list:
+        return report
+
+    genre_source_ids = {genre_id for tv_dict in tvs_list for genre_id in tv_dict.get('genre_ids', [])}
+    genre_map = get_genre_map(TvGenre, genre_source_ids)
+    if genre_source_ids - set(genre_map):
+        genre_map.update(copy_movie_genres(genre_source_ids - set(genre_map)))
+    report['missing_genres'] = len(genre_source_ids - set(genre_map))
+    link_related(Tv, 'genre_ids', {(tv_ids[tv_dict.get('id')], genre_map[genre_id])
+                                   for tv_dict in tvs_list
+                                   for genre_id in tv_dict.get('genre_ids', [])
+                                   if genre_id in genre_map},
+                 tv_ids.values())
+    refresh_catalog(Tv, tv_ids.values())
+    record_search_changes('tv', tv_ids.values())
+    return report
+
+
+def split_pages(total_pages, shard_size):
+    """
+    Splits pages of a listing into shards.
+    :return: list of (first page, last page) pairs covering pages 1..total_pages.
+    """
+    return [(first_page, min(first_page + shard_size - 1, total_pages))
+            for first_page in range(1, total_pages + 1, shard_size)]
+
+
+def put_until_stopped(pages_queue, item, stop):
+    """
+    Puts the item into the bounded queue, waiting while it is full until the consumer stops.
+    :return: whether the item was put.
+    """
+    while not stop.is_set():
+        try:
+            pages_queue.put(item, timeout=1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def produce_pages(pages, pages_queue, stop):
+    """
+    Producer stage: moves fetched pages into the bounded queue, blocks while the queue is full.
+    Fetching errors are passed to the consumer through the queue.
+    Every put gives up once the consumer stops, so a failed write never leaves the producer blocked.
+    """
+    try:
+        for page_results in pages:
+            if not put_until_stopped(pages_queue, page_results, stop):
+                return
+        put_until_stopped(pages_queue, END_OF_PAGES, stop)
+    except Exception as exception:  # pylint: disable=broad-except
+        put_until_stopped(pages_queue, exception, stop)
+
+
+def run_pipeline(pages, writer, batch_size=None, queue_size=None, checkpoint=None):
+    """
+    Streams fetched pages into the database: a producer thread pulls pages into a bounded queue
+    while the calling thread writes them in batches, so downloading and writing overlap.
+    :param pages: iterable of TMDB 'results' lists, e.g. TmdbFetcher.iter_pages(url),
+                  or of (page number, 'results' list) pairs when checkpoint is given.
+    :param writer: function persisting a list of result dicts and returning a Counter report.
+    :param batch_size: number of result dicts written at once.
+    :param queue_size: number of pages buffered between the stages.
+    :param checkpoint: function marking page numbers as committed, called in the batch transaction.
+    :return: Counter with the sum of the writer reports.
+    """
+    batch_size = batch_size or settings.INGESTION_BATCH_SIZE
+    pages_queue = Queue(maxsize=queue_size or settings.INGESTION_QUEUE_SIZE)
+    stop = threading.Event()
+    producer = threading.Thread(target=produce_pages, args=(pages, pages_queue, stop), daemon=True)
+    producer.start()
+
+    def write(batch, batch_pages):
+        with transaction.atomic():
+            batch_report = writer(batch)
+            if checkpoint is not None:
+                checkpoint(batch_pages)
+        return batch_report
+
+    report = Counter()
+    batch, batch_pages = [], []
+    try:
+        while True:
+            page_results = pages_queue.get()
+            if page_results is END_OF_PAGES:
+                break
+            if isinstance(page_results, Exception):
+                raise page_results
+            if checkpoint is not None:
+                page, page_results = page_results
+                batch_pages.append(page)
+            batch += page_results
+            if len(batch) >= batch_size:
+                report += write(batch, batch_pages)
+                batch, batch_pages = [], []
+        if batch or batch_pages:
+            report += write(batch, batch_pages)
+    finally:
+        stop.set()
+        producer.join()
+    return report
+
+
+def ingest_pages(url, first_page, last_page, writer, job=None):
+    """
+    Ingests a range of pages of a TMDB listing.
+    With a job the pages it has committed are neither fetched nor written again,
+    and every written batch checkpoints its pages.
+    :param url: paginated TMDB endpoint url.
+    :param writer: function persisting a list of result dicts and returning a Counter report.
+    :param job: IngestionJob the pages belong to.
+    :return: Counter report of the writer.
+    """
+    fetcher = TmdbFetcher()
+    if job is None:
+        return run_pipeline(fetcher.iter_pages(url, first_page, last_page), writer)
+    completed_pages = job.completed_pages()
+    pages = [page for page in range(first_page, last_page + 1) if page not in completed_pages]
+    return run_pipeline(fetcher.iter_numbered_pages(url, pages), writer, checkpoint=job.checkpoint)
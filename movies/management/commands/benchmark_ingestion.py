@@ -0,0 +1,68 @@
+import resource
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from movies.fake_tmdb import FakeTmdbServer
+from movies.tasks import get_films_shard, get_genres, get_tv_genres, get_tvs_shard
+from people.tasks import get_people_shard
+
+# kind: (listing path, shard task)
+BENCHMARKS = {
+    'films': ('discover/movie', get_films_shard),
+    'tvs': ('discover/tv', get_tvs_shard),
+    'people': ('person/popular', get_people_shard),
+}
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting round trips.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ("Runs the TMDB ingestion tasks against a local fake TMDB server and reports "
+            "pages/sec, rows/sec, database round trips per row and peak RSS. "
+            "Written rows are rolled back unless --keep is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds', choices=list(BENCHMARKS),
+                            help='ingestion to run, may be repeated, all of them by default')
+        parser.add_argument('--pages', type=int, default=50, help='pages of every listing')
+        parser.add_argument('--page-size', type=int, default=20, help='results on a page')
+        parser.add_argument('--latency', type=float, default=0.05, help='seconds every response is delayed by')
+        parser.add_argument('--rate', type=float, default=1000, help='TMDB requests per second limit')
+        parser.add_argument('--keep', action='store_true', help='commit the written rows')
+
+    def handle(self, *args, **options):
+        with FakeTmdbServer(options['pages'], options['page_size'], options['latency']) as server, \
+                override_settings(TMDB_REQUESTS_PER_SECOND=options['rate']), transaction.atomic():
+            get_genres(server.url + 'genre/movie/list')
+            get_tv_genres(server.url + 'genre/tv/list')
+            # people link to films and tvs, so they go last
+            for kind in sorted(options['kinds'] or BENCHMARKS, key=list(BENCHMARKS).index):
+                self.benchmark(kind, server.url, options['pages'], options['page_size'])
+            transaction.set_rollback(not options['keep'])
+
+    def benchmark(self, kind, api_url, pages, page_size):
+        listing_path, shard_task = BENCHMARKS[kind]
+        query_counter = QueryCounter()
+        started_at = time.perf_counter()
+        with connection.execute_wrapper(query_counter):
+            report = shard_task(api_url + listing_path, 1, pages)
+        duration = time.perf_counter() - started_at
+        rows = pages * page_size
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        self.stdout.write(f'{kind}: {pages} pages, {rows} rows in {duration:.2f}s, '
+                          f'{pages / duration:.1f} pages/sec, {rows / duration:.1f} rows/sec, '
+                          f'{query_counter.count / rows:.3f} queries/row, peak RSS {peak_rss:.1f} MB')
+        self.stdout.write(f'{kind} report: {report}')
@@ -0,0 +1,86 @@
+import time
+from io import BytesIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from comments.models import Comment
+from comments.views import MovieCommentsView
+from movies.catalog import refresh_catalog
+from movies.models import Film, Genre
+from movies.pagination import CountedPageNumberPagination
+from movies.views import FilmsJsonView
+from myproject.renderers import FastJSONParser, FastJSONRenderer, orjson
+from users.models import User
+
+OVERVIEW = ('A retired thief is pulled back for one last job across three cities, '
+            'where every crew member has a reason to betray the others. ') * 3
+
+
+class Command(BaseCommand):
+    help = ("Renders and parses the payloads of FilmsJsonView and MovieCommentsView pages with the stock "
+            "DRF JSON renderer and parser and with the orjson backed ones and reports microseconds per call. "
+            "Seeded rows are rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='films and comments on a page')
+        parser.add_argument('--repeat', type=int, default=500, help='renders of every payload')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write('orjson is not installed, FastJSONRenderer falls back to the stock renderer.')
+        with transaction.atomic():
+            payloads = self.get_payloads(options['page_size'])
+            transaction.set_rollback(True)
+        cache.clear()
+        for name, data in payloads.items():
+            self.benchmark(name, data, options['repeat'])
+
+    @staticmethod
+    def get_payloads(page_size):
+        """
+        Seeds a page of films with genres and a page of comments and returns the data of both views.
+        """
+        genres = Genre.objects.bulk_create([Genre(source_id=number, title=f'Genre {number}') for number in range(3)])
+        films = Film.objects.bulk_create([Film(source_id=number, title=f'Film {number}',
+                                               original_title=f'Film {number}',
+                                               overview=OVERVIEW, popularity=number / 7, vote_average=7.3,
+                                               vote_count=number, poster_path='/poster.jpg',
+                                               backdrop_path='/backdrop.jpg', original_language='en',
+                                               release_date='2019-12-01', adult=False, video=False, type='movie')
+                                          for number in range(page_size)])
+        Film.genre_ids.through.objects.bulk_create([Film.genre_ids.through(film_id=film.id, genre_id=genre.id)
+                                                    for film in films for genre in genres])
+        refresh_catalog(Film)
+        author = User.objects.create(username='benchmark_renderers', email='benchmark@example.com')
+        for number in range(page_size):
+            Comment.add_root(author=author, film=films[0], text=f'{OVERVIEW} {number}')
+
+        factory = APIRequestFactory()
+        with mock.patch.object(CountedPageNumberPagination, 'page_size', page_size):
+            films_data = FilmsJsonView.as_view()(factory.get('/movies/api/')).data
+            comments_data = MovieCommentsView.as_view()(factory.get(
+                '/comments/', {'movie_id': str(films[0].id), 'movie_type': 'movie'})).data
+        return {'FilmsJsonView': films_data, 'MovieCommentsView': comments_data}
+
+    def benchmark(self, name, data, repeat):
+        results = {}
+        for label, renderer, parser in (('stock', JSONRenderer(), JSONParser()),
+                                        ('orjson', FastJSONRenderer(), FastJSONParser())):
+            started_at = time.perf_counter()
+            for _ in range(repeat):
+                rendered = renderer.render(data, 'application/json')
+            render_seconds = time.perf_counter() - started_at
+            started_at = time.perf_counter()
+            for _ in range(repeat):
+                parser.parse(BytesIO(rendered), 'application/json', {'encoding': 'utf-8'})
+            parse_seconds = time.perf_counter() - started_at
+            results[label] = (render_seconds, parse_seconds)
+            self.stdout.write(f'{name} {label}: {len(rendered)} bytes, '
+                              f'render {render_seconds / repeat * 1e6:.0f} us, '
+                              f'parse {parse_seconds / repeat * 1e6:.0f} us')
+        self.stdout.write(f"{name} speedup: render x{results['stock'][0] / results['orjson'][0]:.1f}, "
+                          f"parse x{results['stock'][1] / results['orjson'][1]:.1f}")
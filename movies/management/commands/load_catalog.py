@@ -0,0 +1,206 @@
+import gzip
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from movies.catalog import refresh_catalog
+from movies.ingestion import FILM_FIELDS, TV_FIELDS
+from movies.models import Film, Genre, Tv, TvGenre
+from movies.search_index import record_search_changes
+from people.ingestion import PERSON_FIELDS
+from people.models import Person
+
+STAGING_TABLE = 'catalog_staging'
+LATEST_TABLE = 'catalog_latest'
+SQL_TYPES = {'FloatField': 'float8', 'IntegerField': 'integer', 'BooleanField': 'boolean'}
+
+
+class CopyReader:
+    """
+    File-like object feeding JSON lines of the dumps to COPY in text format.
+    """
+
+    def __init__(self, paths):
+        self.lines = self.iter_lines(paths)
+        self.buffer = b''
+
+    @staticmethod
+    def iter_lines(paths):
+        for path in paths:
+            with (gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')) as dump:
+                for line in dump:
+                    line = line.strip()
+                    if line:
+                        # raw tabs may only be JSON whitespace, backslashes are COPY escapes
+                        yield line.replace(b'\\', b'\\\\').replace(b'\t', b' ').replace(b'\r', b' ') + b'\n'
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+
+def column_expression(field):
+    """
+    :return: SQL expression reading the field from the staged payload.
+    """
+    value = f"payload->>'{field.attname}'"
+    if field.get_internal_type() in SQL_TYPES:
+        value = f"({value})::{SQL_TYPES[field.get_internal_type()]}"
+    elif field.max_length:
+        value = f"left({value}, {field.max_length})"
+    if not field.null and isinstance(field.get_default(), bool):
+        value = f"coalesce({value}, {str(field.get_default()).lower()})"
+    return value
+
+
+class Command(BaseCommand):
+    help = ("Loads JSON lines dumps (optionally gzipped) of movies, tvs, genres and people "
+            "into the catalog. Every line is a TMDB object with 'kind' set to one of "
+            "'genre', 'tv_genre', 'movie', 'tv' or 'person'.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='paths of .jsonl or .jsonl.gz dumps')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('load_catalog needs PostgreSQL COPY.')
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.stage(cursor, options['paths'])
+            report = Counter()
+            report.update(self.merge_genres(cursor, Genre, 'genre'))
+            report.update(self.merge_genres(cursor, TvGenre, 'tv_genre'))
+            report.update(self.merge_rows(cursor, Film, FILM_FIELDS, 'movie'))
+            report.update(self.merge_rows(cursor, Tv, TV_FIELDS, 'tv'))
+            report.update(self.merge_rows(cursor, Person, PERSON_FIELDS, 'person'))
+            self.copy_missing_tv_genres(cursor)
+            self.link(cursor, Film, 'genre_ids', 'movie', "payload->'genre_ids'")
+            self.link(cursor, Tv, 'genre_ids', 'tv', "payload->'genre_ids'")
+            self.link(cursor, Person, 'known_for', 'person',
+                      "(SELECT jsonb_agg(title->'id') FROM jsonb_array_elements(payload->'known_for') title "
+                      "WHERE title->>'media_type' = 'movie')")
+            self.link(cursor, Person, 'known_for_tv', 'person',
+                      "(SELECT jsonb_agg(title->'id') FROM jsonb_array_elements(payload->'known_for') title "
+                      "WHERE title->>'media_type' = 'tv')")
+            cursor.execute(f'DROP TABLE {LATEST_TABLE}, {STAGING_TABLE}')
+            report['catalog_refreshed'] = refresh_catalog(Film) + refresh_catalog(Tv)
+            record_search_changes('person')
+
+        for key in sorted(report):
+            self.stdout.write(f'{key}: {report[key]}')
+
+    def stage(self, cursor, paths):
+        """
+        Streams the dumps into a temporary table with COPY and keeps the last line of every object.
+        """
+        cursor.execute(f'CREATE TEMPORARY TABLE {STAGING_TABLE} '
+                       f'(line bigserial, payload jsonb) ON COMMIT DROP')
+        try:
+            cursor.cursor.copy_expert(f'COPY {STAGING_TABLE} (payload) FROM STDIN', CopyReader(paths))
+        except OSError as exception:
+            raise CommandError(str(exception))
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {LATEST_TABLE} ON COMMIT DROP AS
+            SELECT DISTINCT ON (payload->>'kind', (payload->>'id')::integer)
+                   payload->>'kind' AS kind, (payload->>'id')::integer AS source_id, payload
+            FROM {STAGING_TABLE}
+            ORDER BY payload->>'kind', (payload->>'id')::integer, line DESC
+        """)
+        cursor.execute(f'CREATE INDEX ON {LATEST_TABLE} (kind, source_id)')
+        cursor.execute(f'ANALYZE {LATEST_TABLE}')
+
+    @staticmethod
+    def merge_genres(cursor, model, kind):
+        table = model._meta.db_table
+        cursor.execute(f"""
+            UPDATE {table} SET title = left(payload->>'name', 50)
+            FROM {LATEST_TABLE} latest
+            WHERE latest.kind = %s AND {table}.source_id = latest.source_id
+        """, [kind])
+        updated = cursor.rowcount
+        cursor.execute(f"""
+            INSERT INTO {table} (id, source_id, title)
+            SELECT gen_random_uuid(), source_id, left(payload->>'name', 50)
+            FROM {LATEST_TABLE} latest
+            WHERE latest.kind = %s AND NOT EXISTS (
+                SELECT 1 FROM {table} WHERE {table}.source_id = latest.source_id)
+        """, [kind])
+        return {f'{kind}_updated': updated, f'{kind}_inserted': cursor.rowcount}
+
+    @staticmethod
+    def merge_rows(cursor, model, field_names, kind):
+        """
+        Updates existing rows and inserts new ones of the kind with one statement each.
+        The payload digest is reset, so the next TMDB ingestion rewrites the rows once.
+        """
+        table = model._meta.db_table
+        fields = [model._meta.get_field(name) for name in field_names]
+        columns = [field.column for field in fields] + ['payload_hash']
+        expressions = [column_expression(field) for field in fields] + ['NULL']
+        if any(field.name == 'type' for field in model._meta.fields):
+            columns.append('type')
+            expressions.append(f"'{kind}'")
+
+        assignments = ', '.join(f'{column} = {expression}' for column, expression in zip(columns, expressions))
+        cursor.execute(f"""
+            UPDATE {table} SET {assignments}
+            FROM {LATEST_TABLE} latest
+            WHERE latest.kind = %s AND {table}.source_id = latest.source_id
+        """, [kind])
+        updated = cursor.rowcount
+        if any(field.name == 'genre_mask' for field in model._meta.fields):
+            # computed by refresh_catalog once the genres are linked
+            columns.append('genre_mask')
+            expressions.append('0')
+        cursor.execute(f"""
+            INSERT INTO {table} (id, source_id, {', '.join(columns)})
+            SELECT gen_random_uuid(), source_id, {', '.join(expressions)}
+            FROM {LATEST_TABLE} latest
+            WHERE latest.kind = %s AND NOT EXISTS (
+                SELECT 1 FROM {table} WHERE {table}.source_id = latest.source_id)
+        """, [kind])
+        return {f'{kind}_updated': updated, f'{kind}_inserted': cursor.rowcount}
+
+    @staticmethod
+    def copy_missing_tv_genres(cursor):
+        """
+        Creates tv genres known only as movie genres, the same way the TMDB ingestion does.
+        """
+        tv_genre_table = TvGenre._meta.db_table
+        cursor.execute(f"""
+            INSERT INTO {tv_genre_table} (id, source_id, title)
+            SELECT gen_random_uuid(), genre.source_id, genre.title
+            FROM {Genre._meta.db_table} genre
+            WHERE genre.source_id IN (
+                SELECT DISTINCT genre_id.value::integer
+                FROM {LATEST_TABLE} latest,
+                     jsonb_array_elements_text(coalesce(latest.payload->'genre_ids', '[]')) genre_id
+                WHERE latest.kind = 'tv')
+            AND NOT EXISTS (SELECT 1 FROM {tv_genre_table} WHERE {tv_genre_table}.source_id = genre.source_id)
+        """)
+
+    @staticmethod
+    def link(cursor, model, field_name, kind, ids_expression):
+        """
+        Inserts M2M links of the staged rows to the objects whose source ids are in ids_expression.
+        """
+        field = model._meta.get_field(field_name)
+        through_table = field.remote_field.through._meta.db_table
+        table = model._meta.db_table
+        target_table = field.related_model._meta.db_table
+        cursor.execute(f"""
+            INSERT INTO {through_table} ({field.m2m_column_name()}, {field.m2m_reverse_name()})
+            SELECT DISTINCT item.id, target.id
+            FROM {LATEST_TABLE} latest
+            JOIN {table} item ON item.source_id = latest.source_id
+            CROSS JOIN LATERAL jsonb_array_elements_text(coalesce({ids_expression}, '[]')) target_id
+            JOIN {target_table} target ON target.source_id = target_id.value::integer
+            WHERE latest.kind = %s
+            ON CONFLICT DO NOTHING
+        """, [kind])
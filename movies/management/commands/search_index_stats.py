@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from movies.search_index import SearchIndex
+
+
+class Command(BaseCommand):
+    help = ("Builds the in-memory search index of people names and film titles the way a web process "
+            "loads it and reports its size, build time and memory footprint.")
+
+    def handle(self, *args, **options):
+        stats = SearchIndex.build().get_stats()
+        for key, value in stats.items():
+            self.stdout.write(f'{key}: {value}')
+        self.stdout.write(f"megabytes: {stats['bytes'] / 2 ** 20:.1f}")
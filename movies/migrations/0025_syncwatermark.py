@@ -0,0 +1,27 @@
+# Generated by Django 2.2 on 2026-10-18 11:49
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0024_auto_20191118_1157'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source', models.CharField(max_length=10, unique=True)),
+                ('synced_at', models.DateTimeField(null=True)),
+                ('last_page', models.IntegerField(default=0)),
+                ('last_source_id', models.IntegerField(null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
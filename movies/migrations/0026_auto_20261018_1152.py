@@ -0,0 +1,23 @@
+# Generated by Django 2.2 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0025_syncwatermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='film',
+            name='payload_hash',
+            field=models.CharField(editable=False, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='tv',
+            name='payload_hash',
+            field=models.CharField(editable=False, max_length=40, null=True),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 2.2 on 2026-10-18 12:01
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import uuid
+
+POPULATE_SQL = """
+INSERT INTO movies_catalogentry (id, source_id, popularity, vote_average, vote_count, poster_path,
+    backdrop_path, original_language, type, overview, title, original_title, release_date, genre_ids)
+SELECT film.id, film.source_id, film.popularity, film.vote_average, film.vote_count, film.poster_path,
+    film.backdrop_path, film.original_language, film.type, film.overview, film.title, film.original_title,
+    film.release_date,
+    ARRAY(SELECT genre.source_id FROM movies_film_genre_ids link
+          JOIN movies_genre genre ON genre.id = link.genre_id
+          WHERE link.film_id = film.id AND genre.source_id IS NOT NULL ORDER BY genre.source_id)
+FROM movies_film film;
+INSERT INTO movies_catalogentry (id, source_id, popularity, vote_average, vote_count, poster_path,
+    backdrop_path, original_language, type, overview, title, original_title, release_date, genre_ids)
+SELECT tv.id, tv.source_id, tv.popularity, tv.vote_average, tv.vote_count, tv.poster_path,
+    tv.backdrop_path, tv.original_language, tv.type, tv.overview, tv.name, tv.original_name, tv.first_air_date,
+    ARRAY(SELECT genre.source_id FROM movies_tv_genre_ids link
+          JOIN movies_tvgenre genre ON genre.id = link.tvgenre_id
+          WHERE link.tv_id = tv.id AND genre.source_id IS NOT NULL ORDER BY genre.source_id)
+FROM movies_tv tv
+ON CONFLICT (id) DO NOTHING;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0027_ingestioncheckpoint_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source_id', models.IntegerField(db_index=True, null=True)),
+                ('popularity', models.FloatField(null=True)),
+                ('vote_average', models.FloatField(null=True)),
+                ('vote_count', models.IntegerField(null=True)),
+                ('poster_path', models.CharField(max_length=100, null=True)),
+                ('backdrop_path', models.CharField(max_length=100, null=True)),
+                ('original_language', models.CharField(max_length=10, null=True)),
+                ('type', models.CharField(max_length=5, null=True)),
+                ('overview', models.TextField(blank=True, null=True)),
+                ('title', models.CharField(max_length=1000, null=True)),
+                ('original_title', models.CharField(max_length=1000, null=True)),
+                ('release_date', models.CharField(max_length=10, null=True)),
+                ('genre_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0028_catalogentry'),
+    ]
+
+    operations = [
+        # cursor pagination key ('-popularity', 'id'), Index() can not put NULLs last
+        migrations.RunSQL(
+            'CREATE INDEX movies_catalogentry_popularity_id_idx '
+            'ON movies_catalogentry (popularity DESC NULLS LAST, id)',
+            'DROP INDEX movies_catalogentry_popularity_id_idx',
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# pg_trgm is a contrib extension, servers without it keep the substring search
+TRIGRAM_INDEXES_SQL = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS movies_catalogentry_title_trgm_idx
+            ON movies_catalogentry USING gin (title gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS movies_catalogentry_original_title_trgm_idx
+            ON movies_catalogentry USING gin (original_title gin_trgm_ops);
+    END IF;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0029_catalogentry_popularity_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            TRIGRAM_INDEXES_SQL,
+            'DROP INDEX IF EXISTS movies_catalogentry_title_trgm_idx, movies_catalogentry_original_title_trgm_idx',
+        ),
+    ]
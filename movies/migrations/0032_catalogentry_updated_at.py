@@ -0,0 +1,19 @@
+# Generated by Django 2.2 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0031_searchindexchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogentry',
+            name='updated_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.RunSQL('UPDATE movies_catalogentry SET updated_at = now()', migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def create_index(column, descending):
+    """
+    :return: RunSQL of the index on (column, id) for the 'ordering' param,
+             scanned backwards by the reversed cursor pagination.
+    """
+    name = f"movies_catalogentry_{column}_{'desc' if descending else 'asc'}_id_idx"
+    direction = ' DESC NULLS LAST' if descending else ''
+    return migrations.RunSQL(
+        f'CREATE INDEX {name} ON movies_catalogentry ({column}{direction}, id)',
+        f'DROP INDEX {name}',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0032_catalogentry_updated_at'),
+    ]
+
+    # ('-popularity', 'id') has movies_catalogentry_popularity_id_idx, Index() can not put NULLs last
+    operations = [create_index('popularity', False)] + [
+        create_index(column, descending)
+        for column in ('vote_average', 'vote_count', 'release_date') for descending in (False, True)
+    ]
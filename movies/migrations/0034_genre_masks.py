@@ -0,0 +1,62 @@
+# Generated by Django 2.2 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0033_catalogentry_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenreBit',
+            fields=[
+                ('source_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('bit', models.SmallIntegerField(unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='catalogentry',
+            name='genre_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='genre_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tv',
+            name='genre_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            '''
+            INSERT INTO movies_genrebit (source_id, bit)
+            SELECT source_id, row_number() OVER (ORDER BY source_id) - 1
+            FROM (SELECT source_id FROM movies_genre UNION SELECT source_id FROM movies_tvgenre) genre
+            WHERE source_id IS NOT NULL
+            ORDER BY source_id
+            LIMIT 63;
+            UPDATE movies_film film SET genre_mask = (
+                SELECT coalesce(bit_or(1::bigint << genre_bit.bit), 0)
+                FROM movies_film_genre_ids link
+                JOIN movies_genre genre ON genre.id = link.genre_id
+                JOIN movies_genrebit genre_bit ON genre_bit.source_id = genre.source_id
+                WHERE link.film_id = film.id);
+            UPDATE movies_tv tv SET genre_mask = (
+                SELECT coalesce(bit_or(1::bigint << genre_bit.bit), 0)
+                FROM movies_tv_genre_ids link
+                JOIN movies_tvgenre genre ON genre.id = link.tvgenre_id
+                JOIN movies_genrebit genre_bit ON genre_bit.source_id = genre.source_id
+                WHERE link.tv_id = tv.id);
+            UPDATE movies_catalogentry entry SET genre_mask = film.genre_mask
+            FROM movies_film film WHERE film.id = entry.id;
+            UPDATE movies_catalogentry entry SET genre_mask = tv.genre_mask
+            FROM movies_tv tv WHERE tv.id = entry.id;
+            ''',
+            migrations.RunSQL.noop,
+        ),
+    ]
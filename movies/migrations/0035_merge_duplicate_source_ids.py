@@ -0,0 +1,49 @@
+# Generated by Django 2.2 on 2026-10-18 12:47
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Keeps the film or tv with the lowest id of every source id written more than once by parallel shards,
+    moves the comments, wish lists, news and known for links of the others to it and deletes them.
+    """
+    CatalogEntry = apps.get_model('movies', 'CatalogEntry')
+    for model_name in ('Film', 'Tv'):
+        model = apps.get_model('movies', model_name)
+        duplicated = (model.objects.exclude(source_id=None).values('source_id')
+                      .annotate(rows=Count('id')).filter(rows__gt=1).values_list('source_id', flat=True))
+        for source_id in list(duplicated):
+            keep_id, *drop_ids = model.objects.filter(source_id=source_id).order_by('id').values_list('id', flat=True)
+            for relation in model._meta.related_objects:
+                if relation.many_to_many:
+                    through = relation.through
+                    title_column = f'{relation.field.m2m_reverse_field_name()}_id'
+                    owner_column = f'{relation.field.m2m_field_name()}_id'
+                    links = through.objects.filter(**{f'{title_column}__in': drop_ids})
+                    owner_ids = set(links.values_list(owner_column, flat=True))
+                    links.delete()
+                    through.objects.bulk_create([through(**{title_column: keep_id, owner_column: owner_id})
+                                                 for owner_id in owner_ids], ignore_conflicts=True)
+                else:
+                    relation.related_model.objects.filter(**{f'{relation.field.name}_id__in': drop_ids}) \
+                        .update(**{f'{relation.field.name}_id': keep_id})
+            model.objects.filter(id__in=drop_ids).delete()
+            CatalogEntry.objects.filter(id__in=drop_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0034_genre_masks'),
+        # models linking films and tvs, their links are moved to the kept duplicate
+        ('comments', '0003_auto_20191125_1555'),
+        ('news', '0004_auto_20191120_1402'),
+        ('people', '0010_person_popularity_asc_index'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
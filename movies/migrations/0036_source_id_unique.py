@@ -0,0 +1,23 @@
+# Generated by Django 2.2 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0035_merge_duplicate_source_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='film',
+            name='source_id',
+            field=models.IntegerField(null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='tv',
+            name='source_id',
+            field=models.IntegerField(null=True, unique=True),
+        ),
+    ]
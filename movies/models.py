@@ -1,4 +1,8 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
+from django.utils import timezone
 import uuid
 
 
@@ -25,8 +29,21 @@ class TvGenre(UUIDMixin):
         return self.title if self.title else ""
 
 
+class GenreBit(models.Model):
+    """
+    Bit of a genre source id in the genre masks of films, tvs and catalog entries,
+    shared by the movie and the tv genre with the same source id. Bits are never reassigned,
+    so stored masks stay valid. Assigned by movies.genres.assign_genre_bits.
+    """
+    source_id = models.IntegerField(primary_key=True)
+    bit = models.SmallIntegerField(unique=True)
+
+    def __str__(self):
+        return f"Genre {self.source_id} bit {self.bit}"
+
+
 class Film(UUIDMixin):
-    source_id = models.IntegerField(null=True)
+    source_id = models.IntegerField(null=True, unique=True)
     popularity = models.FloatField(null=True)
     vote_count = models.IntegerField(null=True)
     video = models.BooleanField(null=True)
@@ -36,11 +53,13 @@ class Film(UUIDMixin):
     original_language = models.CharField(max_length=5, null=True)
     original_title = models.CharField(max_length=1000, null=True)
     genre_ids = models.ManyToManyField(Genre)
+    genre_mask = models.BigIntegerField(default=0, editable=False)
     title = models.CharField(max_length=1000, null=True)
     vote_average = models.FloatField(null=True)
     overview = models.TextField(blank=True, null=True)
     release_date = models.CharField(max_length=10, null=True)
     type = models.CharField(max_length=5, default="movie")
+    payload_hash = models.CharField(max_length=40, null=True, editable=False)
 
     def __str__(self):
         return self.title
@@ -52,7 +71,7 @@ class Film(UUIDMixin):
 
 
 class Tv(UUIDMixin):
-    source_id = models.IntegerField(null=True)
+    source_id = models.IntegerField(null=True, unique=True)
     poster_path = models.CharField(max_length=100, null=True)
     popularity = models.FloatField(null=True)
     backdrop_path = models.CharField(max_length=100, null=True)
@@ -61,10 +80,12 @@ class Tv(UUIDMixin):
     first_air_date = models.CharField(max_length=10, null=True)
     original_language = models.CharField(max_length=10, null=True)
     genre_ids = models.ManyToManyField(TvGenre)
+    genre_mask = models.BigIntegerField(default=0, editable=False)
     vote_count = models.IntegerField(null=True)
     name = models.CharField(max_length=1000, null=True)
     original_name = models.CharField(max_length=1000, null=True)
     type = models.CharField(max_length=5, default="tv", null=True)
+    payload_hash = models.CharField(max_length=40, null=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -73,3 +94,108 @@ class Tv(UUIDMixin):
         return ', '.join([genre.title for genre in self.genre_ids.all()])
 
     display_genres.short_description = 'Genres'
+
+
+class SyncWatermark(UUIDMixin):
+    """
+    Progress of the incremental TMDB sync of one source: 'movie', 'tv' or 'person'.
+    """
+    source = models.CharField(max_length=10, unique=True)
+    synced_at = models.DateTimeField(null=True)
+    last_page = models.IntegerField(default=0)
+    last_source_id = models.IntegerField(null=True)
+
+    def __str__(self):
+        return f"{self.source} synced at {self.synced_at}"
+
+
+class IngestionJob(UUIDMixin):
+    """
+    Durable record of one paginated TMDB ingestion, unfinished jobs are resumed by the next run
+    once their shards stopped beating for INGESTION_JOB_LEASE.
+    """
+    name = models.CharField(max_length=20)
+    url = models.CharField(max_length=200)
+    total_pages = models.IntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True)
+    inserted = models.IntegerField(default=0)
+    updated = models.IntegerField(default=0)
+    unchanged = models.IntegerField(default=0)
+    heartbeat_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.name} ingestion started at {self.started_at}"
+
+    def is_running(self):
+        """
+        :return: whether the job was dispatched, started a shard or committed pages within INGESTION_JOB_LEASE.
+        """
+        return self.heartbeat_at is not None \
+            and timezone.now() - self.heartbeat_at < timedelta(seconds=settings.INGESTION_JOB_LEASE)
+
+    def beat(self):
+        self.heartbeat_at = timezone.now()
+        IngestionJob.objects.filter(id=self.id).update(heartbeat_at=self.heartbeat_at)
+
+    def completed_pages(self):
+        return set(self.checkpoints.values_list('page', flat=True))
+
+    def checkpoint(self, pages):
+        """
+        Marks pages as committed, call it in the transaction writing the pages.
+        """
+        self.beat()
+        IngestionCheckpoint.objects.bulk_create([IngestionCheckpoint(job=self, page=page) for page in pages],
+                                                ignore_conflicts=True)
+
+
+class IngestionCheckpoint(UUIDMixin):
+    job = models.ForeignKey(IngestionJob, on_delete=models.CASCADE, related_name='checkpoints')
+    page = models.IntegerField()
+
+    class Meta:
+        unique_together = ('job', 'page')
+
+    def __str__(self):
+        return f"Page {self.page} of {self.job}"
+
+
+class SearchIndexChange(models.Model):
+    """
+    Film, tv or person written by ingestion, replayed by the in-memory search indexes of the web processes
+    in the order of the ids. A change without object_id makes them build the index again.
+    """
+    id = models.BigAutoField(primary_key=True)
+    source = models.CharField(max_length=10)
+    object_id = models.UUIDField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.source} {self.object_id or 'reload'} changed at {self.created_at}"
+
+
+class CatalogEntry(UUIDMixin):
+    """
+    Denormalised copy of films and tvs read by the list endpoints instead of a UNION of both tables.
+    The id is the id of the film or tv, tv columns are stored under the film column names
+    the way the UNION returned them. Kept up to date by movies.catalog.refresh_catalog.
+    """
+    source_id = models.IntegerField(null=True, db_index=True)
+    popularity = models.FloatField(null=True)
+    vote_average = models.FloatField(null=True)
+    vote_count = models.IntegerField(null=True)
+    poster_path = models.CharField(max_length=100, null=True)
+    backdrop_path = models.CharField(max_length=100, null=True)
+    original_language = models.CharField(max_length=10, null=True)
+    type = models.CharField(max_length=5, null=True)
+    overview = models.TextField(blank=True, null=True)
+    title = models.CharField(max_length=1000, null=True)
+    original_title = models.CharField(max_length=1000, null=True)
+    release_date = models.CharField(max_length=10, null=True)
+    genre_ids = ArrayField(models.IntegerField(), default=list)
+    genre_mask = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, db_index=True)
+
+    def __str__(self):
+        return self.title if self.title else ""
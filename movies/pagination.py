@@ -0,0 +1,257 @@
+import hashlib
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as Base64Error
+from collections import OrderedDict
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from drf_yasg import openapi
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from .caching import get_catalog_generation
+
+CURSOR_FIELD = openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                 description='opaque cursor, pass it empty for the first page of cursor pagination')
+
+COUNT_MODES = ('exact', 'estimate', 'cached')
+ORDERING_PARAM = 'ordering'
+
+
+def get_ordering_field(fields):
+    """
+    :param fields: sortable fields, every one with B-tree indexes on (field, id) for both directions.
+    :return: swagger parameter of the ordering query param.
+    """
+    return openapi.Parameter(ORDERING_PARAM, openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                             enum=[prefix + field for field in fields for prefix in ('', '-')],
+                             description="sort field, '-' prefixed for the descending order, NULLs go last")
+
+
+def get_ordering(request, fields):
+    """
+    :param fields: sortable fields.
+    :return: sort key of the 'ordering' query param followed by 'id' to make it unique,
+             None without the param.
+    :raises ValidationError: when the field is not sortable.
+    """
+    field = request.query_params.get(ORDERING_PARAM)
+    if not field:
+        return None
+    if field.lstrip('-') not in fields:
+        raise ValidationError({ORDERING_PARAM: [f"Unknown ordering {field}, use one of {', '.join(fields)} "
+                                                f"optionally prefixed with '-'."]})
+    return field, 'id'
+
+
+def get_order_by(ordering, reverse=False):
+    """
+    :param ordering: field names, '-' prefixed for the descending order.
+    :param reverse: whether to reverse the whole ordering.
+    :return: order_by expressions with NULLs last, first when reversed,
+             so indexes on the fields with NULLS LAST are scanned in either direction.
+    """
+    order_by = []
+    for field in ordering:
+        descending = field.startswith('-') != reverse
+        expression = F(field.lstrip('-'))
+        nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        order_by.append(expression.desc(**nulls) if descending else expression.asc(**nulls))
+    return order_by
+
+
+def get_key(ordering):
+    """
+    :return: field names of the ordering without the direction.
+    """
+    return tuple(field.lstrip('-') for field in ordering)
+
+
+def estimate_count(queryset):
+    """
+    Reads the row count of an unfiltered queryset from the PostgreSQL statistics.
+    :return: estimated count or None when the queryset is filtered, combined, distinct
+             or the table has not been analysed yet.
+    """
+    query = queryset.query
+    if query.where or query.combinator or query.distinct or connections[queryset.db].vendor != 'postgresql':
+        return None
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] > 0 else None
+
+
+def cached_count(queryset):
+    """
+    Counts the queryset once per catalog generation and filter signature, for PAGINATION_COUNT_CACHE_TTL at most.
+    """
+    sql, params = queryset.query.sql_with_params()
+    signature = hashlib.sha1(f'{queryset.model._meta.label}:{sql}:{params!r}'.encode()).hexdigest()
+    key = f'count:{get_catalog_generation()}:{signature}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TTL)
+    return count
+
+
+def count_rows(queryset, count_mode):
+    """
+    :param count_mode: one of COUNT_MODES, 'estimate' falls back to 'exact' when there is no estimate.
+    :return: count and the mode which produced it.
+    """
+    if count_mode not in COUNT_MODES:
+        raise ValueError(f'Unknown count mode {count_mode}.')
+    if count_mode == 'estimate':
+        count = estimate_count(queryset)
+        if count is not None:
+            return count, 'estimate'
+    if count_mode == 'cached':
+        return cached_count(queryset), 'cached'
+    return queryset.count(), 'exact'
+
+
+class CountedPaginator(Paginator):
+    """
+    Django paginator counting with one of COUNT_MODES, count_mode is the mode used once counted.
+    """
+
+    def __init__(self, object_list, per_page, count_mode='exact', **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_mode = count_mode
+
+    @cached_property
+    def count(self):
+        count, self.count_mode = count_rows(self.object_list, self.count_mode)
+        return count
+
+
+class CountedPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination with a pluggable total count.
+    The mode is the count_mode of the view or PAGINATION_COUNT_MODE,
+    the one which produced the count is sent in the X-Count-Mode header.
+    """
+    count_mode_header = 'X-Count-Mode'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count_mode = getattr(view, 'count_mode', None) or settings.PAGINATION_COUNT_MODE
+        self.django_paginator_class = partial(CountedPaginator, count_mode=count_mode)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response[self.count_mode_header] = self.page.paginator.count_mode
+        return response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite sort key, e.g. ('-popularity', 'id').
+    Pages continue after the key of the last row with a WHERE clause instead of OFFSET
+    and no total count is run, so every page costs the same given an index on the key.
+    The last field of the ordering has to be unique. NULLs are sorted last in both directions.
+    :param ordering: field names, '-' prefixed for the descending order.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+        self.page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        self.base_url = None
+        self.first_key = self.last_key = None
+        self.has_next = self.has_previous = False
+
+    @staticmethod
+    def get_value(row, field_name):
+        value = row[field_name] if isinstance(row, dict) else getattr(row, field_name)
+        return value if value is None or isinstance(value, (int, float)) else str(value)
+
+    def encode_cursor(self, key, reverse):
+        cursor = json.dumps({'key': key, 'reverse': reverse}, separators=(',', ':'))
+        return replace_query_param(self.base_url, self.cursor_query_param, b64encode(cursor.encode()).decode())
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(b64decode(encoded.encode(), validate=True))
+            key, reverse = cursor['key'], bool(cursor['reverse'])
+        except (Base64Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(key, list) or len(key) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return key, reverse
+
+    def get_after_key(self, key, reverse):
+        """
+        :return: Q of the rows following the key in the (reversed when reverse) ordering.
+        """
+        condition, equal = Q(pk__in=[]), Q()
+        for field, value in zip(self.ordering, key):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            if value is None:
+                # NULLs go last, so nothing follows a NULL but the other NULLs, everything else in reverse
+                after = Q(**{f'{name}__isnull': False}) if reverse else Q(pk__in=[])
+                field_equal = Q(**{f'{name}__isnull': True})
+            else:
+                after = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+                if not reverse:
+                    after |= Q(**{f'{name}__isnull': True})
+                field_equal = Q(**{name: value})
+            condition |= equal & after
+            equal &= field_equal
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        key, reverse = self.decode_cursor(request)
+        queryset = queryset.order_by(*get_order_by(self.ordering, reverse))
+        if key is not None:
+            queryset = queryset.filter(self.get_after_key(key, reverse))
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        self.has_next, self.has_previous = (True, has_more) if reverse else (has_more, key is not None)
+        if rows:
+            self.first_key = [self.get_value(rows[0], field.lstrip('-')) for field in self.ordering]
+            self.last_key = [self.get_value(rows[-1], field.lstrip('-')) for field in self.ordering]
+        else:
+            self.has_next = self.has_previous = False
+        return rows
+
+    def get_next_link(self):
+        return self.encode_cursor(self.last_key, False) if self.has_next else None
+
+    def get_previous_link(self):
+        return self.encode_cursor(self.first_key, True) if self.has_previous else None
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+def get_paginator(request, ordering, default_class):
+    """
+    Picks the cursor pagination when the request has a 'cursor' param, even empty.
+    :param ordering: sort key of the cursor pagination.
+    :param default_class: pagination class used otherwise.
+    """
+    if KeysetPagination.cursor_query_param in request.query_params:
+        return KeysetPagination(ordering)
+    return default_class()
@@ -0,0 +1,108 @@
+from collections import defaultdict
+from drf_yasg import openapi
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+FIELDS_FIELD = openapi.Parameter('fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                 description='comma separated fields to return, '
+                                             'nested ones as known_for.title')
+EXCLUDE_FIELD = openapi.Parameter('exclude', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                  description='comma separated fields to leave out, '
+                                              'nested ones as known_for.overview')
+
+
+def split_paths(paths):
+    """
+    :param paths: dotted field paths, e.g. ['name', 'known_for.title'].
+    :return: dict of the first name to the rest of its paths, '' for the whole field.
+    """
+    split = defaultdict(list)
+    for path in paths:
+        name, _, rest = path.partition('.')
+        split[name].append(rest)
+    return split
+
+
+def parse_paths(value):
+    return [path.strip() for path in value.split(',') if path.strip()] if value else []
+
+
+class Projection:
+    """
+    Fields of a response picked by the 'fields' and 'exclude' query params, both comma separated dotted paths.
+    Without 'fields' all fields are kept, 'exclude' drops fields afterwards.
+    :param fields: dotted paths of the kept fields or None for all of them.
+    :param exclude: dotted paths of the dropped fields.
+    """
+
+    def __init__(self, fields=None, exclude=()):
+        self.fields = split_paths(fields) if fields else None
+        self.exclude = split_paths(exclude)
+
+    @classmethod
+    def from_request(cls, request):
+        return cls(parse_paths(request.query_params.get('fields')), parse_paths(request.query_params.get('exclude')))
+
+    def includes(self, name):
+        if self.fields is not None and name not in self.fields:
+            return False
+        return '' not in self.exclude.get(name, ())
+
+    def nested(self, name):
+        """
+        :return: projection of the fields of the nested field.
+        """
+        fields = self.fields.get(name) if self.fields is not None else None
+        return Projection(None if fields is None or '' in fields else fields,
+                          [path for path in self.exclude.get(name, ()) if path])
+
+    def filter(self, names):
+        """
+        :param names: all fields of the response.
+        :return: the projected ones in the same order.
+        :raises ValidationError: when 'fields' or 'exclude' name unknown fields.
+        """
+        unknown = (set(self.fields or ()) | set(self.exclude)) - set(names)
+        if unknown:
+            raise ValidationError({'fields': [f"Unknown fields: {', '.join(sorted(unknown))}."]})
+        return [name for name in names if self.includes(name)]
+
+
+def project_serializer(serializer, projection):
+    """
+    Drops the fields of the serializer (of its child for many=True) left out of the projection,
+    nested serializers are projected with the nested projection.
+    Method fields can read the projection from the 'projection' attribute of the serializer.
+    :return: the serializer.
+    """
+    target = serializer.child if isinstance(serializer, ListSerializer) else serializer
+    kept = projection.filter(list(target.fields))
+    for name in list(target.fields):
+        if name not in kept:
+            target.fields.pop(name)
+        elif isinstance(target.fields[name], BaseSerializer):
+            project_serializer(target.fields[name], projection.nested(name))
+    target.projection = projection
+    return serializer
+
+
+def get_model_fields(model, names):
+    """
+    :return: names of the concrete fields of the model among the names, for .only() or .values().
+    """
+    concrete = {field.name for field in model._meta.concrete_fields}
+    return [name for name in names if name in concrete]
+
+
+def get_columns(columns, keys):
+    """
+    :return: the projected columns followed by the keys absent among them, e.g. the sort key of the pagination.
+    """
+    return list(columns) + [key for key in keys if key not in columns]
+
+
+def project_rows(rows, columns):
+    """
+    :return: value dicts with only the projected columns, once the keys read with them are no longer needed.
+    """
+    return [{column: row[column] for column in columns} for row in rows]
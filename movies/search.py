@@ -0,0 +1,140 @@
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection
+from django.db.models import CharField, F, FloatField, Func, Lookup, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest
+from drf_yasg import openapi
+from people.models import Person
+from .catalog import filter_by_person
+from .models import CatalogEntry, Film, Tv
+from .search_index import get_search_index
+
+SEARCH_MATCHES = ('trigram', 'substring')
+# match: ordering of the page number pagination of the results
+SEARCH_ORDERING = {'trigram': (F('rank').desc(nulls_last=True), 'id'), 'substring': ('id', )}
+MATCH_FIELD = openapi.Parameter('match', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(SEARCH_MATCHES))
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(Lookup):
+    """
+    pg_trgm `<%` operator: the value is similar to some words of the field, served by gin_trgm_ops indexes.
+    """
+    lookup_name = 'trigram_word_similar'
+
+    def as_sql(self, compiler, connection):  # pylint: disable=redefined-outer-name
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{rhs} <%% {lhs}', rhs_params + lhs_params
+
+
+class WordSimilarity(Func):
+    function = 'word_similarity'
+    output_field = FloatField()
+
+
+@lru_cache()
+def trigram_available():
+    """
+    :return: whether the pg_trgm extension is installed, the migrations install it where PostgreSQL ships it.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def get_search_match(match):
+    """
+    :param match: one of SEARCH_MATCHES.
+    :return: the match to search with, 'trigram' falls back to 'substring' without pg_trgm.
+    """
+    if match == 'trigram' and not trigram_available():
+        return 'substring'
+    return match
+
+
+def set_similarity_threshold():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+                       [str(settings.SEARCH_SIMILARITY_THRESHOLD)])
+
+
+def get_person_rank(name):
+    """
+    :return: subquery of the best similarity of the names of the people known for the catalog entry to the name.
+    """
+    return Subquery(Person.objects.filter(Q(known_for=OuterRef('id')) | Q(known_for_tv=OuterRef('id')))
+                    .annotate(similarity=WordSimilarity(Value(name), F('name')))
+                    .order_by('-similarity').values('similarity')[:1], output_field=FloatField())
+
+
+def get_title_rank(title):
+    """
+    :return: best similarity of the titles of the films and tvs the person is known for to the title.
+    """
+    film_rank = Person.known_for.through.objects.filter(person_id=OuterRef('id')) \
+        .annotate(similarity=Greatest(WordSimilarity(Value(title), F('film__title')),
+                                      WordSimilarity(Value(title), F('film__original_title')))) \
+        .order_by(F('similarity').desc(nulls_last=True)).values('similarity')[:1]
+    tv_rank = Person.known_for_tv.through.objects.filter(person_id=OuterRef('id')) \
+        .annotate(similarity=Greatest(WordSimilarity(Value(title), F('tv__name')),
+                                      WordSimilarity(Value(title), F('tv__original_name')))) \
+        .order_by(F('similarity').desc(nulls_last=True)).values('similarity')[:1]
+    # GREATEST skips the NULL of a person known for no films or no tvs
+    return Greatest(Subquery(film_rank, output_field=FloatField()), Subquery(tv_rank, output_field=FloatField()))
+
+
+def search_catalog_by_person(name, match):
+    """
+    Finds films and tvs by the name of the people known for them.
+    The loaded search index answers which names contain the name first, for both matches.
+    :param match: 'substring' for case insensitive containment,
+                  'trigram' for names similar to the name annotated with the best similarity as 'rank',
+                  names containing the name are the closest ones, so SQL looks for similar names
+                  only when the index finds none or is not loaded.
+    :return: queryset of catalog entries.
+    """
+    index = get_search_index()
+    ids = index.titles_for_actor(name) if index else None
+    if match == 'substring':
+        if ids is not None:
+            return CatalogEntry.objects.filter(id__in=ids)
+        return filter_by_person(CatalogEntry.objects.all(), name)
+    if ids:
+        return CatalogEntry.objects.filter(id__in=ids).annotate(rank=get_person_rank(name))
+    set_similarity_threshold()
+    people = Person.objects.filter(name__trigram_word_similar=name)
+    return CatalogEntry.objects.filter(Q(id__in=Film.objects.filter(person__in=people).values('id'))
+                                       | Q(id__in=Tv.objects.filter(person__in=people).values('id'))) \
+        .annotate(rank=get_person_rank(name))
+
+
+def search_people_by_title(title, match):
+    """
+    Finds people by the titles of the films and tvs they are known for.
+    The loaded search index answers which titles contain the title first, for both matches.
+    :param match: 'substring' for case insensitive containment in film titles or original titles,
+                  'trigram' for film and tv titles or original titles similar to the title
+                  annotated with the best similarity as 'rank', titles containing the title
+                  are the closest ones, so SQL looks for similar titles only when the index finds none
+                  or is not loaded.
+    :return: queryset of people.
+    """
+    index = get_search_index()
+    if match == 'substring':
+        ids = index.people_for_title(title) if index else None
+        if ids is not None:
+            return Person.objects.filter(id__in=ids)
+        return Person.objects.filter(known_for__original_title__icontains=title) | \
+            Person.objects.filter(known_for__title__icontains=title)
+    ids = index.people_for_title(title, with_tvs=True) if index else None
+    if ids:
+        return Person.objects.filter(id__in=ids).annotate(rank=get_title_rank(title))
+    set_similarity_threshold()
+    titles = CatalogEntry.objects.filter(Q(title__trigram_word_similar=title)
+                                         | Q(original_title__trigram_word_similar=title)).values('id')
+    film_links = Person.known_for.through.objects.filter(film_id__in=titles).values('person_id')
+    tv_links = Person.known_for_tv.through.objects.filter(tv_id__in=titles).values('person_id')
+    return Person.objects.filter(Q(id__in=film_links) | Q(id__in=tv_links)).annotate(rank=get_title_rank(title))
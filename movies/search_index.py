@@ -0,0 +1,403 @@
+import logging
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from people.models import Person
+from .models import Film, SearchIndexChange, Tv
+
+TOKEN_PATTERN = re.compile(r'\w+')
+GRAM_SIZE = 3
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def grams(token):
+    return {token[start:start + GRAM_SIZE] for start in range(len(token) - GRAM_SIZE + 1)}
+
+
+def remove_position(postings, position):
+    return array('I', (item for item in postings if item != position))
+
+
+class TokenIndex:
+    """
+    Inverted index of the text fields of documents keyed by id, answering case insensitive containment.
+    Documents get compact integer positions, every token of the vocabulary has a posting array of the
+    positions of the documents containing it and every trigram of the vocabulary has an array of the tokens
+    containing it, so tokens containing a part of the query are found without scanning the vocabulary.
+    Candidates are checked against the lowercased fields, the result is the same as ILIKE '%query%'.
+    """
+
+    def __init__(self):
+        self.ids = []  # position: document id, None once removed
+        self.positions = {}  # document id: position
+        self.texts = []  # position: tuple of lowercased fields
+        self.doc_tokens = []  # position: array of the token numbers of the document
+        self.tokens = []  # token number: token
+        self.token_numbers = {}  # token: token number
+        self.postings = []  # token number: array of document positions
+        self.gram_tokens = defaultdict(lambda: array('I'))  # trigram: array of token numbers
+
+    def __len__(self):
+        return len(self.positions)
+
+    def get_token_number(self, token):
+        number = self.token_numbers.get(token)
+        if number is None:
+            number = self.token_numbers[token] = len(self.tokens)
+            self.tokens.append(token)
+            self.postings.append(array('I'))
+            for gram in grams(token):
+                self.gram_tokens[gram].append(number)
+        return number
+
+    def set(self, doc_id, *fields):
+        """
+        Adds the document or replaces its fields.
+        """
+        texts = tuple(field.lower() for field in fields if field)
+        position = self.positions.get(doc_id)
+        if position is None:
+            position = self.positions[doc_id] = len(self.ids)
+            self.ids.append(doc_id)
+            self.texts.append(texts)
+            self.doc_tokens.append(array('I'))
+        else:
+            self.unlink(position)
+            self.texts[position] = texts
+        numbers = array('I', sorted({self.get_token_number(token) for text in texts for token in tokenize(text)}))
+        for number in numbers:
+            self.postings[number].append(position)
+        self.doc_tokens[position] = numbers
+        return position
+
+    def unlink(self, position):
+        for number in self.doc_tokens[position]:
+            self.postings[number] = remove_position(self.postings[number], position)
+        self.doc_tokens[position] = array('I')
+
+    def remove(self, doc_id):
+        """
+        Drops the document, its position is not reused.
+        :return: the position of the document or None when it is not indexed.
+        """
+        position = self.positions.pop(doc_id, None)
+        if position is not None:
+            self.unlink(position)
+            self.ids[position] = None
+            self.texts[position] = ()
+        return position
+
+    def find_tokens(self, part):
+        """
+        :return: numbers of the vocabulary tokens containing the part.
+        """
+        part_grams = grams(part)
+        if not part_grams:
+            return [number for number, token in enumerate(self.tokens) if part in token]
+        candidates = None
+        for gram in sorted(part_grams, key=lambda gram: len(self.gram_tokens.get(gram, ()))):
+            numbers = self.gram_tokens.get(gram)
+            if not numbers:
+                return []
+            candidates = set(numbers) if candidates is None else candidates.intersection(numbers)
+            if not candidates:
+                return []
+        return [number for number in candidates if part in self.tokens[number]]
+
+    def search(self, query):
+        """
+        :return: set of positions of the documents with a field containing the query
+                 or None when the query has no word characters and the index cannot answer it.
+        """
+        query = query.lower()
+        parts = tokenize(query)
+        if not parts:
+            return None
+        positions = None
+        for part in sorted(set(parts), key=len, reverse=True):
+            matches = set()
+            for number in self.find_tokens(part):
+                matches.update(self.postings[number])
+            positions = matches if positions is None else positions & matches
+            if not positions:
+                return set()
+        return {position for position in positions if any(query in text for text in self.texts[position])}
+
+    def get_size(self):
+        """
+        :return: approximate bytes held by the index.
+        """
+        size = sum(map(sys.getsizeof, (self.ids, self.positions, self.texts, self.doc_tokens, self.tokens,
+                                       self.token_numbers, self.postings, self.gram_tokens)))
+        size += sum(sys.getsizeof(doc_id) for doc_id in self.positions)
+        size += sum(sys.getsizeof(texts) + sum(map(sys.getsizeof, texts)) for texts in self.texts)
+        size += sum(map(sys.getsizeof, self.doc_tokens)) + sum(map(sys.getsizeof, self.postings))
+        size += sum(map(sys.getsizeof, self.tokens))
+        size += sum(sys.getsizeof(gram) + sys.getsizeof(numbers) for gram, numbers in self.gram_tokens.items())
+        return size
+
+
+class SearchIndex:
+    """
+    In-memory answers of which actor names contain the query, for titles, and which film or tv titles do,
+    for people. Substring searches return them, trigram searches rank them before looking for similar ones.
+    People names, film titles and tv names are TokenIndexes, links between them are arrays of positions.
+    Built once per process and kept up to date by replaying SearchIndexChange rows written by ingestion.
+    """
+
+    def __init__(self):
+        self.people = TokenIndex()
+        self.films = TokenIndex()  # title, original_title
+        self.tvs = TokenIndex()  # name, original_name
+        self.person_films = []  # person position: array of film positions
+        self.person_tvs = []  # person position: array of tv positions
+        self.film_people = defaultdict(lambda: array('I'))  # film position: array of person positions
+        self.tv_people = defaultdict(lambda: array('I'))  # tv position: array of person positions
+        self.last_change_id = 0
+        self.synced_at = None
+        self.build_seconds = None
+        self.lock = threading.RLock()
+
+    @classmethod
+    def build(cls):
+        """
+        Reads all people, films, tvs and their links with one query each.
+        """
+        started_at = time.perf_counter()
+        index = cls()
+        index.last_change_id = SearchIndexChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        index.synced_at = timezone.now()
+        for film_id, title, original_title in Film.objects.values_list('id', 'title', 'original_title').iterator():
+            index.films.set(film_id, title, original_title)
+        for tv_id, name, original_name in Tv.objects.values_list('id', 'name', 'original_name').iterator():
+            index.tvs.set(tv_id, name, original_name)
+        for person_id, name in Person.objects.values_list('id', 'name').iterator():
+            index.set_person(person_id, name)
+        index.link_people(Person.objects.all())
+        index.build_seconds = time.perf_counter() - started_at
+        return index
+
+    def set_person(self, person_id, name):
+        position = self.people.set(person_id, name)
+        if position == len(self.person_films):
+            self.person_films.append(array('I'))
+            self.person_tvs.append(array('I'))
+        return position
+
+    def unlink_person(self, position):
+        for film_position in self.person_films[position]:
+            self.film_people[film_position] = remove_position(self.film_people[film_position], position)
+        for tv_position in self.person_tvs[position]:
+            self.tv_people[tv_position] = remove_position(self.tv_people[tv_position], position)
+        self.person_films[position] = array('I')
+        self.person_tvs[position] = array('I')
+
+    def link_people(self, people):
+        """
+        Replaces the links of indexed people with their known for films and tvs.
+        :param people: queryset of the people.
+        """
+        films, tvs = defaultdict(set), defaultdict(set)
+        for person_id, film_id in Person.known_for.through.objects.filter(person__in=people) \
+                .values_list('person_id', 'film_id').iterator():
+            if film_id in self.films.positions:
+                films[person_id].add(self.films.positions[film_id])
+        for person_id, tv_id in Person.known_for_tv.through.objects.filter(person__in=people) \
+                .values_list('person_id', 'tv_id').iterator():
+            if tv_id in self.tvs.positions:
+                tvs[person_id].add(self.tvs.positions[tv_id])
+        for person_id in set(films) | set(tvs):
+            position = self.people.positions.get(person_id)
+            if position is None:
+                continue
+            self.unlink_person(position)
+            self.person_films[position] = array('I', sorted(films[person_id]))
+            self.person_tvs[position] = array('I', sorted(tvs[person_id]))
+            for film_position in films[person_id]:
+                self.film_people[film_position].append(position)
+            for tv_position in tvs[person_id]:
+                self.tv_people[tv_position].append(position)
+
+    def set_titles(self, titles, title_people, person_titles, rows, changed_ids):
+        """
+        Replaces the fields of the changed films or tvs, the ones without rows are removed with their links.
+        :param titles: self.films or self.tvs.
+        :param title_people: the links of their positions to person positions.
+        :param person_titles: the links of person positions to their positions.
+        :param rows: (id, title fields...) of the changed rows still stored.
+        :param changed_ids: ids of the changed rows.
+        """
+        found = set()
+        for title_id, *fields in rows:
+            titles.set(title_id, *fields)
+            found.add(title_id)
+        for title_id in changed_ids - found:
+            position = titles.remove(title_id)
+            for person_position in title_people.pop(position, ()):
+                person_titles[person_position] = remove_position(person_titles[person_position], position)
+
+    def apply(self, changes):
+        """
+        Reloads the changed people, films and tvs, removing the deleted ones.
+        :param changes: SearchIndexChange rows without a full reload among them.
+        """
+        changed = defaultdict(set)
+        for change in changes:
+            changed[change.source].add(change.object_id)
+        if changed['movie']:
+            self.set_titles(self.films, self.film_people, self.person_films, Film.objects.filter(
+                id__in=changed['movie']).values_list('id', 'title', 'original_title'), changed['movie'])
+        if changed['tv']:
+            self.set_titles(self.tvs, self.tv_people, self.person_tvs, Tv.objects.filter(
+                id__in=changed['tv']).values_list('id', 'name', 'original_name'), changed['tv'])
+        if changed['person']:
+            found = set()
+            for person_id, name in Person.objects.filter(id__in=changed['person']).values_list('id', 'name'):
+                position = self.set_person(person_id, name)
+                self.unlink_person(position)
+                found.add(person_id)
+            for person_id in changed['person'] - found:
+                position = self.people.remove(person_id)
+                if position is not None:
+                    self.unlink_person(position)
+            self.link_people(Person.objects.filter(id__in=found))
+
+    def sync(self):
+        """
+        Replays the changes written since the last sync.
+        :return: False when a full reload was recorded or the changes since the last sync
+                 may have been pruned, the index has to be built again.
+        """
+        with self.lock:
+            now = timezone.now()
+            if (now - self.synced_at).total_seconds() >= settings.SEARCH_INDEX_CHANGES_TTL:
+                return False
+            changes = list(SearchIndexChange.objects.filter(id__gt=self.last_change_id).order_by('id'))
+            if any(change.object_id is None for change in changes):
+                return False
+            self.apply(changes)
+            if changes:
+                self.last_change_id = changes[-1].id
+            self.synced_at = now
+            return True
+
+    def titles_for_actor(self, name):
+        """
+        :return: set of ids of the films and tvs of the people whose name contains the name
+                 or None when the index cannot answer the query.
+        """
+        people = self.people.search(name)
+        if people is None:
+            return None
+        ids = set()
+        for position in people:
+            ids.update(self.films.ids[film_position] for film_position in self.person_films[position])
+            ids.update(self.tvs.ids[tv_position] for tv_position in self.person_tvs[position])
+        return ids
+
+    def people_for_title(self, title, with_tvs=False):
+        """
+        :param with_tvs: whether tv names and original names are searched besides film titles.
+        :return: set of ids of the people known for films whose title or original title contains the title
+                 [or for such tvs] or None when the index cannot answer the query.
+        """
+        films = self.films.search(title)
+        if films is None:
+            return None
+        people = {position for film_position in films for position in self.film_people.get(film_position, ())}
+        if with_tvs:
+            people.update(position for tv_position in self.tvs.search(title)
+                          for position in self.tv_people.get(tv_position, ()))
+        return {self.people.ids[position] for position in people}
+
+    def get_stats(self):
+        """
+        :return: dict of the indexed people, films and tvs, vocabulary sizes, build time and memory footprint.
+        """
+        return {
+            'people': len(self.people),
+            'films': len(self.films),
+            'tvs': len(self.tvs),
+            'name_tokens': len(self.people.tokens),
+            'title_tokens': len(self.films.tokens) + len(self.tvs.tokens),
+            'build_seconds': round(self.build_seconds or 0, 3),
+            'bytes': self.people.get_size() + self.films.get_size() + self.tvs.get_size() + sum(map(sys.getsizeof, (
+                self.person_films, self.person_tvs, self.film_people, self.tv_people)))
+            + sum(map(sys.getsizeof, self.person_films)) + sum(map(sys.getsizeof, self.person_tvs))
+            + sum(map(sys.getsizeof, self.film_people.values())) + sum(map(sys.getsizeof, self.tv_people.values())),
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+_loading = False
+_polled_at = 0.0
+
+
+def load_search_index():
+    global _index, _loading  # pylint: disable=global-statement
+    try:
+        index = SearchIndex.build()
+        logger.info('Search index loaded: %s', index.get_stats())
+        _index = index
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('Search index failed to load, searches keep using SQL.')
+    finally:
+        _loading = False
+        connection.close()
+
+
+def start_search_index():
+    """
+    Starts loading the index of this process in a background thread, called at worker start when
+    SEARCH_INDEX_ENABLED, the searches use SQL until the index is loaded.
+    """
+    global _loading  # pylint: disable=global-statement
+    with _index_lock:
+        if not settings.SEARCH_INDEX_ENABLED or _index is not None or _loading:
+            return
+        _loading = True
+    threading.Thread(target=load_search_index, name='search-index', daemon=True).start()
+
+
+def get_search_index():
+    """
+    :return: the loaded index of this process synced at most SEARCH_INDEX_POLL_INTERVAL seconds ago
+             or None when it is disabled or still loading.
+    """
+    global _index, _polled_at  # pylint: disable=global-statement
+    if _index is None:
+        start_search_index()
+        return None
+    if time.monotonic() - _polled_at >= settings.SEARCH_INDEX_POLL_INTERVAL:
+        _polled_at = time.monotonic()
+        if not _index.sync():
+            _index = None
+            start_search_index()
+    return _index
+
+
+def record_search_changes(source, ids=None):
+    """
+    Writes the change set of the people, films or tvs replayed by the indexes of all processes.
+    Written whether or not this process loads an index, ingestion workers leave SEARCH_INDEX_ENABLED off
+    while the web workers replay the changes.
+    :param source: 'movie', 'tv' or 'person'.
+    :param ids: primary keys of the written or deleted rows, None for a full reload.
+    """
+    if ids is None:
+        SearchIndexChange.objects.create(source=source)
+    else:
+        SearchIndexChange.objects.bulk_create([SearchIndexChange(source=source, object_id=object_id)
+                                               for object_id in ids])
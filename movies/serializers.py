@@ -1,5 +1,11 @@
+from functools import reduce
+from operator import or_
+from django.conf import settings
 from rest_framework import serializers
 
+from .catalog import refresh_catalog
+from .genres import GENRE_MATCHES, get_genre_masks
+from .search import SEARCH_MATCHES
 from .models import Genre, TvGenre, Film, Tv
 
 
@@ -50,6 +56,7 @@ class VoteSerializer(serializers.Serializer):
         instance.vote_average += user_vote / instance.vote_count
         instance.vote_average = round(instance.vote_average, 1)
         instance.save()
+        refresh_catalog(type(instance), [instance.id])
         return instance
 
     @staticmethod
@@ -69,6 +76,42 @@ class VoteSerializer(serializers.Serializer):
 
 class ActorNameSerializer(serializers.Serializer):
     actor_name = serializers.CharField()
+    match = serializers.ChoiceField(choices=SEARCH_MATCHES)
 
     def validate_actor_name(self, value):
         return value.replace('_', ' ')
+
+
+class CatalogExportSerializer(serializers.Serializer):
+    updated_since = serializers.DateTimeField(required=False)
+
+
+class GenreFilterSerializer(serializers.Serializer):
+    genres = serializers.CharField(required=False, allow_blank=True)
+    genres_match = serializers.ChoiceField(choices=GENRE_MATCHES, default='all')
+
+    def validate_genres(self, value):
+        """
+        :param value: comma separated genre source ids, empty for no filter.
+        :return: genre mask with the bits of the genres, 0 without genres.
+        """
+        try:
+            source_ids = {int(source_id) for source_id in value.split(',') if source_id.strip()}
+        except ValueError:
+            raise serializers.ValidationError('Genres are comma separated genre ids.')
+        masks = get_genre_masks(source_ids)
+        unknown = source_ids - set(masks)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown genres: {', '.join(map(str, sorted(unknown)))}.")
+        return reduce(or_, masks.values(), 0)
+
+
+class BatchLookupSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), min_length=1,
+                                max_length=settings.BATCH_LOOKUP_MAX_IDS)
+
+    def validate_ids(self, value):
+        """
+        :return: the ids without repeats, in the order of their first occurrence.
+        """
+        return list(dict.fromkeys(value))
@@ -0,0 +1,128 @@
+from collections import Counter
+from datetime import timedelta
+from itertools import islice
+from django.conf import settings
+from django.utils import timezone
+from people.models import Person
+from .fetcher import TmdbFetcher
+from .ingestion import run_pipeline
+from .models import Film, IngestionJob, SyncWatermark, Tv
+
+CHANGES_WINDOW = timedelta(days=14)  # TMDB keeps the changes feed for the last 14 days only
+DETAILS_PAGE_SIZE = 20
+DATE_FORMAT = '%Y-%m-%d'
+
+# source: (full listing, changes feed, details of one record)
+SYNC_SOURCES = {
+    'movie': ('discover/movie', 'movie/changes', 'movie/{}'),
+    'tv': ('discover/tv', 'tv/changes', 'tv/{}'),
+    'person': ('person/popular', 'person/changes', 'person/{}'),
+}
+# source: model of the stored records
+SYNC_MODELS = {'movie': Film, 'tv': Tv, 'person': Person}
+
+
+def normalise_details(details):
+    """
+    Converts a TMDB details response to the shape of a listing result the writers accept.
+    """
+    details = dict(details)
+    if 'genres' in details:
+        details['genre_ids'] = [genre['id'] for genre in details['genres']]
+    return details
+
+
+def track_progress(pages, progress):
+    for page_results in pages:
+        progress['page'] += 1
+        if page_results:
+            progress['source_id'] = page_results[-1].get('id')
+        yield page_results
+
+
+def iter_changed_ids(fetcher, changes_url, since, until, progress):
+    """
+    :return: generator of unique source ids from the changes feed between the dates.
+    """
+    seen_ids = set()
+    pages = fetcher.iter_pages(changes_url, start_date=since.strftime(DATE_FORMAT),
+                               end_date=until.strftime(DATE_FORMAT))
+    for page_results in track_progress(pages, progress):
+        for change in page_results:
+            if change['id'] not in seen_ids:
+                seen_ids.add(change['id'])
+                yield change['id']
+
+
+def get_stored_ids(model, source_ids):
+    """
+    The changes feed lists every changed TMDB record, e.g. adult titles the listings leave out,
+    so the incremental sync refreshes only the records already stored.
+    :return: list of the source ids stored in the model table, in the given order.
+    """
+    stored_ids = set(model.objects.filter(source_id__in=source_ids).values_list('source_id', flat=True))
+    return [source_id for source_id in source_ids if source_id in stored_ids]
+
+
+def iter_detail_pages(fetcher, details_url, source_ids, absent):
+    """
+    Fetches details of the changed records and groups them into listing-like pages.
+    Records removed from TMDB are counted in absent.
+    """
+    details = fetcher.iter_resources(details_url.format(source_id) for source_id in source_ids)
+    while True:
+        chunk = list(islice(details, DETAILS_PAGE_SIZE))
+        if not chunk:
+            return
+        absent['absent'] += chunk.count(None)
+        yield [normalise_details(record) for record in chunk if record is not None]
+
+
+def sync_source(source, writer, sweep, full=False):
+    """
+    Brings one TMDB source up to date.
+    Asks the changes feed only for stored records modified since the stored watermark and falls back
+    to a full sweep of the listing when asked to, on the first run, when the watermark is
+    older than the changes feed keeps or to resume an unfinished sweep which stopped running.
+    The full sweep runs as a sharded ingestion job with page checkpoints, its totals are recorded on the job.
+    While a sweep is running nothing is synced and the watermark is kept.
+    :param source: key of SYNC_SOURCES.
+    :param writer: function persisting a list of listing-shaped dicts and returning a Counter report.
+    :param sweep: task dispatching the shards of a listing url and returning the IngestionJob id,
+                  e.g. get_paginated_films.
+    :param full: force the full sweep.
+    :return: Counter report of the writer with 'absent' and 'untracked' counts,
+             or only 'full_sweep' or 'sweep_running'.
+    """
+    listing_path, changes_path, details_path = SYNC_SOURCES[source]
+    listing_url = settings.FILM_API_URL + listing_path
+    watermark, _ = SyncWatermark.objects.get_or_create(source=source)
+    started_at = timezone.now()
+    fetcher = TmdbFetcher()
+    progress = {'page': 0, 'source_id': None}
+
+    job = IngestionJob.objects.filter(url=listing_url, finished_at__isnull=True).order_by('-started_at').first()
+    if job is not None and job.is_running():
+        # the watermark stays at the start of the running sweep, changes since then are asked for later
+        return Counter(sweep_running=1)
+
+    if full or watermark.synced_at is None or started_at - watermark.synced_at > CHANGES_WINDOW or job is not None:
+        job = IngestionJob.objects.get(id=sweep(listing_url))
+        # a resumed sweep committed some pages before this run, changes since its start are asked for next
+        started_at = min(started_at, job.started_at)
+        progress['page'] = job.total_pages
+        report = Counter(full_sweep=1)
+    else:
+        changed_ids = list(iter_changed_ids(fetcher, settings.FILM_API_URL + changes_path,
+                                            watermark.synced_at, started_at, progress))
+        stored_ids = get_stored_ids(SYNC_MODELS[source], changed_ids)
+        absent = Counter({'untracked': len(changed_ids) - len(stored_ids)})
+        report = run_pipeline(iter_detail_pages(fetcher, settings.FILM_API_URL + details_path,
+                                                stored_ids, absent), writer)
+        report += absent
+
+    watermark.synced_at = started_at
+    watermark.last_page = progress['page']
+    watermark.last_source_id = progress['source_id']
+    watermark.save()
+    return report
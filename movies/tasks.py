@@ -1,35 +1,31 @@
+from collections import Counter
+from datetime import timedelta
 import requests
+from celery import chord
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 from myproject.celery import app
-from .models import Film, Genre, Tv, TvGenre
+from .fetcher import TmdbFetcher
+from .ingestion import ingest_pages, split_pages, upsert_films, upsert_tvs
+from .models import Genre, IngestionJob, SearchIndexChange, TvGenre
+from .sync import sync_source
 import logging
 
-
-API_KEY = '7ade7d202b652e6ff759b3143ebf1428'
-USER_AGENT = 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/536.6 (KHTML, like Gecko) Chrome/20.0.1092.0 Safari/536.6'
-HEADERS = {'user-agent': USER_AGENT}
-PAYLOAD = {'api_key': API_KEY,
-           'language': 'en-US',
-           'page': 1}
-
+# A shard is redelivered if its worker dies and retried on TMDB errors,
+# in both cases it continues from the last committed page.
+SHARD_TASK_OPTIONS = {'acks_late': True,
+                      'reject_on_worker_lost': True,
+                      'autoretry_for': (requests.RequestException,),
+                      'retry_backoff': True,
+                      'max_retries': 3}
 
 logger = logging.getLogger()
 
 
-def get_paginated_list(url):
-    pages_results = []
-    total_pages = requests.get(url, headers=HEADERS, params=PAYLOAD).json()['total_pages']
-
-    while PAYLOAD['page'] <= total_pages:
-        response = requests.get(url, headers=HEADERS, params=PAYLOAD)
-        pages_results += (response.json()['results'])
-        PAYLOAD['page'] += 1
-
-    return pages_results
-
-
 @app.task
 def get_genres(genres_url):
-    genres = requests.get(genres_url, headers=HEADERS, params=PAYLOAD).json()['genres']
+    genres = TmdbFetcher().get(genres_url)['genres']
 
     for genre_dict in genres:
         genre, _ = Genre.objects.get_or_create(source_id=genre_dict.get('id'))
@@ -37,36 +33,72 @@ def get_genres(genres_url):
         genre.save()
 
 
+def dispatch_shards(url, shard_task, name):
+    """
+    Splits the listing into shards of INGESTION_SHARD_PAGES pages and runs them as a chord,
+    so every worker takes a part of the pages and record_ingestion_totals sums the reports.
+    An unfinished job of the same listing is resumed once it stopped running:
+    only shards with uncommitted pages run. A running job is left to its chord.
+    :param url: paginated TMDB endpoint url.
+    :param shard_task: task ingesting pages from first_page to last_page of url.
+    :param name: name of the ingested entities for the job record.
+    :return: id of the ingestion job.
+    """
+    job = IngestionJob.objects.filter(name=name, url=url, finished_at__isnull=True).order_by('-started_at').first()
+    if job is not None and job.is_running():
+        logger.info("%s ingestion %s is still running, its shards are not dispatched again", name, job.id)
+        return str(job.id)
+    if job is None:
+        total_pages = TmdbFetcher().get_page(url, 1)['total_pages']
+        job = IngestionJob.objects.create(name=name, url=url, total_pages=total_pages)
+    completed_pages = job.completed_pages()
+    shards = [(first_page, last_page)
+              for first_page, last_page in split_pages(job.total_pages, settings.INGESTION_SHARD_PAGES)
+              if not completed_pages.issuperset(range(first_page, last_page + 1))]
+    if not shards:
+        record_ingestion_totals([], name, str(job.id))
+        return str(job.id)
+
+    job.beat()
+    chord(shard_task.s(url, first_page, last_page, str(job.id))
+          for first_page, last_page in shards)(record_ingestion_totals.s(name, str(job.id)))
+    logger.info("%s ingestion of %s pages dispatched in %s shards, %s pages were committed before",
+                name, job.total_pages, len(shards), len(completed_pages))
+    return str(job.id)
+
+
 @app.task
-def get_paginated_films(url):
+def record_ingestion_totals(reports, name, job_id=None):
+    report = sum((Counter(shard_report) for shard_report in reports), Counter())
+    if job_id is not None:
+        IngestionJob.objects.filter(id=job_id).update(finished_at=timezone.now(),
+                                                      inserted=F('inserted') + report['inserted'],
+                                                      updated=F('updated') + report['updated'],
+                                                      unchanged=F('unchanged') + report['unchanged'])
+    logger.info("%s ingestion finished: %s", name, dict(report))
+    return dict(report)
+
+
+def ingest_shard(url, first_page, last_page, writer, job_id):
+    job = IngestionJob.objects.get(id=job_id) if job_id else None
+    if job is not None:
+        job.beat()
+    return dict(ingest_pages(url, first_page, last_page, writer, job))
 
-    films_list = get_paginated_list(url)
-
-    for film_dict in films_list:
-        film, _ = Film.objects.get_or_create(source_id=film_dict.get('id'))
-        film.popularity = film_dict.get('popularity')
-        film.vote_count = film_dict.get('vote_count')
-        film.video = film_dict.get('video')
-        film.poster_path = film_dict.get('poster_path')
-        film.adult = film_dict.get('adult')
-        film.backdrop_path = film_dict.get('backdrop_path')
-        film.original_language = film_dict.get('original_language')
-        film.original_title = film_dict.get('original_title')
-        film.title = film_dict.get('title')
-        film.vote_average = film_dict.get('vote_average')
-        film.overview = film_dict.get('overview')
-        film.release_date = film_dict.get('release_date')
-        film.type = "movie"
-        film.save()
-
-        for film_genre in film_dict['genre_ids']:
-            genre = Genre.objects.get(source_id=film_genre)
-            film.genre_ids.add(genre)
+
+@app.task(**SHARD_TASK_OPTIONS)
+def get_films_shard(url, first_page, last_page, job_id=None):
+    return ingest_shard(url, first_page, last_page, upsert_films, job_id)
+
+
+@app.task
+def get_paginated_films(url):
+    return dispatch_shards(url, get_films_shard, 'Films')
 
 
 @app.task
 def get_tv_genres(genres_url):
-    genres = requests.get(genres_url, headers=HEADERS, params=PAYLOAD).json()['genres']
+    genres = TmdbFetcher().get(genres_url)['genres']
 
     for genre_dict in genres:
         genre, _ = TvGenre.objects.get_or_create(source_id=genre_dict.get('id'))
@@ -74,36 +106,35 @@ def get_tv_genres(genres_url):
         genre.save()
 
 
+@app.task(**SHARD_TASK_OPTIONS)
+def get_tvs_shard(url, first_page, last_page, job_id=None):
+    return ingest_shard(url, first_page, last_page, upsert_tvs, job_id)
+
+
 @app.task
 def get_paginated_tvs(url):
-    tvs_list = get_paginated_list(url)
-
-    for tv_dict in tvs_list:
-        tv, _ = Tv.objects.get_or_create(source_id=tv_dict.get('id'))
-        tv.poster_path = tv_dict.get('poster_path')
-        tv.popularity = tv_dict.get('popularity')
-        tv.backdrop_path = tv_dict.get('backdrop_path')
-        tv.vote_average = tv_dict.get('vote_average')
-        tv.overview = tv_dict.get('overview')
-        tv.first_air_date = tv_dict.get('first_air_date')
-        tv.original_language = tv_dict.get('original_language')
-        tv.vote_count = tv_dict.get('vote_count')
-        tv.name = tv_dict.get('name')
-        tv.original_name = tv_dict.get('original_name')
-        tv.type = "tv"
-        tv.save()
-
-        for tv_genre in tv_dict['genre_ids']:
-            try:
-                genre_tv = TvGenre.objects.get(source_id=tv_genre)
-                tv.genre_ids.add(genre_tv)
-            except TvGenre.DoesNotExist:
-                try:
-                    movie_genre = Genre.objects.get(source_id=tv_genre)
-                    new_tv_genre = TvGenre()
-                    new_tv_genre.title = movie_genre.title
-                    new_tv_genre.source_id = movie_genre.source_id
-                    new_tv_genre.save()
-                    tv.genre_ids.add(new_tv_genre)
-                except Genre.DoesNotExist:
-                    logger.exception("Genre does not exist!")
+    return dispatch_shards(url, get_tvs_shard, 'Tvs')
+
+
+@app.task
+def sync_films(full=False):
+    report = sync_source('movie', upsert_films, get_paginated_films, full=full)
+    logger.info("Films sync finished: %s", dict(report))
+    return dict(report)
+
+
+@app.task
+def sync_tvs(full=False):
+    report = sync_source('tv', upsert_tvs, get_paginated_tvs, full=full)
+    logger.info("Tvs sync finished: %s", dict(report))
+    return dict(report)
+
+
+@app.task
+def prune_search_index_changes():
+    """
+    Deletes search index changes older than SEARCH_INDEX_CHANGES_TTL, indexes synced before that are built again.
+    """
+    expired_at = timezone.now() - timedelta(seconds=settings.SEARCH_INDEX_CHANGES_TTL)
+    deleted, _ = SearchIndexChange.objects.filter(created_at__lt=expired_at).delete()
+    return deleted
@@ -5,5 +5,8 @@ urlpatterns = [
     path('', views.FilmsView.as_view(), name='movies'),
     path('api/', views.FilmsJsonView.as_view(), name='movies_json'),
     path('api/with_actor/', views.FilmsWithPersonJsonView.as_view(), name='films_with_person_json'),
+    path('api/export/', views.CatalogExportView.as_view(), name='catalog_export'),
+    path('api/genres/', views.GenreFacetsView.as_view(), name='genre_facets'),
+    path('api/batch/', views.BatchLookupView.as_view(), name='batch_lookup'),
     path('<str:actor_name>/', views.FilmsWithView.as_view(), name='films_with_actor'),
 ]
@@ -1,70 +1,61 @@
+from django.conf import settings
 from django.shortcuts import render
 from django.views import View
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
+from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from movies.permissions import IsUserOrReadOnly
-from .serializers import VoteSerializer, ActorNameSerializer
-from .models import Film, Tv
-from rest_framework.pagination import PageNumberPagination
-
-SHARED_TITLES = ("id", "source_id", "popularity", "vote_average",
-                 "vote_count", "poster_path", "backdrop_path",
-                 "original_language", "type", "overview")
-FILM_TITLES = SHARED_TITLES + ("title", "original_title", "release_date")
-TV_TITLES = SHARED_TITLES + ("name", "original_name", "first_air_date")
+from myproject.renderers import FastJSONRenderer, NDJSONRenderer
+from myproject.middleware import choose_encoding
+from users.permissions import JWTAuthentication
+from .caching import cache_anonymous_response, catalog_version_key, conditional_on_version
+from .batch import get_titles
+from .catalog import CATALOG_TITLE_COLUMNS, SHARED_COLUMNS, filter_by_person
+from .export import get_export_rows, iter_gzip, iter_ndjson
+from .genres import GENRES_FIELD, GENRES_MATCH_FIELD, attach_genres, count_genres, filter_by_genres
+from .pagination import (CURSOR_FIELD, CountedPageNumberPagination, get_key, get_order_by, get_ordering,
+                         get_ordering_field, get_paginator)
+from .projection import EXCLUDE_FIELD, FIELDS_FIELD, Projection, get_columns, project_rows
+from .search import MATCH_FIELD, SEARCH_ORDERING, get_search_match, search_catalog_by_person
+from .serializers import (VoteSerializer, ActorNameSerializer, BatchLookupSerializer, CatalogExportSerializer,
+                          GenreFilterSerializer)
+from .models import CatalogEntry
+
+CATALOG_TITLES = SHARED_COLUMNS + CATALOG_TITLE_COLUMNS
 ACTOR_NAME_FIELD = openapi.Parameter('actor_name', openapi.IN_QUERY, type=openapi.TYPE_STRING)
 PAGE_FIELD = openapi.Parameter('page', openapi.IN_QUERY, type=openapi.TYPE_INTEGER)
+UPDATED_SINCE_FIELD = openapi.Parameter('updated_since', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                                        format=openapi.FORMAT_DATETIME)
+CATALOG_ORDERING = ('-popularity', 'id')
+CATALOG_ORDERING_FIELDS = ('popularity', 'vote_average', 'vote_count', 'release_date')
+CATALOG_ORDERING_FIELD = get_ordering_field(CATALOG_ORDERING_FIELDS)
 
 
 class FilmsView(View):
     def get(self, request):
-        films_list = Film.objects.all()
-        tvs_list = Tv.objects.all()
-        union_films = films_list.values(*FILM_TITLES).union(tvs_list.values(*TV_TITLES))
-
-        paginator = Paginator(union_films, 20)  # Show 20 films per page
+        catalog = CatalogEntry.objects.values(*CATALOG_TITLES).order_by('id')
+        paginator = Paginator(catalog, 20)  # Show 20 films per page
         page = request.GET.get('page')
         all_films = paginator.get_page(page)
-        for film in all_films:
-            film['genres'] = []
-            if film['type'] == 'movie':
-                current_film = Film.objects.get(source_id=film['source_id'])
-                current_genres = current_film.genre_ids.all()
-            else:
-                current_film = Tv.objects.get(source_id=film['source_id'])
-                current_genres = current_film.genre_ids.all()
-            for genre_obj in current_genres:
-                genre = dict(id=genre_obj.source_id, title=genre_obj.title)
-                film['genres'].append(genre)
+        attach_genres(all_films)
         return render(request, 'films.html', {'films': all_films})
 
 
 class FilmsWithView(View):
     def get(self, request, actor_name):
-        films_with = Film.objects.filter(
-            person__name__icontains=actor_name.replace("_", " "))
-        tv_with = Tv.objects.filter(
-            person__name__icontains=actor_name.replace("_", " "))
-        all_with = films_with.values(*FILM_TITLES).union(tv_with.values(*TV_TITLES)).order_by('source_id')
+        all_with = filter_by_person(CatalogEntry.objects, actor_name.replace("_", " "))
+        all_with = all_with.values(*CATALOG_TITLES).order_by('source_id')
         paginator = Paginator(all_with, 20)  # Show 20 films per page
         page = request.GET.get('page')
         films = paginator.get_page(page)
-        for film in films:
-            film['genres'] = []
-            if film['type'] == 'movie':
-                current_film = Film.objects.get(source_id=film['source_id'])
-                current_genres = current_film.genre_ids.all()
-            else:
-                current_film = Tv.objects.get(source_id=film['source_id'])
-                current_genres = current_film.genre_ids.all()
-            for genre_obj in current_genres:
-                genre = dict(id=genre_obj.source_id, title=genre_obj.title)
-                film['genres'].append(genre)
+        attach_genres(films)
         return render(request, 'films_with.html', {'films': films})
 
 
@@ -73,23 +64,39 @@ class FilmsJsonView(APIView):
     Implements the ability to interact with whole list of films and tvs.
     """
     permission_classes = (IsUserOrReadOnly, )
-    pagination_class = PageNumberPagination
+    pagination_class = CountedPageNumberPagination
+    count_mode = 'cached'
     filter_backends = (DjangoFilterBackend,)
 
-    @swagger_auto_schema(manual_parameters=[PAGE_FIELD])
+    @swagger_auto_schema(manual_parameters=[PAGE_FIELD, CURSOR_FIELD, CATALOG_ORDERING_FIELD, GENRES_FIELD,
+                                            GENRES_MATCH_FIELD, FIELDS_FIELD, EXCLUDE_FIELD])
+    @conditional_on_version(catalog_version_key)
+    @cache_anonymous_response
     def get(self, request):
         """
         To reply to users and guests with whole paginated serialized list of union of films and tvs.
-        :param request: HTTP get request [with 'page' param].
+        With the 'cursor' param films and tvs are paginated by popularity with cursors and without the count.
+        'ordering' sorts both paginations by popularity, vote_average, vote_count or release_date
+        (the first air date of tvs), '-' prefixed for the descending order, e.g. 'ordering=-vote_average'.
+        'genres' keeps films and tvs with all of the comma separated genre ids, or any of them with
+        'genres_match=any', tested with bitwise operations on the genre masks.
+        'fields' and 'exclude' pick the columns read and returned, e.g. 'fields=id,title,poster_path'.
+        :param request: HTTP get request [with 'page' or 'cursor' [and/or 'ordering' [and/or 'genres'
+                        [and/or 'genres_match'] [and/or 'fields' [and/or 'exclude']]]]] param(s)].
         :return: HTTP response. With JSON data of films and tvs, Http status 200
                  or serializer validation's errors with messages and Http status 400.
         """
-        films_list = Film.objects.all()
-        tvs_list = Tv.objects.all()
-        union_films = films_list.values(*FILM_TITLES).union(tvs_list.values(*TV_TITLES)).order_by('id')
-        paginator = self.pagination_class()
-        result = paginator.paginate_queryset(union_films, request)
-        paginated_response = paginator.get_paginated_response(result)
+        ordering = get_ordering(request, CATALOG_ORDERING_FIELDS)
+        genre_serializer = GenreFilterSerializer(data=request.query_params)
+        if not genre_serializer.is_valid():
+            return Response(genre_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        columns = Projection.from_request(request).filter(CATALOG_TITLES)
+        catalog = filter_by_genres(CatalogEntry.objects, **genre_serializer.validated_data)
+        catalog = catalog.values(*get_columns(columns, get_key(ordering or CATALOG_ORDERING)))
+        catalog = catalog.order_by(*get_order_by(ordering) if ordering else ('id', ))
+        paginator = get_paginator(request, ordering or CATALOG_ORDERING, self.pagination_class)
+        result = paginator.paginate_queryset(catalog, request, view=self)
+        paginated_response = paginator.get_paginated_response(project_rows(result, columns))
         return paginated_response
 
     @swagger_auto_schema(request_body=VoteSerializer)
@@ -115,30 +122,127 @@ class FilmsWithPersonJsonView(APIView):
     Enable users to search films and tvs by the actor's or director's name.
     """
     permission_classes = (IsUserOrReadOnly,)
-    pagination_class = PageNumberPagination
+    pagination_class = CountedPageNumberPagination
+    count_mode = 'cached'
     filter_backends = (DjangoFilterBackend, )
 
-    @swagger_auto_schema(manual_parameters=[ACTOR_NAME_FIELD, PAGE_FIELD])
+    @swagger_auto_schema(manual_parameters=[ACTOR_NAME_FIELD, MATCH_FIELD, PAGE_FIELD, CURSOR_FIELD,
+                                            CATALOG_ORDERING_FIELD, GENRES_FIELD, GENRES_MATCH_FIELD,
+                                            FIELDS_FIELD, EXCLUDE_FIELD])
+    @conditional_on_version(catalog_version_key)
+    @cache_anonymous_response
     def get(self, request):
         """
         To the GET request from users or guests
         to discover serialized paginated list of films and tvs
         which contain actor's or director's name, assigned by the user or guest.
-        :param request: HTTP request data [with 'page' [and/or 'actor_name'] param(s)].
+        Names similar to the actor's name are ranked by pg_trgm similarity,
+        'match=substring' keeps to the names containing it.
+        With the 'cursor' param films and tvs are paginated by popularity with cursors and without the count.
+        'ordering' sorts the films and tvs by the field instead of the rank,
+        'genres' and 'genres_match' filter them by genres, as in FilmsJsonView.
+        'fields' and 'exclude' pick the columns read and returned.
+        :param request: HTTP request data [with 'page' or 'cursor' [and/or 'actor_name' [and/or 'match'
+                        [and/or 'ordering' [and/or 'genres' [and/or 'genres_match']] [and/or 'fields'
+                        [and/or 'exclude']]]]]] param(s)].
         :return: HTTP response. With JSON data of films and tvs
                  which contain actor's or director's name, Http status code 200
                  or serializer validation's errors with messages and Http status 400.
          """
-        actor_name_serializer = ActorNameSerializer({'actor_name': request.GET.get('actor_name')},
-                                                    data={'actor_name': request.GET.get('actor_name')})
+        search_data = {'actor_name': request.GET.get('actor_name'),
+                       'match': request.GET.get('match', settings.SEARCH_MATCH)}
+        actor_name_serializer = ActorNameSerializer(search_data, data=search_data)
         if actor_name_serializer.is_valid():
-            films_with = Film.objects.filter(
-                person__name__icontains=actor_name_serializer.validated_data['actor_name'])
-            tv_with = Tv.objects.filter(
-                person__name__icontains=actor_name_serializer.validated_data['actor_name'])
-            all_with = films_with.values(*FILM_TITLES).union(tv_with.values(*TV_TITLES)).order_by('id')
-            paginator = self.pagination_class()
-            result = paginator.paginate_queryset(all_with, request)
-            paginated_response = paginator.get_paginated_response(result)
+            match = get_search_match(actor_name_serializer.validated_data['match'])
+            ordering = get_ordering(request, CATALOG_ORDERING_FIELDS)
+            genre_serializer = GenreFilterSerializer(data=request.query_params)
+            if not genre_serializer.is_valid():
+                return Response(genre_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            columns = Projection.from_request(request).filter(CATALOG_TITLES)
+            all_with = search_catalog_by_person(actor_name_serializer.validated_data['actor_name'], match)
+            all_with = filter_by_genres(all_with, **genre_serializer.validated_data)
+            all_with = all_with.values(*get_columns(columns, get_key(ordering or CATALOG_ORDERING)))
+            all_with = all_with.order_by(*get_order_by(ordering) if ordering else SEARCH_ORDERING[match])
+            paginator = get_paginator(request, ordering or CATALOG_ORDERING, self.pagination_class)
+            result = paginator.paginate_queryset(all_with, request, view=self)
+            paginated_response = paginator.get_paginated_response(project_rows(result, columns))
             return paginated_response
         return Response(actor_name_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class GenreFacetsView(APIView):
+    """
+    Counts films and tvs per genre for browsing the catalog by genres.
+    """
+    permission_classes = (IsUserOrReadOnly, )
+
+    @swagger_auto_schema(manual_parameters=[GENRES_FIELD, GENRES_MATCH_FIELD])
+    @conditional_on_version(catalog_version_key)
+    @cache_anonymous_response
+    def get(self, request):
+        """
+        To reply with the number of films and tvs of every genre among the ones kept by the genre filter
+        of FilmsJsonView, counted in one scan of the catalog over the genre masks.
+        :param request: HTTP get request [with 'genres' [and/or 'genres_match']] param(s)].
+        :return: HTTP response. With JSON data of the total and the genres with their ids, titles and counts,
+                 Http status 200 or serializer validation's errors with messages and Http status 400.
+        """
+        genre_serializer = GenreFilterSerializer(data=request.query_params)
+        if not genre_serializer.is_valid():
+            return Response(genre_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        total, genres = count_genres(filter_by_genres(CatalogEntry.objects, **genre_serializer.validated_data))
+        return Response({'count': total, 'genres': genres}, status=status.HTTP_200_OK)
+
+
+class BatchLookupView(APIView):
+    """
+    Fetches many films and tvs by id at once, for clients holding lists of them, e.g. wish lists or comments.
+    """
+    permission_classes = (AllowAny, )
+
+    @swagger_auto_schema(request_body=BatchLookupSerializer)
+    def post(self, request):
+        """
+        To reply with the films and tvs of up to BATCH_LOOKUP_MAX_IDS ids, read with their genres
+        with one query per media type. It is a POST only to carry the ids in the body, nothing is written.
+        :param request: HTTP request with the 'ids' list of film and tv ids in the data attr.
+        :return: HTTP response. With JSON data of the found films and tvs in the order of the ids
+                 and of the ids of neither a film nor a tv, Http status 200
+                 or serializer validation's errors with messages and Http status 400.
+        """
+        lookup_serializer = BatchLookupSerializer(data=request.data)
+        if not lookup_serializer.is_valid():
+            return Response(lookup_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        results, missing = get_titles(lookup_serializer.validated_data['ids'])
+        return Response({'results': results, 'missing': missing}, status=status.HTTP_200_OK)
+
+
+class CatalogExportView(APIView):
+    """
+    Streams the whole catalog of films and tvs to users for mirroring it.
+    """
+    permission_classes = (JWTAuthentication, )
+    renderer_classes = (FastJSONRenderer, NDJSONRenderer)
+
+    @swagger_auto_schema(manual_parameters=[UPDATED_SINCE_FIELD])
+    def get(self, request):
+        """
+        Streams catalog entries with the source ids of their genres as newline delimited JSON ordered by id,
+        read with a server-side cursor, so memory does not grow with the catalog.
+        The stream is gzip encoded on the fly when the request accepts gzip.
+        :param request: HTTP request [with 'updated_since' param to export only the entries changed since then].
+        :return: HTTP streaming response with NDJSON and Http status 200
+                 or serializer validation's errors with messages and Http status 400.
+        """
+        export_serializer = CatalogExportSerializer(data=request.query_params)
+        if not export_serializer.is_valid():
+            return Response(export_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        chunks = iter_ndjson(get_export_rows(export_serializer.validated_data.get('updated_since')))
+        gzipped = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), ('gzip', )) == 'gzip'
+        response = StreamingHttpResponse(iter_gzip(chunks) if gzipped else chunks,
+                                         content_type=NDJSONRenderer.media_type)
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding', ))
+        response['Content-Disposition'] = 'attachment; filename="catalog.ndjson"'
+        return response
@@ -30,19 +30,20 @@ app.conf.beat_schedule = {
         'args': (FILM_API_URL + 'genre/tv/list',)
     },
     'update-db-films': {
-        'task': 'movies.tasks.get_paginated_films',
+        'task': 'movies.tasks.sync_films',
         'schedule': crontab(hour=1, minute=45),
-        'args': (FILM_API_URL + 'discover/movie',)
     },
     'update-db-tvs': {
-        'task': 'movies.tasks.get_paginated_tvs',
+        'task': 'movies.tasks.sync_tvs',
         'schedule': crontab(hour=2, minute=45),
-        'args': (FILM_API_URL + 'discover/tv',)
     },
     'update-db-people': {
-        'task': 'people.tasks.get_paginated_people',
+        'task': 'people.tasks.sync_people',
         'schedule': crontab(hour=2, minute=15),
-        'args': (FILM_API_URL + 'person/popular',)
+    },
+    'prune-search-index-changes': {
+        'task': 'movies.tasks.prune_search_index_changes',
+        'schedule': crontab(hour=3, minute=30),
     },
     'send-email-news': {
         'task': 'news.tasks.send_emails_news',
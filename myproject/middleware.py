@@ -0,0 +1,107 @@
+import gzip
+import hashlib
+import re
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# API types only: HTML pages carry CSRF tokens next to reflected input, which compression leaks (BREACH)
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson')
+STRONG_ETAG = re.compile(r'^"[^"]*"$')
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, settings.COMPRESSION_GZIP_LEVEL)
+
+
+def get_encodings():
+    """
+    :return: supported content codings in the order of preference among equally acceptable ones.
+    """
+    return ('br', 'gzip') if brotli else ('gzip', )
+
+
+def choose_encoding(accept_encoding, encodings=None):
+    """
+    Picks the most acceptable supported coding of the Accept-Encoding header, brotli wins ties.
+    :param encodings: codings to choose from in the order of preference, get_encodings() by default.
+    :return: 'br', 'gzip' or None when none is acceptable.
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in encodings or get_encodings():
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def get_compressed(body, encoding, cached):
+    """
+    :param cached: whether to keep the compressed body in the cache for RESPONSE_CACHE_TTL,
+                   under the digest of the body, so the same page is compressed once.
+    :return: body compressed with the encoding.
+    """
+    if not cached:
+        return compress(body, encoding)
+    key = f'compressed:{encoding}:{hashlib.sha1(body).hexdigest()}'
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress(body, encoding)
+        cache.set(key, compressed, settings.RESPONSE_CACHE_TTL)
+    return compressed
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli (when installed) or gzip negotiated from Accept-Encoding.
+    Streaming and already encoded responses, bodies shorter than COMPRESSION_MIN_SIZE,
+    types other than JSON and NDJSON and responses setting the CSRF cookie are sent as they are.
+    Bodies of responses marked with cache_compressed, e.g. pages of the anonymous response cache,
+    are compressed once and served from the cache afterwards.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding') \
+                or len(response.content) < settings.COMPRESSION_MIN_SIZE \
+                or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES) \
+                or settings.CSRF_COOKIE_NAME in response.cookies:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding', ))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        compressed = get_compressed(response.content, encoding, getattr(response, 'cache_compressed', False))
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # the compressed body is another representation, its ETag can only be weak
+        etag = response.get('ETag')
+        if etag and STRONG_ETAG.match(etag):
+            response['ETag'] = f'W/{etag}'
+        return response
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'myproject.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -92,6 +93,17 @@ DATABASES = {
     }
 }
 
+# Redis shared by the web processes and the celery workers, which invalidate cached counts and pages
+# after ingestion. Without CACHE_URL, e.g. in tests, an in-process cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['CACHE_URL'],
+    } if os.environ.get('CACHE_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -133,6 +145,20 @@ STATIC_URL = '/static/'
 LOGIN_REDIRECT_URL = "/user/wish_list/"
 
 FILM_API_URL = 'https://api.themoviedb.org/3/'
+TMDB_API_KEY = os.environ.get('TMDB_API_KEY', '7ade7d202b652e6ff759b3143ebf1428')
+# shared by all workers through the cache, so set CACHE_URL wherever shards run in parallel
+TMDB_REQUESTS_PER_SECOND = float(os.environ.get('TMDB_REQUESTS_PER_SECOND', 20))
+TMDB_CONCURRENCY = int(os.environ.get('TMDB_CONCURRENCY', 8))
+TMDB_TIMEOUT = 10  # seconds for connect and read of one request
+TMDB_MAX_RETRIES = 3
+TMDB_BACKOFF = 0.5  # seconds, the upper bound of the first retry delay
+INGESTION_BATCH_SIZE = 500  # TMDB results written to the database at once
+INGESTION_QUEUE_SIZE = 16  # fetched pages buffered ahead of the database writer
+INGESTION_SHARD_PAGES = 20  # listing pages ingested by one celery subtask
+INGESTION_JOB_LEASE = 30 * 60  # seconds without shard progress after which an unfinished job is resumed
+
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')  # chords of ingestion shards need it
 
 REST_FRAMEWORK = {
 
@@ -141,10 +167,35 @@ REST_FRAMEWORK = {
 
     ),
     'EXCEPTION_HANDLER': 'users.handlers.custom_exception_handler',
+    'DEFAULT_RENDERER_CLASSES': (
+        'myproject.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'myproject.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+PAGINATION_COUNT_MODE = 'exact'  # default count of list views: 'exact', 'estimate' or 'cached'
+PAGINATION_COUNT_CACHE_TTL = 300  # seconds a cached count lives unless ingestion invalidates it first
+SEARCH_MATCH = 'trigram'  # default match of actor and title search: 'trigram' or 'substring'
+SEARCH_SIMILARITY_THRESHOLD = 0.5  # pg_trgm word similarity a name or title needs to match
+RESPONSE_CACHE_TTL = 600  # seconds a cached anonymous list page lives unless a write invalidates it first
+# in-memory search index loaded by the web workers, ingestion records the changes it replays either way
+SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED') == '1'
+SEARCH_INDEX_POLL_INTERVAL = 5  # seconds between replays of the search index changes written by ingestion
+SEARCH_INDEX_CHANGES_TTL = 86400  # seconds search index changes are kept, older indexes are built again
+EXPORT_CHUNK_SIZE = 2000  # catalog rows fetched from the server-side cursor of the export at once
+EXPORT_BUFFER_SIZE = 64 * 1024  # bytes of NDJSON lines written to the export stream at once
+BATCH_LOOKUP_MAX_IDS = 500  # film and tv ids one batch lookup accepts
+COMPRESSION_MIN_SIZE = 1024  # bytes a response body needs to be compressed
+COMPRESSION_GZIP_LEVEL = 6  # zlib level of gzip encoded responses and the export
+COMPRESSION_BROTLI_QUALITY = 5  # brotli quality of br encoded responses, when brotli is installed
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
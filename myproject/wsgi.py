@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
 application = get_wsgi_application()
+
+from movies.search_index import start_search_index  # noqa: E402 pylint: disable=wrong-import-position
+
+start_search_index()
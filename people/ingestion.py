@@ -0,0 +1,75 @@
+from django.db import transaction
+from movies.caching import bump_catalog_generation
+from movies.ingestion import link_related, payload_digest, upsert_rows
+from movies.models import Film, Tv
+from movies.search_index import record_search_changes
+from .models import Person
+
+PERSON_FIELDS = ("popularity", "gender", "profile_path", "adult", "name")
+
+
+def build_person(person_dict):
+    """
+    Builds an unsaved Person from one TMDB result dict
+    with the digests of the copied fields and of the known for titles.
+    The known_for_hash is None when the dict has no known for titles,
+    e.g. 'person/{id}' details, so the stored one is kept.
+    """
+    person = Person(source_id=person_dict.get('id'))
+    payload = {}
+    for field in PERSON_FIELDS:
+        payload[field] = person_dict.get(field)
+        setattr(person, field, person_dict.get(field))
+    person.payload_hash = payload_digest(payload)
+    if 'known_for' in person_dict:
+        person.known_for_hash = payload_digest(sorted(f"{film_dict.get('media_type')}:{film_dict.get('id')}"
+                                                      for film_dict in person_dict['known_for']))
+    return person
+
+
+def get_known_for_ids(people_list, media_type):
+    """
+    :return: set of the source ids of the known for titles of the media type.
+    """
+    return {film_dict.get('id') for person_dict in people_list
+            for film_dict in person_dict.get('known_for', [])
+            if film_dict.get('media_type') == media_type}
+
+
+@transaction.atomic
+def upsert_people(people_list):
+    """
+    Persists a batch of TMDB 'person/popular' results with links to their known films and tvs.
+    The known for titles of the whole batch are resolved with one query per media type
+    and linked with one bulk INSERT per through table, only for inserted and changed people,
+    whose ids are recorded as search index changes.
+    The known for titles of the people whose dicts carry them replace the stored ones.
+    :param people_list: list of person dicts from TMDB.
+    :return: Counter of 'inserted', 'updated', 'unchanged' people
+             and of 'unresolved_films' and 'unresolved_tvs' known for titles absent in the database.
+    """
+    people = [build_person(person_dict) for person_dict in people_list]
+    people, report = upsert_rows(Person, people, PERSON_FIELDS, ('payload_hash', 'known_for_hash'))
+    person_ids = {person.source_id: person.id for person in people}
+    people_list = [person_dict for person_dict in people_list if person_dict.get('id') in person_ids]
+    if not people_list:
+        return report
+    bump_catalog_generation()
+
+    film_source_ids = get_known_for_ids(people_list, 'movie')
+    tv_source_ids = get_known_for_ids(people_list, 'tv')
+    film_ids = dict(Film.objects.filter(source_id__in=film_source_ids).values_list('source_id', 'id'))
+    tv_ids = dict(Tv.objects.filter(source_id__in=tv_source_ids).values_list('source_id', 'id'))
+    report['unresolved_films'] = len(film_source_ids - set(film_ids))
+    report['unresolved_tvs'] = len(tv_source_ids - set(tv_ids))
+    replaced_ids = [person_ids[person_dict.get('id')] for person_dict in people_list if 'known_for' in person_dict]
+
+    for field_name, media_type, title_ids in (('known_for', 'movie', film_ids), ('known_for_tv', 'tv', tv_ids)):
+        link_related(Person, field_name, {(person_ids[person_dict.get('id')], title_ids[film_dict.get('id')])
+                                          for person_dict in people_list
+                                          for film_dict in person_dict.get('known_for', [])
+                                          if film_dict.get('media_type') == media_type
+                                          and film_dict.get('id') in title_ids},
+                     replaced_ids)
+    record_search_changes('person', person_ids.values())
+    return report
@@ -0,0 +1,18 @@
+# Generated by Django 2.2 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0006_auto_20191105_1322'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='payload_hash',
+            field=models.CharField(editable=False, max_length=40, null=True),
+        ),
+    ]
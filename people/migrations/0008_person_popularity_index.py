@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0007_person_payload_hash'),
+    ]
+
+    operations = [
+        # cursor pagination key ('-popularity', 'id'), Index() can not put NULLs last
+        migrations.RunSQL(
+            'CREATE INDEX people_person_popularity_id_idx '
+            'ON people_person (popularity DESC NULLS LAST, id)',
+            'DROP INDEX people_person_popularity_id_idx',
+        ),
+    ]
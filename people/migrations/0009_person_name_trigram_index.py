@@ -0,0 +1,24 @@
+from django.db import migrations
+
+# pg_trgm is a contrib extension, servers without it keep the substring search
+TRIGRAM_INDEX_SQL = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS people_person_name_trgm_idx ON people_person USING gin (name gin_trgm_ops);
+    END IF;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0008_person_popularity_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(TRIGRAM_INDEX_SQL, 'DROP INDEX IF EXISTS people_person_name_trgm_idx'),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0009_person_name_trigram_index'),
+    ]
+
+    operations = [
+        # 'ordering=popularity', ('-popularity', 'id') has people_person_popularity_id_idx
+        migrations.RunSQL(
+            'CREATE INDEX people_person_popularity_asc_id_idx ON people_person (popularity, id)',
+            'DROP INDEX people_person_popularity_asc_id_idx',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2 on 2026-10-18 12:47
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def delete_duplicates(apps, schema_editor):
+    """
+    Keeps the person with the lowest id of every source id written more than once by parallel shards,
+    nothing links people, so the others and their known for links are deleted.
+    """
+    Person = apps.get_model('people', 'Person')
+    duplicated = (Person.objects.exclude(source_id=None).values('source_id')
+                  .annotate(rows=Count('id')).filter(rows__gt=1).values_list('source_id', flat=True))
+    for source_id in list(duplicated):
+        _, *drop_ids = Person.objects.filter(source_id=source_id).order_by('id').values_list('id', flat=True)
+        Person.objects.filter(id__in=drop_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0010_person_popularity_asc_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+    ]
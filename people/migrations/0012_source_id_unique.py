@@ -0,0 +1,18 @@
+# Generated by Django 2.2 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0011_delete_duplicate_source_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='person',
+            name='source_id',
+            field=models.IntegerField(null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0012_source_id_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='known_for_hash',
+            field=models.CharField(editable=False, max_length=40, null=True),
+        ),
+    ]
@@ -14,7 +14,9 @@ class Person(UUIDMixin):
     name = models.CharField(max_length=1000, null=True)
     known_for = models.ManyToManyField(Film)
     known_for_tv = models.ManyToManyField(Tv)
-    source_id = models.IntegerField(null=True)
+    source_id = models.IntegerField(null=True, unique=True)
+    payload_hash = models.CharField(max_length=40, null=True, editable=False)
+    known_for_hash = models.CharField(max_length=40, null=True, editable=False)
 
     def __str__(self):
         return self.name
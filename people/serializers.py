@@ -1,30 +1,56 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 
 from .models import Person
+from movies.projection import Projection, get_model_fields, project_serializer
+from movies.search import SEARCH_MATCHES
 from movies.serializers import FilmSerializer, TvSerializer
 
 
 class PersonSerializer(serializers.ModelSerializer):
     known_for = SerializerMethodField(read_only=True)
     known_for_tv = SerializerMethodField(read_only=True)
+    projection = Projection()
 
     class Meta:
         model = Person
         fields = ("id", "popularity", "gender", "profile_path", "adult", "name",
                   "source_id", "known_for", "known_for_tv")
 
+    @staticmethod
+    def setup_queryset(queryset, projection, *required):
+        """
+        Loads only the projected columns of people and prefetches only the projected columns
+        of their known for films and tvs, each with one query, when they are projected at all.
+        :param required: fields loaded anyway, e.g. the sort key of the pagination.
+        """
+        fields = projection.filter(PersonSerializer.Meta.fields)
+        queryset = queryset.only('id', *get_model_fields(Person, fields), *required)
+        for name, serializer_class in (('known_for', FilmSerializer), ('known_for_tv', TvSerializer)):
+            if name in fields:
+                model = serializer_class.Meta.model
+                columns = get_model_fields(model, projection.nested(name).filter(serializer_class.Meta.fields))
+                titles = model.objects.only('id', *columns).order_by('id')
+                queryset = queryset.prefetch_related(Prefetch(name, titles))
+        return queryset
+
+    @staticmethod
+    def get_titles(titles, serializer_class, projection):
+        if not titles.ordered:
+            titles = titles.order_by('id')
+        return project_serializer(serializer_class(titles, many=True), projection).data
+
     def get_known_for(self, instance):
-        films = instance.known_for.all().order_by('id')
-        return FilmSerializer(films, many=True).data
+        return self.get_titles(instance.known_for.all(), FilmSerializer, self.projection.nested('known_for'))
 
     def get_known_for_tv(self, instance):
-        tvs = instance.known_for_tv.all().order_by('id')
-        return TvSerializer(tvs, many=True).data
+        return self.get_titles(instance.known_for_tv.all(), TvSerializer, self.projection.nested('known_for_tv'))
 
 
 class FilmTitleSerializer(serializers.Serializer):
     film_title = serializers.CharField()
+    match = serializers.ChoiceField(choices=SEARCH_MATCHES)
 
     def validate_film_title(self, value):
         return value.replace('_', ' ')
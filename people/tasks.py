@@ -1,34 +1,24 @@
 from myproject.celery import app
-from .models import Person
-from movies.models import Film, Tv
-from movies.tasks import get_paginated_list
+from .ingestion import upsert_people
+from movies.sync import sync_source
+from movies.tasks import SHARD_TASK_OPTIONS, dispatch_shards, ingest_shard
 import logging
 
 logger = logging.getLogger()
 
 
+@app.task(**SHARD_TASK_OPTIONS)
+def get_people_shard(url, first_page, last_page, job_id=None):
+    return ingest_shard(url, first_page, last_page, upsert_people, job_id)
+
+
 @app.task
 def get_paginated_people(url):
-    pages_results = get_paginated_list(url)
+    return dispatch_shards(url, get_people_shard, 'People')
 
-    for person_dict in pages_results:
-        person, _ = Person.objects.get_or_create(source_id=person_dict.get('id'))
-        person.popularity = person_dict.get('popularity')
-        person.gender = person_dict.get('gender')
-        person.profile_path = person_dict.get('profile_path')
-        person.adult = person_dict.get('adult')
-        person.name = person_dict.get('name')
-        person.save()
 
-        for film_dict in person_dict['known_for']:
-            try:
-                if film_dict['media_type'] == 'movie':
-                    film = Film.objects.get(source_id=film_dict.get('id'))
-                    person.known_for.add(film)
-                else:
-                    tv = Tv.objects.get(source_id=film_dict.get('id'))
-                    person.known_for_tv.add(tv)
-            except Film.DoesNotExist:
-                logger.exception("Such film does not exist!")
-            except Tv.DoesNotExist:
-                logger.exception("Such film does not exist!")
+@app.task
+def sync_people(full=False):
+    report = sync_source('person', upsert_people, get_paginated_people, full=full)
+    logger.info("People sync finished: %s", dict(report))
+    return dict(report)
@@ -1,18 +1,27 @@
+from django.conf import settings
 from django.core.paginator import Paginator
 from django.shortcuts import render
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from movies.caching import catalog_version_key, conditional_on_version
+from movies.pagination import (CURSOR_FIELD, CountedPageNumberPagination, get_key, get_order_by, get_ordering,
+                               get_ordering_field, get_paginator)
+from movies.projection import EXCLUDE_FIELD, FIELDS_FIELD, Projection, project_serializer
+from movies.search import MATCH_FIELD, SEARCH_ORDERING, get_search_match, search_people_by_title
 from .serializers import PersonSerializer, FilmTitleSerializer
 from .models import Person
 from django.views import View
 
 FILM_TITLE_FIELD = openapi.Parameter('film_title', openapi.IN_QUERY, type=openapi.TYPE_STRING)
 PAGE_FIELD = openapi.Parameter('page', openapi.IN_QUERY, type=openapi.TYPE_INTEGER)
+PEOPLE_ORDERING = ('-popularity', 'id')
+# people have no votes nor dates
+PEOPLE_ORDERING_FIELDS = ('popularity', )
+PEOPLE_ORDERING_FIELD = get_ordering_field(PEOPLE_ORDERING_FIELDS)
 
 
 class ActorsInView(View):
@@ -34,30 +43,42 @@ class PeopleInFilmJsonView(APIView):
     according to the assigned film or tv title by the user or guest.
     """
 
-    pagination_class = PageNumberPagination
+    pagination_class = CountedPageNumberPagination
+    count_mode = 'cached'
     filter_backends = (DjangoFilterBackend,)
 
-    @swagger_auto_schema(manual_parameters=[FILM_TITLE_FIELD, PAGE_FIELD])
+    @swagger_auto_schema(manual_parameters=[FILM_TITLE_FIELD, MATCH_FIELD, PAGE_FIELD, CURSOR_FIELD,
+                                            PEOPLE_ORDERING_FIELD, FIELDS_FIELD, EXCLUDE_FIELD])
+    @conditional_on_version(catalog_version_key)
     def get(self, request):
         """
         Implements the ability to discover serialized paginated list of actors and directors
         which contain film's or tv's title, assigned by the user or guest.
-        :param request: HTTP request data [with 'page' [and/or 'film_title'] param(s)].
+        People known for films and tvs with titles similar to the film title are ranked by pg_trgm similarity,
+        'match=substring' keeps to the film titles containing it.
+        With the 'cursor' param people are paginated by popularity with cursors and without the count.
+        'ordering=popularity' or 'ordering=-popularity' sorts people by popularity instead of the rank.
+        'fields' and 'exclude' project people and their known for titles, e.g. 'fields=name,known_for.title',
+        only the projected columns are read and titles are not read at all unless projected.
+        :param request: HTTP request data [with 'page' or 'cursor' [and/or 'film_title' [and/or 'match'
+                        [and/or 'ordering' [and/or 'fields' [and/or 'exclude']]]]] param(s)].
         :return: HTTP response with JSON data of list of actors and directors,
                  who are known for accepted film or tv title with status code 200
                  or serializer validation's errors with messages and Http status 400.
         """
-        film_title_serializer = FilmTitleSerializer({'film_title': request.GET.get('film_title')},
-                                                    data={'film_title': request.GET.get('film_title')})
+        search_data = {'film_title': request.GET.get('film_title'),
+                       'match': request.GET.get('match', settings.SEARCH_MATCH)}
+        film_title_serializer = FilmTitleSerializer(search_data, data=search_data)
         if film_title_serializer.is_valid():
-            people = Person.objects.filter(
-                known_for__original_title__icontains=film_title_serializer.validated_data['film_title']) | \
-                Person.objects.filter(
-                known_for__title__icontains=film_title_serializer.validated_data['film_title']) \
-                .order_by('id')
-            paginator = self.pagination_class()
-            result = paginator.paginate_queryset(people, request)
-            serializer_person = PersonSerializer(result, many=True, read_only=True)
+            match = get_search_match(film_title_serializer.validated_data['match'])
+            ordering = get_ordering(request, PEOPLE_ORDERING_FIELDS)
+            people = search_people_by_title(film_title_serializer.validated_data['film_title'], match)
+            projection = Projection.from_request(request)
+            people = PersonSerializer.setup_queryset(people, projection, *get_key(ordering or PEOPLE_ORDERING))
+            people = people.order_by(*get_order_by(ordering) if ordering else SEARCH_ORDERING[match])
+            paginator = get_paginator(request, ordering or PEOPLE_ORDERING, self.pagination_class)
+            result = paginator.paginate_queryset(people, request, view=self)
+            serializer_person = project_serializer(PersonSerializer(result, many=True, read_only=True), projection)
             paginated_response = paginator.get_paginated_response(serializer_person.data)
             return paginated_response
         return Response(film_title_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
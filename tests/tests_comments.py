@@ -65,6 +65,38 @@ class MovieCommentsViewTests(APITestCase):
         self.assertEqual(len(response_json['results']), 9)
         self.assertEqual(response_json, expected_result)
 
+    def test_cursor_get(self):
+        self.url += f'?movie_id={str(self.film.id)}&movie_type={self.film.type}&cursor='
+        response = self.client.get(self.url, format='json')
+        response_json = response.json()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response_json), ['next', 'previous', 'results'])
+        self.assertEqual([comment[0]['id'] for comment in response_json['results']],
+                         [str(comment.id) for comment in self.comments])
+
+    def test_conditional_get(self):
+        self.url += f'?movie_id={str(self.film.id)}&movie_type={self.film.type}'
+        etag = self.client.get(self.url, format='json')['ETag']
+        response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with mock.patch('movies.caching.transaction.on_commit', side_effect=lambda function: function()):
+            self.client.post(self.url, format='json',
+                             data={'film': {'id': str(self.film.id)}, 'text': 'Comment.', 'path': ''})
+        response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 10)
+
+    def test_reply_bumps_thread_version(self):
+        self.url += f'?movie_id={str(self.film.id)}&movie_type={self.film.type}'
+        etag = self.client.get(self.url, format='json')['ETag']
+        reply = self.comments[0].add_child(author=self.user, text='Reply.')
+        with mock.patch('movies.caching.transaction.on_commit', side_effect=lambda function: function()):
+            # the reply carries no film, the version of the root comment thread is bumped
+            reply.bump_thread_version()
+        response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_null_data_get(self):
         response = self.client.get(self.url, format='json')
         response_json = response.json()
@@ -1,8 +1,51 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+import pytz
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
 from rest_framework import status
-from movies.models import Film, Genre, Tv, TvGenre
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from movies.fake_tmdb import FakeTmdbServer
+from movies.catalog import refresh_catalog
+from movies.fetcher import SharedRateLimit, TmdbFetcher
+from movies.genres import attach_genres
+from movies.ingestion import ingest_pages, run_pipeline, split_pages, upsert_films, upsert_tvs
+from movies.models import (CatalogEntry, Film, Genre, GenreBit, IngestionCheckpoint, IngestionJob, SearchIndexChange,
+                           SyncWatermark, Tv, TvGenre)
+from movies.pagination import count_rows, get_order_by
+from movies.search import search_catalog_by_person, search_people_by_title, trigram_available
+from movies.search_index import SearchIndex, record_search_changes
+from movies.serializers import VoteSerializer
+from movies.sync import sync_source
+from movies.tasks import get_paginated_films, record_ingestion_totals
+from movies.views import CATALOG_ORDERING_FIELDS
+from myproject.celery import app
+from myproject.middleware import CompressionMiddleware, brotli, choose_encoding, compress
+from myproject.renderers import FastJSONParser, FastJSONRenderer
 from users.models import User
+from people.ingestion import upsert_people
 from people.models import Person
 import factory
 from faker import Factory
@@ -12,6 +55,14 @@ from rest_framework_jwt.test import APIJWTClient
 faker = Factory.create()
 
 
+def make_tmdb_response(json_data, status_code=200):
+    response = mock.Mock(status_code=status_code)
+    response.json.return_value = json_data
+    response.raise_for_status.side_effect = \
+        requests.HTTPError(response=response) if status_code >= 400 else None
+    return response
+
+
 class GenreFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = Genre
@@ -94,6 +145,7 @@ class FilmsJsonViewTests(APITestCase):
         self.client.credentials(HTTP_AUTHORIZATION=f'{token}')
 
     def setUp(self):
+        cache.clear()
         self.user = UserFactory()
         self.user.set_password('pass')
         self.user.save()
@@ -101,6 +153,7 @@ class FilmsJsonViewTests(APITestCase):
         self.genres = GenreFactory.create_batch(3)
         self.films = FilmFactory.create_batch(21, genre_ids=self.genres)
         self.films.sort(key=lambda x: x.id)
+        refresh_catalog(Film)
 
         self.url = reverse('movies:movies_json')
         self.set_logined_user()
@@ -147,6 +200,7 @@ class FilmsJsonViewTests(APITestCase):
         response_json = response.json()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response_json, input_data)
+        self.assertEqual(CatalogEntry.objects.get(id=self.films[0].id).vote_count, 1)
 
     def test_null_film_id_put(self):
         input_data = {
@@ -209,11 +263,13 @@ class FilmWithPersonJsonViewTests(APITestCase):
     client_class = APIJWTClient
 
     def setUp(self):
+        cache.clear()
         self.genres = GenreFactory.create_batch(3)
         self.films = FilmFactory.create_batch(21, genre_ids=self.genres)
         self.films.sort(key=lambda x: x.id)
         self.actor_name = 'Monica Bellucci'
         self.actor = PeopleFactory(known_for=self.films, name=self.actor_name)
+        refresh_catalog(Film)
         self.url = '/movies/api/with_actor/?actor_name=Monica%20Bellucci'
 
     def test_positive_get(self):
@@ -252,3 +308,1084 @@ class FilmWithPersonJsonViewTests(APITestCase):
         response_json = response.json()
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response_json, {'actor_name': ['This field may not be null.']})
+
+
+class CursorPaginationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        # ties and NULLs in the first field of the ('-popularity', 'id') key
+        popularities = [None] * 5 + [1.5] * 10 + [float(i) for i in range(30)]
+        self.films = [FilmFactory(popularity=popularity) for popularity in popularities]
+        refresh_catalog(Film)
+        self.expected_ids = [str(film.id) for film in sorted(
+            self.films, key=lambda film: (film.popularity is None, -(film.popularity or 0), str(film.id)))]
+        self.url = reverse('movies:movies_json') + '?cursor='
+
+    def walk(self, url, link):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.json())
+            page_ids = [film['id'] for film in response.json()['results']]
+            ids = ids + page_ids if link == 'next' else page_ids + ids
+            url, pages = response.json()[link], pages + 1
+        return ids, pages
+
+    def test_forward_and_backward(self):
+        ids, pages = self.walk(self.url, 'next')
+        self.assertEqual(ids, self.expected_ids)
+        self.assertEqual(pages, 3)
+
+        last_page = self.client.get(self.url, format='json').json()
+        while last_page['next']:
+            last_page = self.client.get(last_page['next'], format='json').json()
+        ids, pages = self.walk(last_page['previous'], 'previous')
+        self.assertEqual(ids + [film['id'] for film in last_page['results']], self.expected_ids)
+        self.assertEqual(pages, 2)
+
+    def test_deep_page_single_query(self):
+        next_url = self.client.get(self.url, format='json').json()['next']
+        with self.assertNumQueries(1):
+            response = self.client.get(next_url, format='json')
+        self.assertEqual(len(response.json()['results']), REST_FRAMEWORK['PAGE_SIZE'])
+
+    def test_projection(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url + '&fields=title,vote_count', format='json')
+        self.assertEqual(set(response.json()['results'][0]), {'title', 'vote_count'})
+        self.assertNotIn('overview', queries[-1]['sql'])
+        # the sort key is read for the next cursor but not returned
+        ids, _ = self.walk(self.url + '&exclude=popularity,overview', 'next')
+        self.assertEqual(ids, self.expected_ids)
+
+        response = self.client.get(reverse('movies:movies_json'), {'fields': 'title,budget'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['fields'], ['Unknown fields: budget.'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url + 'garbage', format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class OrderingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        # ties and NULLs in the first field of the key
+        self.films = [FilmFactory(vote_average=None if i < 5 else i % 7 / 2) for i in range(45)]
+        refresh_catalog(Film)
+        self.url = reverse('movies:movies_json')
+
+    def get_expected_ids(self, field, descending):
+        with_values = sorted((film for film in self.films if getattr(film, field) is not None),
+                             key=lambda film: str(film.id))
+        with_values.sort(key=lambda film: getattr(film, field), reverse=descending)
+        nulls = sorted(str(film.id) for film in self.films if getattr(film, field) is None)
+        return [str(film.id) for film in with_values] + nulls
+
+    def test_page_ordering(self):
+        response = self.client.get(self.url, {'ordering': '-vote_average'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([film['id'] for film in response.json()['results']],
+                         self.get_expected_ids('vote_average', True)[:REST_FRAMEWORK['PAGE_SIZE']])
+
+    def test_cursor_ordering(self):
+        url, ids = self.url + '?cursor=&ordering=vote_average&fields=id', []
+        while url:
+            response = self.client.get(url, format='json').json()
+            ids, url = ids + [film['id'] for film in response['results']], response['next']
+        self.assertEqual(ids, self.get_expected_ids('vote_average', False))
+
+    def test_invalid_ordering(self):
+        response = self.client.get(self.url, {'ordering': 'budget'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', response.json())
+        response = self.client.get(reverse('people:actors_in_film_json'), {'ordering': '-vote_count'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_scans(self):
+        querysets = [CatalogEntry.objects.order_by(*get_order_by(ordering, reverse))
+                     for field in CATALOG_ORDERING_FIELDS for ordering in ((field, 'id'), (f'-{field}', 'id'))
+                     for reverse in (False, True)]
+        querysets += [Person.objects.order_by(*get_order_by(ordering))
+                      for ordering in (('popularity', 'id'), ('-popularity', 'id'))]
+        with connection.cursor() as cursor:
+            # sorting is never cheaper than an index scan once penalized, unless no index matches
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            for queryset in querysets:
+                sql, params = queryset[:20].query.sql_with_params()
+                cursor.execute(f'EXPLAIN {sql}', params)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                self.assertIn('Index Scan', plan, sql)
+                self.assertNotIn('Sort', plan, sql)
+
+
+class GenreFilterTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.drama, self.crime, self.comedy = [GenreFactory(source_id=source_id, title=title)
+                                               for source_id, title in ((18, 'Drama'), (80, 'Crime'), (35, 'Comedy'))]
+        self.heat = FilmFactory(genre_ids=[self.drama, self.crime])
+        self.ronin = FilmFactory(genre_ids=[self.crime])
+        self.up = FilmFactory(genre_ids=[self.comedy])
+        self.tv = TvFactory(genre_ids=[TvGenreFactory(source_id=18, title='Drama')])
+        refresh_catalog(Film)
+        refresh_catalog(Tv)
+        self.url = reverse('movies:movies_json')
+
+    def get_ids(self, params, url=None):
+        response = self.client.get(url or self.url, params, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {film['id'] for film in response.json()['results']}
+
+    def test_masks(self):
+        bits = dict(GenreBit.objects.values_list('source_id', 'bit'))
+        self.assertEqual(set(bits), {18, 80, 35})
+        self.assertEqual(Film.objects.get(id=self.heat.id).genre_mask, 1 << bits[18] | 1 << bits[80])
+        # the tv genre shares the bit of the movie genre with the same source id
+        self.assertEqual(CatalogEntry.objects.get(id=self.tv.id).genre_mask, 1 << bits[18])
+
+        self.up.genre_ids.add(self.drama)
+        refresh_catalog(Film, [self.up.id])
+        self.assertEqual(CatalogEntry.objects.get(id=self.up.id).genre_mask, 1 << bits[18] | 1 << bits[35])
+
+    def test_filter(self):
+        self.assertEqual(self.get_ids({'genres': '18,80'}), {str(self.heat.id)})
+        self.assertEqual(self.get_ids({'genres': '18,80', 'genres_match': 'any'}),
+                         {str(self.heat.id), str(self.ronin.id), str(self.tv.id)})
+        self.assertEqual(self.get_ids({'genres': '35', 'cursor': ''}), {str(self.up.id)})
+        # an empty value is no filter
+        self.assertEqual(len(self.get_ids({'genres': ''})), CatalogEntry.objects.count())
+
+    def test_invalid_genres(self):
+        for genres in ('18,war', '10752'):
+            response = self.client.get(self.url, {'genres': genres}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('genres', response.json())
+
+    def test_facets(self):
+        url = reverse('movies:genre_facets')
+        # genre bits, one aggregate over the catalog, movie and tv genre titles
+        with self.assertNumQueries(4):
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.json(), {'count': 4, 'genres': [
+            {'id': 35, 'title': 'Comedy', 'count': 1},
+            {'id': 80, 'title': 'Crime', 'count': 2},
+            {'id': 18, 'title': 'Drama', 'count': 2},
+        ]})
+        response = self.client.get(url, {'genres': '80'}, format='json')
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual({genre['id']: genre['count'] for genre in response.json()['genres']},
+                         {35: 0, 80: 2, 18: 1})
+
+
+class CountModeTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        FilmFactory.create_batch(25)
+        refresh_catalog(Film)
+        self.url = reverse('movies:movies_json')
+
+    def test_cached_count(self):
+        response = self.client.get(self.url, format='json')
+        self.assertEqual(response['X-Count-Mode'], 'cached')
+        self.assertEqual(response.json()['count'], 25)
+        FilmFactory()
+        # the count is served from the cache until the catalog changes
+        self.assertEqual(self.client.get(self.url, format='json').json()['count'], 25)
+        with mock.patch('movies.caching.transaction.on_commit', side_effect=lambda function: function()):
+            refresh_catalog(Film)
+        self.assertEqual(self.client.get(self.url, format='json').json()['count'], 26)
+
+    def test_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {CatalogEntry._meta.db_table}')
+        self.assertEqual(count_rows(CatalogEntry.objects.all(), 'estimate'), (25, 'estimate'))
+        # filtered querysets have no estimate
+        self.assertEqual(count_rows(CatalogEntry.objects.filter(popularity=1), 'estimate'), (0, 'exact'))
+
+    @override_settings(PAGINATION_COUNT_MODE='exact')
+    def test_default_count_mode(self):
+        with mock.patch('movies.views.FilmsJsonView.count_mode', None):
+            response = self.client.get(self.url, format='json')
+        self.assertEqual(response['X-Count-Mode'], 'exact')
+
+
+class ResponseCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.films = FilmFactory.create_batch(3)
+        refresh_catalog(Film)
+        self.url = reverse('movies:movies_json')
+
+    def test_anonymous_pages_cached(self):
+        response = self.client.get(self.url + '?page=1&cursor=', format='json')
+        self.assertEqual(response['X-Cache'], 'miss')
+        # the order of query params does not matter
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(self.url + '?cursor=&page=1', format='json')
+        self.assertEqual(cached_response['X-Cache'], 'hit')
+        self.assertEqual(cached_response.json(), response.json())
+        self.assertEqual(self.client.get(self.url, format='json')['X-Cache'], 'miss')
+
+    def test_vote_invalidates_pages(self):
+        self.client.get(self.url, format='json')
+        with mock.patch('movies.caching.transaction.on_commit', side_effect=lambda function: function()):
+            VoteSerializer().update(self.films[0], {'vote': 10})
+        response = self.client.get(self.url, format='json')
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertIn(1, [film['vote_count'] for film in response.json()['results']])
+
+    def test_errors_not_cached(self):
+        url = reverse('movies:films_with_person_json')
+        self.client.get(url, format='json')
+        self.assertEqual(self.client.get(url, format='json')['X-Cache'], 'miss')
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        FilmFactory.create_batch(3)
+        refresh_catalog(Film)
+        self.url = reverse('movies:movies_json')
+
+    def test_if_none_match(self):
+        response = self.client.get(self.url, format='json')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotEqual(self.client.get(self.url + '?page=1', format='json')['ETag'], etag)
+
+        with mock.patch('movies.caching.transaction.on_commit', side_effect=lambda function: function()):
+            refresh_catalog(Film)
+        response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url, format='json')['Last-Modified']
+        response = self.client.get(self.url, format='json', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class SearchTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.films = [FilmFactory(title=title, original_title=title, popularity=1.)
+                      for title in ('Malena', 'Irreversible', 'The Matrix')]
+        PeopleFactory(name='Monica Bellucci', known_for=self.films[:2])
+        PeopleFactory(name='Monica Vitti', known_for=self.films[2:])
+        refresh_catalog(Film)
+        self.url = reverse('movies:films_with_person_json')
+
+    def test_substring_match(self):
+        response = self.client.get(self.url, {'actor_name': 'bellucci', 'match': 'substring'}, format='json')
+        self.assertEqual({film['title'] for film in response.json()['results']}, {'Malena', 'Irreversible'})
+        self.assertEqual(self.client.get(self.url, {'actor_name': 'Beluci', 'match': 'substring'},
+                                         format='json').json()['count'], 0)
+
+    def test_invalid_match(self):
+        response = self.client.get(self.url, {'actor_name': 'Monica', 'match': 'regex'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_trigram_falls_back_to_substring(self):
+        with mock.patch('movies.search.trigram_available', return_value=False):
+            response = self.client.get(self.url, {'actor_name': 'Bellucci', 'match': 'trigram'}, format='json')
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_trigram_queries(self):
+        for queryset in (search_catalog_by_person('Beluci', 'trigram'), search_people_by_title('Matrx', 'trigram')):
+            sql = str(queryset.query)
+            self.assertIn('<% ', sql)
+            self.assertIn('word_similarity', sql)
+
+    @skipUnless(connection.vendor == 'postgresql' and trigram_available(), 'needs pg_trgm')
+    def test_trigram_ranked(self):
+        response = self.client.get(self.url, {'actor_name': 'Monica Beluci', 'match': 'trigram'}, format='json')
+        titles = [film['title'] for film in response.json()['results']]
+        # films of the closer name go first, the other Monica may pass the threshold
+        self.assertEqual(set(titles[:2]), {'Malena', 'Irreversible'})
+        self.assertIn(titles[2:], ([], ['The Matrix']))
+        people = search_people_by_title('Matrx', 'trigram')
+        self.assertEqual([person.name for person in people], ['Monica Vitti'])
+
+
+class SearchIndexTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.films = [FilmFactory(source_id=number, title=title, original_title=original_title)
+                      for number, (title, original_title) in enumerate((('Malena', 'Malèna'),
+                                                                        ('Irreversible', 'Irréversible'),
+                                                                        ('The Matrix', 'The Matrix')))]
+        self.tv = TvFactory(name='Twin Peaks')
+        self.bellucci = PeopleFactory(name='Monica Bellucci', known_for=self.films[:2])
+        self.vitti = PeopleFactory(name='Monica Vitti', known_for=self.films[2:])
+        self.vitti.known_for_tv.add(self.tv)
+        refresh_catalog(Film)
+        refresh_catalog(Tv)
+        self.index = SearchIndex.build()
+
+    def test_same_as_sql(self):
+        for name in ('monica', 'a bell', 'CCI', 'Vitti', 'o', 'nobody'):
+            self.assertEqual(self.index.titles_for_actor(name),
+                             set(search_catalog_by_person(name, 'substring').values_list('id', flat=True)), name)
+        for title in ('malèna', 'rix', 'Matrix', 'e ma', 'twin'):
+            self.assertEqual(self.index.people_for_title(title),
+                             set(search_people_by_title(title, 'substring').values_list('id', flat=True)), title)
+        self.assertIsNone(self.index.titles_for_actor('-'))
+        self.assertEqual(self.index.people_for_title('twin'), set())
+        self.assertEqual(self.index.people_for_title('twin', with_tvs=True), {self.vitti.id})
+
+    def test_trigram_uses_index(self):
+        with mock.patch('movies.search.get_search_index', return_value=self.index), \
+                mock.patch('movies.search.set_similarity_threshold') as set_similarity_threshold:
+            titles = search_catalog_by_person('vitti', 'trigram')
+            people = search_people_by_title('twin', 'trigram')
+            misspelt = search_catalog_by_person('Vity', 'trigram')
+        # names and titles containing the query are only ranked, misspelt ones need the similarity search
+        self.assertEqual(set_similarity_threshold.call_count, 1)
+        for queryset in (titles, people):
+            sql = str(queryset.query)
+            self.assertNotIn('<% ', sql)
+            self.assertIn('word_similarity', sql)
+        self.assertEqual(set(titles.values_list('id', flat=True)), {self.films[2].id, self.tv.id})
+        self.assertEqual(set(people.values_list('id', flat=True)), {self.vitti.id})
+        self.assertIn('<% ', str(misspelt.query))
+
+    @skipUnless(connection.vendor == 'postgresql' and trigram_available(), 'needs pg_trgm')
+    def test_default_match_uses_index(self):
+        url = reverse('movies:films_with_person_json')
+        with mock.patch('movies.search.get_search_index', return_value=self.index), \
+                mock.patch('movies.search.set_similarity_threshold') as set_similarity_threshold:
+            response = self.client.get(url, {'actor_name': 'vitti'}, format='json')
+            # the names containing it are ranked without the similarity search
+            set_similarity_threshold.assert_not_called()
+            self.assertEqual({film['title'] for film in response.json()['results']}, {'The Matrix', 'Twin Peaks'})
+            people = search_people_by_title('twin', 'trigram')
+            set_similarity_threshold.assert_not_called()
+            self.assertEqual([(person.id, person.rank) for person in people], [(self.vitti.id, 1.0)])
+
+            # misspelt names are found by the similarity search
+            response = self.client.get(url, {'actor_name': 'Monica Vity'}, format='json')
+            set_similarity_threshold.assert_called_once_with()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_views_use_index(self):
+        with mock.patch('movies.search.get_search_index', return_value=self.index), \
+                mock.patch('movies.search.filter_by_person') as filter_by_person:
+            response = self.client.get(reverse('movies:films_with_person_json'),
+                                       {'actor_name': 'vitti', 'match': 'substring'}, format='json')
+        filter_by_person.assert_not_called()
+        self.assertEqual({film['title'] for film in response.json()['results']}, {'The Matrix', 'Twin Peaks'})
+
+    def test_sync(self):
+        upsert_people([{'id': 10, 'name': 'Keanu Reeves', 'known_for': [{'media_type': 'movie', 'id': 2}]}])
+        Film.objects.filter(id=self.films[0].id).update(title='Malena 2000')
+        record_search_changes('movie', [self.films[0].id, self.films[1].id])
+        film_id = self.films[1].id
+        self.films[1].delete()
+        self.assertTrue(self.index.sync())
+        self.assertEqual(self.index.titles_for_actor('keanu'), {self.films[2].id})
+        self.assertEqual(self.index.people_for_title('Matrix'), {self.vitti.id, Person.objects.get(source_id=10).id})
+        self.assertEqual(self.index.people_for_title('2000'), {self.bellucci.id})
+        self.assertEqual(self.index.titles_for_actor('bellucci'), {self.films[0].id})
+        self.assertNotIn(film_id, self.index.films.positions)
+
+        Tv.objects.filter(id=self.tv.id).update(name='Peaks')
+        record_search_changes('tv', [self.tv.id])
+        self.assertTrue(self.index.sync())
+        self.assertEqual(self.index.people_for_title('twin', with_tvs=True), set())
+        self.assertEqual(self.index.people_for_title('peaks', with_tvs=True), {self.vitti.id})
+
+        record_search_changes('person')
+        self.assertFalse(self.index.sync())
+
+    @override_settings(SEARCH_INDEX_ENABLED=False)
+    def test_changes_recorded_without_index(self):
+        # ingestion workers load no index, the web workers still replay their changes
+        upsert_films([{'id': 20, 'title': 'Heat', 'adult': False, 'video': False}])
+        self.assertEqual(list(SearchIndexChange.objects.values_list('source', 'object_id')),
+                         [('movie', Film.objects.get(source_id=20).id)])
+
+    def test_stats(self):
+        stats = self.index.get_stats()
+        self.assertEqual((stats['people'], stats['films'], stats['tvs']), (2, 3, 1))
+        self.assertGreater(stats['bytes'], 0)
+        out = StringIO()
+        call_command('search_index_stats', stdout=out)
+        self.assertIn('build_seconds: ', out.getvalue())
+
+
+class RendererTests(TestCase):
+    data = OrderedDict([
+        ('id', uuid.UUID('c1c6f2d0-8d8e-4b41-a4c9-3a4a9b3d1f60')),
+        ('created_date', datetime(2019, 12, 1, 10, 30, 5, 123456, tzinfo=pytz.utc)),
+        ('release_date', date(2019, 12, 1)),
+        ('vote_average', Decimal('7.30')),
+        ('title', gettext_lazy('Malèna')),
+        ('overview', 'line\u2028separator'),
+        ('genres', [{'id': 18, 'title': 'Drama'}, {'id': 10749, 'title': None}]),
+        (1, 0.5),
+    ])
+
+    def test_same_as_stock(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(FastJSONRenderer().render({'big': 2 ** 70}), JSONRenderer().render({'big': 2 ** 70}))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_without_orjson(self):
+        with mock.patch('myproject.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+            self.assertEqual(FastJSONParser().parse(BytesIO(b'{"a": [1]}')), {'a': [1]})
+
+    def test_parse(self):
+        body = JSONRenderer().render(self.data)
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        self.assertEqual(FastJSONParser().parse(BytesIO('{"a": "é"}'.encode('latin-1')), None,
+                                                {'encoding': 'latin-1'}), {'a': 'é'})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"a": '))
+
+    def test_benchmark_renderers(self):
+        out = StringIO()
+        call_command('benchmark_renderers', '--page-size', '2', '--repeat', '1', stdout=out)
+        self.assertIn('FilmsJsonView speedup', out.getvalue())
+        self.assertIn('MovieCommentsView speedup', out.getvalue())
+        self.assertFalse(Film.objects.filter(title='Film 0').exists())
+
+
+class BatchLookupTests(APITestCase):
+
+    def setUp(self):
+        self.drama, self.crime = GenreFactory(source_id=18, title='Drama'), GenreFactory(source_id=80, title='Crime')
+        self.films = [FilmFactory(title=f'Film {number}', genre_ids=[self.crime, self.drama]) for number in range(3)]
+        self.tv = TvFactory(name='Tv', first_air_date='2019-12-01',
+                            genre_ids=[TvGenreFactory(source_id=18, title='Drama')])
+        self.url = reverse('movies:batch_lookup')
+
+    def test_lookup(self):
+        missing = uuid.uuid4()
+        ids = [self.films[2].id, missing, self.tv.id, self.films[0].id, self.films[2].id]
+        # films, then the rest among tvs
+        with self.assertNumQueries(2):
+            response = self.client.post(self.url, {'ids': [str(pk) for pk in ids]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual([row['id'] for row in results],
+                         [str(self.films[2].id), str(self.tv.id), str(self.films[0].id)])
+        self.assertEqual(response.json()['missing'], [str(missing)])
+        self.assertEqual(results[0]['title'], 'Film 2')
+        self.assertEqual(results[0]['genres'], [{'id': 18, 'title': 'Drama'}, {'id': 80, 'title': 'Crime'}])
+        self.assertEqual((results[1]['title'], results[1]['release_date']), ('Tv', '2019-12-01'))
+        self.assertEqual(results[1]['genres'], [{'id': 18, 'title': 'Drama'}])
+
+    def test_invalid_ids(self):
+        for ids in ([], ['garbage'], [str(uuid.uuid4()) for _ in range(settings.BATCH_LOOKUP_MAX_IDS + 1)]):
+            response = self.client.post(self.url, {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('ids', response.json())
+
+
+class CatalogExportTests(APITestCase):
+    client_class = APIJWTClient
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.user.set_password('pass')
+        self.user.save()
+        token = self.client.post(reverse('token_obtain_pair'),
+                                 data={'username': self.user.username, 'password': 'pass'}, format='json').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'{token}')
+        self.genre = GenreFactory(source_id=18, title='Drama')
+        self.films = FilmFactory.create_batch(30, genre_ids=[self.genre])
+        self.tvs = TvFactory.create_batch(5)
+        refresh_catalog(Film)
+        refresh_catalog(Tv)
+        self.url = reverse('movies:catalog_export')
+
+    @staticmethod
+    def read_lines(response, compressed=False):
+        body = b''.join(response.streaming_content)
+        return [json.loads(line) for line in (gzip.decompress(body) if compressed else body).splitlines()]
+
+    @override_settings(EXPORT_CHUNK_SIZE=7, EXPORT_BUFFER_SIZE=1000)
+    def test_export(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertNotIn('Content-Encoding', response)
+        lines = self.read_lines(response)
+        self.assertEqual([line['id'] for line in lines], sorted(str(row.id) for row in self.films + self.tvs))
+        film = next(line for line in lines if line['id'] == str(self.films[0].id))
+        self.assertEqual(film['genre_ids'], [18])
+        self.assertIsNotNone(film['updated_at'])
+
+    def test_gzip(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(self.read_lines(response, compressed=True)), 35)
+
+    def test_gzip_refused(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='br, gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(len(self.read_lines(response)), 35)
+
+    def test_updated_since(self):
+        CatalogEntry.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        # unchanged entries keep their time, changed ones are stamped again
+        self.assertEqual(refresh_catalog(Film), 0)
+        Film.objects.filter(id=self.films[0].id).update(title='Heat')
+        self.assertEqual(refresh_catalog(Film, [self.films[0].id, self.films[1].id]), 1)
+        since = timezone.now() - timedelta(days=1)
+        lines = self.read_lines(self.client.get(self.url, {'updated_since': since.isoformat()}))
+        self.assertEqual([line['title'] for line in lines], ['Heat'])
+
+        response = self.client.get(self.url, {'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('updated_since', response.json())
+
+    def test_unauthorized(self):
+        self.client.credentials()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CompressionTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        FilmFactory.create_batch(20, overview='A retired thief is pulled back for one last job. ' * 5)
+        refresh_catalog(Film)
+        self.url = reverse('movies:movies_json')
+
+    def test_gzip(self):
+        plain = self.client.get(self.url, format='json')
+        response = self.client.get(self.url, format='json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertLess(len(response.content), len(plain.content) / 3)
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        # the weak ETag still matches
+        response = self.client.get(self.url, format='json', HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @skipUnless(brotli, 'needs brotli')
+    def test_brotli(self):
+        plain = self.client.get(self.url, format='json')
+        response = self.client.get(self.url, format='json', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_breach_mitigation(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        body = b'<input name="csrfmiddlewaretoken" value="token">' * 50
+        # HTML pages are not compressed
+        response = CompressionMiddleware(lambda request: HttpResponse(body))(request)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response.content, body)
+
+        json_response = HttpResponse(b'[' + b'{"id": 1},' * 200 + b'{}]', content_type='application/json')
+        json_response.set_cookie(settings.CSRF_COOKIE_NAME, 'token')
+        response = CompressionMiddleware(lambda request: json_response)(request)
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_choose_encoding(self):
+        with mock.patch('myproject.middleware.brotli', object()):
+            self.assertEqual(choose_encoding('gzip, br'), 'br')
+            self.assertEqual(choose_encoding('br;q=0.5, gzip'), 'gzip')
+            self.assertEqual(choose_encoding('br;q=0, *'), 'gzip')
+            self.assertIsNone(choose_encoding('identity'))
+            self.assertEqual(choose_encoding('gzip, br', ('gzip', )), 'gzip')
+        with mock.patch('myproject.middleware.brotli', None):
+            self.assertIsNone(choose_encoding('br'))
+
+    def test_compressed_once(self):
+        with mock.patch('myproject.middleware.compress', wraps=compress) as compress_mock:
+            first = self.client.get(self.url, format='json', HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get(self.url, format='json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compress_mock.call_count, 1)
+        self.assertEqual(second['X-Cache'], 'hit')
+        self.assertEqual(second.content, first.content)
+
+    def test_small_body(self):
+        response = self.client.get(reverse('movies:films_with_person_json'), {'actor_name': 'nobody'},
+                                   format='json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+
+class FilmsViewTests(TestCase):
+
+    def setUp(self):
+        self.genres = GenreFactory.create_batch(2, source_id=factory.Sequence(int), title=factory.Faker('word'))
+        self.tv_genre = TvGenreFactory(source_id=100, title='Drama')
+        # films and tvs share source ids
+        self.films = FilmFactory.create_batch(10, source_id=factory.Iterator(range(10)), genre_ids=self.genres)
+        self.tvs = TvFactory.create_batch(10, source_id=factory.Iterator(range(10)), genre_ids=[self.tv_genre])
+        refresh_catalog(Film)
+        refresh_catalog(Tv)
+
+    def test_attach_genres(self):
+        rows = [{'id': self.films[0].id, 'type': 'movie'}, {'id': self.tvs[0].id, 'type': 'tv'},
+                {'id': FilmFactory().id, 'type': 'movie'}]
+        with self.assertNumQueries(2):
+            attach_genres(rows)
+        self.assertEqual(rows[0]['genres'], [{'id': genre.source_id, 'title': genre.title} for genre in self.genres])
+        self.assertEqual(rows[1]['genres'], [{'id': 100, 'title': 'Drama'}])
+        self.assertEqual(rows[2]['genres'], [])
+
+    def test_catalog_entries(self):
+        tv = self.tvs[0]
+        entry = CatalogEntry.objects.get(id=tv.id)
+        self.assertEqual((entry.type, entry.title, entry.release_date, entry.genre_ids),
+                         (tv.type, tv.name, tv.first_air_date, [100]))
+        tv_id = tv.id
+        tv.delete()
+        self.assertEqual(refresh_catalog(Tv, [tv_id]), 0)
+        self.assertFalse(CatalogEntry.objects.filter(id=tv_id).exists())
+        self.assertEqual(CatalogEntry.objects.count(), 19)
+
+    def test_films_page(self):
+        # count, page rows, film genres and tv genres
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('movies:movies'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, 'Drama;', count=10)
+
+    def test_films_with_page(self):
+        PeopleFactory(name='Monica Bellucci', known_for=self.films[:3])
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('movies:films_with_actor', args=['Monica_Bellucci']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, f'{self.genres[0].title};', count=3)
+
+
+class UpsertFilmsTests(TestCase):
+
+    def setUp(self):
+        self.genres = GenreFactory.create_batch(2, source_id=factory.Sequence(lambda i: i))
+        self.films_list = [{
+            'id': source_id,
+            'title': f'Film {source_id}',
+            'original_title': f'Film {source_id}',
+            'popularity': 1.5,
+            'vote_count': 10,
+            'vote_average': 7.1,
+            'adult': False,
+            'genre_ids': [genre.source_id for genre in self.genres],
+        } for source_id in range(20)]
+
+    def test_insert_page(self):
+        # upsert films, SELECT genres, SELECT stored genre links, INSERT genre links,
+        # assign genre bits under a lock, refresh genre masks and the catalog, INSERT search index changes
+        # and savepoint queries
+        with self.assertNumQueries(15):
+            report = upsert_films(self.films_list)
+        self.assertEqual(report['inserted'], 20)
+        self.assertEqual(report['updated'], 0)
+        self.assertEqual(Film.objects.count(), 20)
+        self.assertEqual(Film.genre_ids.through.objects.count(), 40)
+        self.assertEqual(CatalogEntry.objects.get(source_id=0).genre_ids, [genre.source_id for genre in self.genres])
+        self.assertEqual(CatalogEntry.objects.get(source_id=0).genre_mask, 0b11)
+
+    def test_update_page(self):
+        upsert_films(self.films_list)
+        for film_dict in self.films_list:
+            film_dict['title'] = 'Updated'
+        report = upsert_films(self.films_list)
+        self.assertEqual(report['inserted'], 0)
+        self.assertEqual(report['updated'], 20)
+        self.assertEqual(Film.objects.filter(title='Updated').count(), 20)
+        self.assertEqual(Film.genre_ids.through.objects.count(), 40)
+
+    def test_removed_genre_unlinked(self):
+        upsert_films(self.films_list)
+        self.films_list[0]['genre_ids'] = [self.genres[0].source_id]
+        report = upsert_films(self.films_list)
+        self.assertEqual(report['updated'], 1)
+        film = Film.objects.get(source_id=0)
+        self.assertEqual(list(film.genre_ids.all()), [self.genres[0]])
+        self.assertEqual(CatalogEntry.objects.get(source_id=0).genre_ids, [self.genres[0].source_id])
+        self.assertEqual(CatalogEntry.objects.get(source_id=0).genre_mask, 0b1)
+        self.assertEqual(Film.objects.get(source_id=1).genre_ids.count(), 2)
+
+    def test_unchanged_page_not_written(self):
+        upsert_films(self.films_list)
+        self.films_list[0]['title'] = 'Updated'
+        # upsert films writing only the changed one, SELECT genres, SELECT stored genre links,
+        # INSERT genre links, check genre bits, refresh its genre mask and catalog entry,
+        # INSERT its search index change and savepoint queries
+        with self.assertNumQueries(11):
+            report = upsert_films(self.films_list)
+        self.assertEqual(report['updated'], 1)
+        self.assertEqual(report['unchanged'], 19)
+        with self.assertNumQueries(3):
+            report = upsert_films(self.films_list)
+        self.assertEqual(report['unchanged'], 20)
+
+    def test_source_id_written_by_another_shard(self):
+        FilmFactory(source_id=0, title='Stale')
+        report = upsert_films(self.films_list)
+        self.assertEqual((report['inserted'], report['updated']), (19, 1))
+        self.assertEqual(Film.objects.get(source_id=0).title, 'Film 0')
+        self.assertEqual(CatalogEntry.objects.filter(source_id=0).count(), 1)
+
+    def test_missing_genres(self):
+        self.films_list[0]['genre_ids'] = [100]
+        report = upsert_films(self.films_list)
+        self.assertEqual(report['missing_genres'], 1)
+        self.assertFalse(Film.objects.get(source_id=0).genre_ids.exists())
+
+    def test_tv_genres_copied_from_movie_genres(self):
+        tvs_list = [{'id': 1, 'name': 'Tv', 'genre_ids': [genre.source_id for genre in self.genres]}]
+        report = upsert_tvs(tvs_list)
+        self.assertEqual(report['inserted'], 1)
+        self.assertEqual(TvGenre.objects.count(), 2)
+        self.assertEqual(Tv.objects.get(source_id=1).genre_ids.count(), 2)
+
+
+class TmdbFetcherTests(SimpleTestCase):
+
+    def setUp(self):
+        self.fetcher = TmdbFetcher(requests_per_second=1000, concurrency=4)
+
+    def fake_get(self, url, params, timeout):
+        return make_tmdb_response({'page': params['page'], 'total_pages': 5, 'results': [params['page']]})
+
+    def test_iter_pages_in_order(self):
+        with mock.patch.object(self.fetcher.session, 'get', side_effect=self.fake_get) as session_get:
+            pages = list(self.fetcher.iter_pages('http://tmdb/discover/movie'))
+        self.assertEqual(pages, [[1], [2], [3], [4], [5]])
+        self.assertEqual(session_get.call_count, 5)
+
+    def test_reentrant(self):
+        with mock.patch.object(self.fetcher.session, 'get', side_effect=self.fake_get):
+            first_run = list(self.fetcher.iter_pages('http://tmdb/discover/movie'))
+            second_run = list(self.fetcher.iter_pages('http://tmdb/discover/movie'))
+        self.assertEqual(first_run, second_run)
+
+    def test_shared_rate_limit(self):
+        # two workers sharing the cache get one budget per second
+        first_worker, second_worker = SharedRateLimit(2, key='test:requests'), SharedRateLimit(2, key='test:requests')
+        seconds = []
+        for limit in (first_worker, second_worker, first_worker):
+            limit.acquire()
+            seconds.append(int(time.time()))
+        self.assertLess(seconds[0], seconds[2])
+
+    @mock.patch('movies.fetcher.time.sleep')
+    def test_retry_on_server_error(self, sleep):
+        responses = [make_tmdb_response({}, 503), make_tmdb_response({'genres': []})]
+        with mock.patch.object(self.fetcher.session, 'get', side_effect=responses) as session_get:
+            self.assertEqual(self.fetcher.get('http://tmdb/genre/movie/list'), {'genres': []})
+        self.assertEqual(session_get.call_count, 2)
+        self.assertEqual(sleep.call_count, 1)
+
+    @mock.patch('movies.fetcher.time.sleep')
+    def test_retries_exhausted(self, sleep):
+        with mock.patch.object(self.fetcher.session, 'get', side_effect=requests.Timeout):
+            with self.assertRaises(requests.Timeout):
+                self.fetcher.get('http://tmdb/genre/movie/list')
+        self.assertEqual(sleep.call_count, self.fetcher.max_retries)
+
+
+class RunPipelineTests(TestCase):
+
+    def test_batches(self):
+        batches = []
+
+        def writer(batch):
+            batches.append(list(batch))
+            return Counter(inserted=len(batch))
+
+        pages = ([page * 2, page * 2 + 1] for page in range(5))
+        report = run_pipeline(pages, writer, batch_size=4, queue_size=2)
+        self.assertEqual(batches, [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+        self.assertEqual(report['inserted'], 10)
+
+    def test_fetch_error_raised(self):
+        def pages():
+            yield [1]
+            raise requests.ConnectionError('TMDB is down')
+
+        with self.assertRaises(requests.ConnectionError):
+            run_pipeline(pages(), lambda batch: Counter(), batch_size=1)
+
+    def test_write_error_stops_producer(self):
+        def writer(batch):
+            raise ValueError('Write failed')
+
+        with self.assertRaises(ValueError):
+            run_pipeline(([page] for page in range(1000)), writer, batch_size=1, queue_size=1)
+
+    def test_write_error_after_last_page(self):
+        exhausted, errors = threading.Event(), []
+
+        def pages():
+            yield from ([page] for page in range(3))
+            exhausted.set()
+
+        def writer(batch):
+            # the producer is left with the end of pages and a full queue
+            exhausted.wait(5)
+            raise ValueError('Write failed')
+
+        def run():
+            try:
+                run_pipeline(pages(), writer, batch_size=1, queue_size=2)
+            except ValueError as exception:
+                errors.append(exception)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+
+
+@override_settings(INGESTION_SHARD_PAGES=1)
+class SyncSourceTests(TestCase):
+    """
+    Runs the sync against a local stand-in of the TMDB listing, changes and details endpoints.
+    """
+
+    def setUp(self):
+        self.films = {source_id: {'id': source_id, 'title': f'Film {source_id}', 'adult': False, 'genre_ids': []}
+                      for source_id in range(1, 41)}
+        self.changed_ids = [3, 3, 99, 40]
+        self.requested_paths = []
+        patcher = mock.patch('movies.fetcher.requests.Session.get', side_effect=self.fake_get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+    def fake_get(self, url, params, timeout):
+        path = url[len(settings.FILM_API_URL):]
+        self.requested_paths.append(path)
+        if path == 'discover/movie':
+            films = list(self.films.values())
+            return make_tmdb_response({'page': params['page'], 'total_pages': 2,
+                                       'results': films[(params['page'] - 1) * 20:params['page'] * 20]})
+        if path == 'movie/changes':
+            return make_tmdb_response({'page': 1, 'total_pages': 1,
+                                       'results': [{'id': source_id} for source_id in self.changed_ids]})
+        source_id = int(path.split('/')[1])
+        if source_id not in self.films:
+            return make_tmdb_response({}, 404)
+        film = dict(self.films[source_id], genres=[])
+        del film['genre_ids']
+        return make_tmdb_response(film)
+
+    def sync(self, full=False):
+        return sync_source('movie', upsert_films, get_paginated_films, full=full)
+
+    def test_first_run_full_sweep(self):
+        report = self.sync()
+        self.assertEqual(report, Counter(full_sweep=1))
+        # the sweep runs as a sharded ingestion job
+        job = IngestionJob.objects.get()
+        self.assertEqual(job.url, settings.FILM_API_URL + 'discover/movie')
+        self.assertEqual(job.inserted, 40)
+        self.assertEqual(job.checkpoints.count(), 2)
+        watermark = SyncWatermark.objects.get(source='movie')
+        self.assertIsNotNone(watermark.synced_at)
+        self.assertEqual(watermark.last_page, 2)
+
+    def test_incremental_run(self):
+        self.sync()
+        self.requested_paths = []
+        self.films[3]['title'] = 'Changed'
+        del self.films[40]
+
+        report = self.sync()
+        # 99 is not stored, e.g. an adult title, so its details are not asked for
+        self.assertEqual(self.requested_paths, ['movie/changes', 'movie/3', 'movie/40'])
+        self.assertEqual(report['updated'], 1)
+        self.assertEqual(report['absent'], 1)
+        self.assertEqual(report['untracked'], 1)
+        self.assertFalse(Film.objects.filter(source_id=99).exists())
+        self.assertEqual(Film.objects.get(source_id=3).title, 'Changed')
+
+    def test_expired_watermark_full_sweep(self):
+        SyncWatermark.objects.create(source='movie', synced_at=timezone.now() - timedelta(days=30))
+        report = self.sync()
+        self.assertEqual(report['full_sweep'], 1)
+
+    def test_forced_full_sweep(self):
+        self.sync()
+        report = self.sync(full=True)
+        self.assertEqual(report['full_sweep'], 1)
+        self.assertEqual(IngestionJob.objects.latest('started_at').unchanged, 40)
+
+    def test_unfinished_sweep_resumed(self):
+        job = IngestionJob.objects.create(name='Films', url=settings.FILM_API_URL + 'discover/movie', total_pages=2,
+                                          heartbeat_at=timezone.now() - timedelta(hours=1))
+        IngestionCheckpoint.objects.create(job=job, page=1)
+        SyncWatermark.objects.create(source='movie', synced_at=timezone.now())
+        self.sync()
+        # only the shard with the uncommitted page runs instead of the changes feed
+        self.assertEqual(self.requested_paths, ['discover/movie'])
+        job.refresh_from_db()
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.inserted, 20)
+        # changes since the start of the sweep are asked for by the next run
+        self.assertEqual(SyncWatermark.objects.get(source='movie').synced_at, job.started_at)
+
+    def test_running_sweep_left_alone(self):
+        job = IngestionJob.objects.create(name='Films', url=settings.FILM_API_URL + 'discover/movie', total_pages=2,
+                                          heartbeat_at=timezone.now())
+        synced_at = timezone.now() - timedelta(days=1)
+        SyncWatermark.objects.create(source='movie', synced_at=synced_at)
+        self.assertEqual(self.sync(), Counter(sweep_running=1))
+        self.assertEqual(self.requested_paths, [])
+        self.assertEqual(SyncWatermark.objects.get(source='movie').synced_at, synced_at)
+        self.assertFalse(job.checkpoints.exists())
+
+
+@override_settings(INGESTION_SHARD_PAGES=2, INGESTION_BATCH_SIZE=20)
+class PaginatedFilmsChordTests(TestCase):
+
+    def setUp(self):
+        self.url = settings.FILM_API_URL + 'discover/movie'
+        self.requested_pages = []
+        self.broken_page = None
+        patcher = mock.patch('movies.fetcher.requests.Session.get', side_effect=self.fake_get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+    def fake_get(self, url, params, timeout):
+        self.requested_pages.append(params['page'])
+        if params['page'] == self.broken_page:
+            return make_tmdb_response({}, 404)
+        return make_tmdb_response({'page': params['page'], 'total_pages': 5,
+                                   'results': [{'id': params['page'] * 100 + i, 'adult': False, 'genre_ids': []}
+                                               for i in range(20)]})
+
+    def test_split_pages(self):
+        self.assertEqual(split_pages(5, 2), [(1, 2), (3, 4), (5, 5)])
+        self.assertEqual(split_pages(4, 2), [(1, 2), (3, 4)])
+        self.assertEqual(split_pages(0, 2), [])
+
+    def test_shards_dispatched(self):
+        job_id = get_paginated_films(self.url)
+        self.assertEqual(Film.objects.count(), 100)
+        # the coordinator reads total_pages from page 1, then every shard fetches its own pages
+        self.assertEqual(sorted(self.requested_pages), [1, 1, 2, 3, 4, 5])
+        job = IngestionJob.objects.get(id=job_id)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.inserted, 100)
+        self.assertEqual(job.completed_pages(), {1, 2, 3, 4, 5})
+
+    def test_totals_recorded(self):
+        report = record_ingestion_totals([{'inserted': 40}, {'inserted': 20, 'updated': 20}], 'Films')
+        self.assertEqual(report, {'inserted': 60, 'updated': 20})
+
+    def test_crashed_shard_keeps_committed_pages(self):
+        job = IngestionJob.objects.create(name='Films', url=self.url, total_pages=5)
+        self.broken_page = 4
+        with self.assertRaises(requests.HTTPError):
+            ingest_pages(self.url, 1, 5, upsert_films, job)
+        self.assertTrue({1, 2, 3}.issubset(job.completed_pages()))
+        self.assertNotIn(4, job.completed_pages())
+        self.assertEqual(Film.objects.count(), len(job.completed_pages()) * 20)
+
+    def test_resume_unfinished_job(self):
+        job = IngestionJob.objects.create(name='Films', url=self.url, total_pages=5)
+        job.checkpoint([1, 2, 3])
+        # the shards stopped beating longer than the lease ago
+        IngestionJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        job_id = get_paginated_films(self.url)
+        self.assertEqual(job_id, str(job.id))
+        self.assertEqual(sorted(self.requested_pages), [4, 5])
+        job.refresh_from_db()
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.inserted, 40)
+
+    def test_running_job_not_dispatched_again(self):
+        job = IngestionJob.objects.create(name='Films', url=self.url, total_pages=5)
+        job.checkpoint([1, 2, 3])
+        self.assertEqual(get_paginated_films(self.url), str(job.id))
+        self.assertEqual(self.requested_pages, [])
+        job.refresh_from_db()
+        self.assertIsNone(job.finished_at)
+
+    def test_new_job_after_finished_one(self):
+        first_job_id = get_paginated_films(self.url)
+        self.assertNotEqual(get_paginated_films(self.url), first_job_id)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'load_catalog needs PostgreSQL COPY')
+class LoadCatalogCommandTests(TestCase):
+
+    def setUp(self):
+        records = [
+            {'kind': 'genre', 'id': 1, 'name': 'Drama'},
+            {'kind': 'tv_genre', 'id': 2, 'name': 'Soap'},
+            {'kind': 'movie', 'id': 10, 'title': 'Old title', 'genre_ids': [1]},
+            {'kind': 'movie', 'id': 10, 'title': 'Tab\there', 'overview': 'Line\nbreak \\ "quoted"',
+             'adult': None, 'popularity': 1.5, 'genre_ids': [1]},
+            {'kind': 'tv', 'id': 20, 'name': 'Tv', 'genre_ids': [1, 2]},
+            {'kind': 'person', 'id': 30, 'name': 'Person',
+             'known_for': [{'media_type': 'movie', 'id': 10}, {'media_type': 'tv', 'id': 20}]},
+        ]
+        dump = tempfile.NamedTemporaryFile(suffix='.jsonl.gz', delete=False)
+        self.addCleanup(os.remove, dump.name)
+        with gzip.open(dump, 'wt') as dump_file:
+            for record in records:
+                dump_file.write(json.dumps(record) + '\n')
+        self.path = dump.name
+
+    def test_load(self):
+        FilmFactory(source_id=10, title='Stored')
+        call_command('load_catalog', self.path, stdout=StringIO())
+
+        film = Film.objects.get(source_id=10)
+        self.assertEqual(film.title, 'Tab\there')
+        self.assertEqual(film.overview, 'Line\nbreak \\ "quoted"')
+        self.assertEqual(film.popularity, 1.5)
+        self.assertFalse(film.adult)
+        self.assertIsNone(film.payload_hash)
+        self.assertEqual([genre.title for genre in film.genre_ids.all()], ['Drama'])
+        tv = Tv.objects.get(source_id=20)
+        self.assertEqual(tv.type, 'tv')
+        self.assertEqual(sorted(genre.source_id for genre in tv.genre_ids.all()), [1, 2])
+        person = Person.objects.get(source_id=30)
+        self.assertEqual(list(person.known_for.all()), [film])
+        self.assertEqual(list(person.known_for_tv.all()), [tv])
+
+    def test_load_twice(self):
+        call_command('load_catalog', self.path, stdout=StringIO())
+        call_command('load_catalog', self.path, stdout=StringIO())
+        self.assertEqual(Film.objects.count(), 1)
+        self.assertEqual(Film.genre_ids.through.objects.count(), 1)
+
+
+class BenchmarkIngestionCommandTests(TestCase):
+
+    def test_fake_tmdb_listing(self):
+        with FakeTmdbServer(total_pages=3, page_size=5) as server:
+            pages = list(TmdbFetcher().iter_pages(server.url + 'discover/movie'))
+        self.assertEqual(len(pages), 3)
+        self.assertEqual([film['id'] for film in pages[2]], [11, 12, 13, 14, 15])
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command('benchmark_ingestion', '--kind', 'films', '--pages', '2', '--latency', '0', stdout=out)
+        self.assertIn('films: 2 pages, 40 rows', out.getvalue())
+        self.assertIn('queries/row', out.getvalue())
+        self.assertFalse(Film.objects.exists())
@@ -1,4 +1,8 @@
 import factory
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -6,6 +10,7 @@ from rest_framework_jwt.test import APIJWTClient
 
 from myproject.settings import REST_FRAMEWORK
 from people.models import Person
+from people.ingestion import upsert_people
 from tests.tests_movies import GenreFactory, TvGenreFactory, FilmFactory, TvFactory
 
 
@@ -40,6 +45,7 @@ class FilmWithPersonJsonViewTests(APITestCase):
     client_class = APIJWTClient
 
     def setUp(self):
+        cache.clear()
         self.genres = GenreFactory.create_batch(3)
         self.tv_genres = TvGenreFactory.create_batch(3)
         self.films = FilmFactory.create_batch(1, genre_ids=self.genres, title='Finding Nemo')
@@ -113,9 +119,95 @@ class FilmWithPersonJsonViewTests(APITestCase):
         self.assertEqual(len(response_json['results']), REST_FRAMEWORK['PAGE_SIZE'])
         self.assertEqual(response_json, expected_result)
 
+    def test_projection(self):
+        self.url += '?film_title=finding_nemo&match=substring'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url + '&fields=id,name,known_for.title', format='json')
+        self.assertEqual(response.json()['results'][0], {'id': str(self.actors[0].id), 'name': self.actors[0].name,
+                                                         'known_for': [{'title': 'Finding Nemo'}]})
+        # one query per projected title list for the whole page, no per person queries
+        films_sql = [query['sql'] for query in queries if ' FROM "movies_film"' in query['sql']]
+        self.assertEqual(len(films_sql), 1)
+        self.assertNotIn('overview', films_sql[0])
+        self.assertFalse(any(' FROM "movies_tv"' in query['sql'] for query in queries))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url + '&exclude=known_for,known_for_tv', format='json')
+        self.assertNotIn('known_for', response.json()['results'][0])
+        self.assertFalse(any(' FROM "movies_' in query['sql'] for query in queries))
+
     def test_null_data(self):
         self.url = reverse('people:actors_in_film_json')
         response = self.client.get(self.url, format='json')
         response_json = response.json()
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response_json, {'film_title': ['This field may not be null.']})
+
+
+class UpsertPeopleTests(TestCase):
+
+    def setUp(self):
+        self.film = FilmFactory(source_id=1)
+        self.tv = TvFactory(source_id=2)
+        self.people_list = [{
+            'id': source_id,
+            'name': f'Person {source_id}',
+            'popularity': 2.5,
+            'known_for': [{'media_type': 'movie', 'id': 1}, {'media_type': 'tv', 'id': 2}],
+        } for source_id in range(3)]
+
+    def test_insert(self):
+        report = upsert_people(self.people_list)
+        self.assertEqual(report['inserted'], 3)
+        person = Person.objects.get(source_id=0)
+        self.assertEqual(list(person.known_for.all()), [self.film])
+        self.assertEqual(list(person.known_for_tv.all()), [self.tv])
+
+    def test_batched_queries(self):
+        # upsert people, SELECT films, SELECT tvs, two SELECTs of stored links,
+        # two INSERTs of links, INSERT search index changes and savepoint queries
+        with self.assertNumQueries(10):
+            upsert_people(self.people_list)
+
+    def test_unresolved_titles(self):
+        self.people_list[0]['known_for'] += [{'media_type': 'movie', 'id': 100}, {'media_type': 'tv', 'id': 200}]
+        report = upsert_people(self.people_list)
+        self.assertEqual(report['unresolved_films'], 1)
+        self.assertEqual(report['unresolved_tvs'], 1)
+        self.assertEqual(Person.objects.get(source_id=0).known_for.count(), 1)
+
+    def test_unchanged_and_updated(self):
+        upsert_people(self.people_list)
+        self.people_list[0]['name'] = 'Renamed'
+        report = upsert_people(self.people_list)
+        self.assertEqual(report['updated'], 1)
+        self.assertEqual(report['unchanged'], 2)
+        self.assertEqual(Person.objects.get(source_id=0).name, 'Renamed')
+
+    def test_details_without_known_for(self):
+        upsert_people(self.people_list)
+        known_for_hash = Person.objects.get(source_id=0).known_for_hash
+        # 'person/{id}' details carry no known_for, the stored titles and their digest are kept
+        details = [{key: value for key, value in person_dict.items() if key != 'known_for'}
+                   for person_dict in self.people_list]
+        report = upsert_people(details)
+        self.assertEqual(report['unchanged'], 3)
+
+        details[0]['name'] = 'Renamed'
+        report = upsert_people(details)
+        self.assertEqual(report['updated'], 1)
+        person = Person.objects.get(source_id=0)
+        self.assertEqual(person.name, 'Renamed')
+        self.assertEqual(person.known_for_hash, known_for_hash)
+        self.assertEqual(list(person.known_for.all()), [self.film])
+
+    def test_known_for_changed(self):
+        upsert_people(self.people_list)
+        self.people_list[0]['known_for'] = [{'media_type': 'movie', 'id': 1}]
+        report = upsert_people(self.people_list)
+        self.assertEqual(report['updated'], 1)
+        self.assertEqual(report['unchanged'], 2)
+        # the tv dropped from known for is unlinked
+        person = Person.objects.get(source_id=0)
+        self.assertEqual(list(person.known_for.all()), [self.film])
+        self.assertFalse(person.known_for_tv.exists())
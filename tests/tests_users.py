@@ -189,6 +189,16 @@ class WishListViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response_json, expected_result)
 
+    def test_projection(self):
+        response = self.client.get(self.url, {'fields': 'wish_list.id,wish_list.title'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.json()['wish_list'], key=lambda film: film['id']),
+                         [{'id': str(film.id), 'title': film.title} for film in self.films])
+        # the authenticated user and the account, no wish list queries
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'exclude': 'user,wish_list,wish_list_tv'}, format='json')
+        self.assertEqual(response.json(), {'id': str(self.user_account.id)})
+
     def test_unauthorized(self):
         self.client.credentials()
 
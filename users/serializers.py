@@ -1,5 +1,7 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from movies.models import Film, Tv
+from movies.projection import get_model_fields
 from users.models import User
 from .models import UserAccount
 from movies.serializers import FilmSerializer, TvSerializer
@@ -61,6 +63,21 @@ class UserAccountSerializer(serializers.ModelSerializer):
 
         return instance
 
+    @staticmethod
+    def setup_queryset(queryset, projection):
+        """
+        Joins the user and prefetches only the projected columns of the wish lists when they are projected at all.
+        """
+        fields = projection.filter(('id', 'user', 'wish_list', 'wish_list_tv'))
+        if 'user' in fields:
+            queryset = queryset.select_related('user')
+        for name, serializer_class in (('wish_list', FilmSerializer), ('wish_list_tv', TvSerializer)):
+            if name in fields:
+                model = serializer_class.Meta.model
+                columns = get_model_fields(model, projection.nested(name).filter(serializer_class.Meta.fields))
+                queryset = queryset.prefetch_related(Prefetch(name, model.objects.only('id', *columns)))
+        return queryset
+
     class Meta:
         model = UserAccount
         fields = '__all__'
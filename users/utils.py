@@ -1,13 +1,16 @@
 from users.models import UserAccount
 
 
-def get_user_account(user_pk):
+def get_user_account(user_pk, queryset=None):
     """
     The function to check and get user account if it exists.
     :param user_pk: user account UUID.
+    :param queryset: user accounts to look in, e.g. with prefetched wish lists, all of them when None.
     :return: UserAccount instance if exists, if not - Http404 Error with message.
     """
+    if queryset is None:
+        queryset = UserAccount.objects.all()
     try:
-        return UserAccount.objects.get(user_id=user_pk)
+        return queryset.get(user_id=user_pk)
     except UserAccount.DoesNotExist:
         return None
@@ -4,8 +4,10 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from movies.models import Film, Tv
+from movies.projection import EXCLUDE_FIELD, FIELDS_FIELD, Projection, project_serializer
 from users import utils
 from users.permissions import JWTAuthentication, NonLogined
+from .models import UserAccount
 from .serializers import UserAccountSerializer, DeleteManyFilmTvSerializer
 
 
@@ -37,16 +39,21 @@ class WishListView(APIView):
     """
     permission_classes = (JWTAuthentication,)
 
+    @swagger_auto_schema(manual_parameters=[FIELDS_FIELD, EXCLUDE_FIELD])
     def get(self, request):
         """
         To check if exists and serialize user account to describe whole user's wish lists of films and tvs.
-        :param request: HTTP request with user and his params inside .data.
+        'fields' and 'exclude' project the account and its wish lists, e.g. 'fields=wish_list.id,wish_list.title',
+        only the projected columns are read and wish lists are not read at all unless projected.
+        :param request: HTTP request with user and his params inside .data [and 'fields' [and/or 'exclude'] params].
         :return: HTTP response with UserAccountSerializer data and status code 200.
         """
-        wish_list = utils.get_user_account(request.user.id)
+        projection = Projection.from_request(request)
+        wish_list = utils.get_user_account(request.user.id,
+                                           UserAccountSerializer.setup_queryset(UserAccount.objects.all(), projection))
         if wish_list is None:
             return Response('User with such id does not exist.', status=status.HTTP_404_NOT_FOUND)
-        wish_list_serializer = UserAccountSerializer(wish_list)
+        wish_list_serializer = project_serializer(UserAccountSerializer(wish_list), projection)
         return Response(wish_list_serializer.data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(request_body=UserAccountSerializer)